@@ -0,0 +1,118 @@
+"""
+인제스트 파이프라인 임베딩 동시성 점검 스크립트
+
+가짜 OpenAI 클라이언트(요청마다 --latency초 지연)로 run_ingest_pipeline을 실행하여
+동시에 진행 중이던 임베딩 요청 수의 최댓값을 확인합니다. (네트워크/Qdrant 서버 없음, :memory: 컬렉션 사용)
+작은 청크 소스(incoterms, claim)처럼 윈도우 하나가 요청 하나 분량일 때도 여러 요청이 겹쳐야 하므로,
+요청당 토큰 상한을 풀어 윈도우마다 요청이 정확히 하나씩 나가게 합니다.
+
+예)
+    python check_pipeline_concurrency.py
+    python check_pipeline_concurrency.py --records 4096 --window 128 --latency 0.1
+
+동시 요청 수가 2 미만이면 종료 코드 1로 끝납니다.
+"""
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.embedding_executor import EmbeddingExecutor
+from common.pipeline import PIPELINE_EMBED_WORKERS, run_ingest_pipeline
+from common.qdrant_uploader import QdrantUploader
+
+
+VECTOR_SIZE = 8
+
+
+class FakeEmbeddingClient:
+    """embeddings.create 호출의 동시 실행 수를 기록하는 가짜 OpenAI 클라이언트"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.embeddings = SimpleNamespace(create=self._create)
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _create(self, model, input, **kwargs):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            return SimpleNamespace(data=[
+                SimpleNamespace(index=i, embedding=[float(len(text))] + [1.0] * (VECTOR_SIZE - 1))
+                for i, text in enumerate(input)
+            ])
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="파이프라인 임베딩 요청이 동시에 나가는지 점검 (가짜 클라이언트)")
+    parser.add_argument("--records", type=int, default=2048, help="청크 수")
+    parser.add_argument("--words", type=int, default=30, help="청크당 단어 수")
+    parser.add_argument("--window", type=int, default=256, help="파이프라인 윈도우 크기")
+    parser.add_argument("--workers", type=int, default=PIPELINE_EMBED_WORKERS, help="동시 임베딩 윈도우 수")
+    parser.add_argument("--latency", type=float, default=0.05, help="가짜 요청 하나의 지연(초)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fake = FakeEmbeddingClient(args.latency)
+    # 윈도우 하나 = 요청 하나 (작은 청크 소스와 같은 조건), 동시성만 보므로 RPM/TPM 예산 대기는 끔
+    executor = EmbeddingExecutor(
+        "text-embedding-3-large", client=fake, dimensions=VECTOR_SIZE,
+        rpm=10 ** 9, tpm=10 ** 12, max_batch_tokens=10 ** 9,
+    )
+
+    client = QdrantClient(":memory:")
+    client.create_collection("check", vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE))
+
+    records = (
+        {"id": i, "text": " ".join(f"word{i}_{j}" for j in range(args.words))}
+        for i in range(args.records)
+    )
+    start = time.perf_counter()
+    with QdrantUploader(client, "check") as uploader:
+        total = run_ingest_pipeline(
+            records,
+            executor.embed,
+            lambda record, vector: PointStruct(id=record["id"], vector=vector),
+            uploader,
+            window=args.window,
+            embed_workers=args.workers,
+        )
+    elapsed = time.perf_counter() - start
+    executor.close()
+
+    print(
+        f"\n청크 {total}개, 요청 {fake.requests}개, 최대 동시 요청 {fake.max_in_flight}개 "
+        f"(executor max_workers={executor.max_workers}, 윈도우 동시 {args.workers}개), {elapsed:.2f}s"
+    )
+    if client.count("check").count != args.records:
+        print("✗ 업로드된 포인트 수가 청크 수와 다릅니다.")
+        sys.exit(1)
+    if fake.max_in_flight < 2:
+        print("✗ 임베딩 요청이 한 번에 하나씩만 나갔습니다.")
+        sys.exit(1)
+    print("✓ 임베딩 요청이 동시에 나갑니다.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+임베딩 차원 축소 마이그레이션 스크립트 (Matryoshka)
+
+이미 저장된 벡터의 앞 N차원만 잘라 L2 재정규화한 뒤 새 컬렉션으로 복사합니다.
+text-embedding-3 계열의 dimensions 파라미터와 같은 결과이므로 임베딩 API를 다시 호출하지 않습니다.
+payload와 포인트 ID는 그대로 유지되어 증분 동기화(content_hash)도 이어서 사용할 수 있습니다.
+
+예)
+    python migrate_dimensions.py --dimensions 1024
+    python migrate_dimensions.py --dimensions 512 --target trade_collection_d512
+    python run_retrieval_benchmark.py --collection trade_collection_d512 --compare-exact --label d512
+        # 축소 전/후 recall 비교 (질의 임베딩도 컬렉션 차원으로 생성)
+
+마이그레이션 후 로더/검색에서 EMBED_DIMENSIONS=<N>을 설정해야 새로 임베딩하는 벡터의 차원이 맞습니다.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from qdrant_client.models import PointStruct
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.backends import VECTOR_BACKENDS, get_qdrant_client
+from common.collection_provisioning import (
+    collection_create_kwargs,
+    create_payload_indexes,
+    load_collection_config,
+    memory_footprint,
+)
+from common.matryoshka import truncate_normalize
+from common.sparse_vectors import DENSE_VECTOR_NAME, collection_has_sparse
+from common.qdrant_uploader import QdrantUploader
+
+
+load_dotenv()
+
+SCROLL_PAGE_SIZE = 256  # 3072차원 float 벡터 포함 페이지 (약 3MB)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="저장된 벡터를 잘라 축소 차원 컬렉션으로 복사 (API 호출 없음)")
+    parser.add_argument("--collection", default="trade_collection", help="원본 컬렉션")
+    parser.add_argument("--dimensions", type=int, required=True, help="새 벡터 차원 (예: 256, 512, 1024)")
+    parser.add_argument("--target", default=None, help="대상 컬렉션 (기본: <원본>_d<차원>)")
+    parser.add_argument("--backend", choices=VECTOR_BACKENDS, default=None)
+    parser.add_argument("--backend-path", default=None, help="local/numpy 저장소 경로")
+    parser.add_argument("--recreate", action="store_true", help="대상 컬렉션이 있으면 삭제 후 다시 생성")
+    return parser.parse_args()
+
+
+def migrate_dimensions(client, source: str, target: str, dimensions: int, recreate: bool = False) -> dict:
+    """
+    source 컬렉션의 모든 포인트를 dimensions 차원으로 잘라 target 컬렉션에 업로드
+
+    Returns:
+        {"points", "source_dim", "target_dim", "elapsed"}
+    """
+    info = client.get_collection(source)
+    source_dim = info.config.params.vectors.size
+    if not 0 < dimensions < source_dim:
+        raise ValueError(f"dimensions는 원본 차원({source_dim})보다 작아야 합니다: {dimensions}")
+
+    if client.collection_exists(target):
+        if not recreate:
+            raise ValueError(f"대상 컬렉션 '{target}'이(가) 이미 있습니다. (--recreate로 다시 생성)")
+        client.delete_collection(target)
+    client.create_collection(collection_name=target, **collection_create_kwargs(dimensions))
+    create_payload_indexes(client, target)
+    print(f"[MIGRATE] '{source}' ({source_dim}차원) → '{target}' ({dimensions}차원)")
+    # bm25 희소 벡터는 차원과 무관하므로 대상 컬렉션에도 설정이 있으면 그대로 복사
+    copy_sparse = collection_has_sparse(client.get_collection(target))
+
+    start = time.perf_counter()
+    migrated = 0
+    offset = None
+    with QdrantUploader(client, target) as uploader:
+        while True:
+            records, offset = client.scroll(
+                collection_name=source,
+                limit=SCROLL_PAGE_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            if records:
+                dense = [
+                    record.vector[DENSE_VECTOR_NAME] if isinstance(record.vector, dict) else record.vector
+                    for record in records
+                ]
+                vectors = truncate_normalize(dense, dimensions)
+                uploader.add(
+                    PointStruct(
+                        id=record.id,
+                        vector={**record.vector, DENSE_VECTOR_NAME: vector}
+                        if copy_sparse and isinstance(record.vector, dict) else vector,
+                        payload=record.payload,
+                    )
+                    for record, vector in zip(records, vectors)
+                )
+                migrated += len(records)
+                print(f"  → {migrated}/{info.points_count} 포인트 변환")
+            if offset is None:
+                break
+
+    return {
+        "points": migrated,
+        "source_dim": source_dim,
+        "target_dim": dimensions,
+        "elapsed": round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    args = parse_args()
+    target = args.target or f"{args.collection}_d{args.dimensions}"
+
+    client = get_qdrant_client(args.backend, path=args.backend_path, timeout=300)
+    result = migrate_dimensions(client, args.collection, target, args.dimensions, recreate=args.recreate)
+
+    config = load_collection_config()
+    before = memory_footprint(result["points"], result["source_dim"], config)
+    after = memory_footprint(result["points"], result["target_dim"], config)
+    print(f"\n✓ {result['points']}개 포인트 마이그레이션 완료 ({result['elapsed']}초)")
+    print(f"  원본 벡터: {before['original_vectors_mb']}MB → {after['original_vectors_mb']}MB")
+    print(f"  예상 RAM:  {before['estimated_ram_mb']}MB → {after['estimated_ram_mb']}MB")
+    print(f"\n다음 단계: python run_retrieval_benchmark.py --collection {target} --label d{args.dimensions}")
+    print(f"          로더/검색에 EMBED_DIMENSIONS={args.dimensions} 설정")
+
+
+if __name__ == "__main__":
+    main()
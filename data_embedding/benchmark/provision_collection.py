@@ -0,0 +1,69 @@
+"""
+컬렉션 설정 확인 / 적용 스크립트
+
+현재 컬렉션의 양자화/on_disk/HNSW 설정과 예상 메모리 사용량을 출력하고,
+--apply를 주면 환경 변수 설정(COLLECTION_QUANTIZATION, VECTORS_ON_DISK, HNSW_M 등)을
+기존 컬렉션에 적용합니다. (데이터 재업로드 없이 서버가 백그라운드로 재구성)
+필터 검색용 payload 인덱스(data_source / country / category)도 없으면 함께 만듭니다.
+
+예)
+    python provision_collection.py
+    COLLECTION_QUANTIZATION=int8 VECTORS_ON_DISK=1 python provision_collection.py --apply
+    python run_retrieval_benchmark.py --compare-exact --label int8_on_disk   # 적용 후 recall 확인
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.backends import VECTOR_BACKENDS, get_qdrant_client
+from common.collection_provisioning import (
+    apply_collection_config,
+    config_from_collection_info,
+    create_payload_indexes,
+    describe_config,
+    load_collection_config,
+    memory_footprint,
+)
+
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="컬렉션 양자화/on_disk/HNSW 설정 확인 및 적용")
+    parser.add_argument("--collection", default="trade_collection")
+    parser.add_argument("--backend", choices=VECTOR_BACKENDS, default=None)
+    parser.add_argument("--apply", action="store_true", help="환경 변수 설정을 기존 컬렉션에 적용")
+    args = parser.parse_args()
+
+    client = get_qdrant_client(args.backend, timeout=60)
+    info = client.get_collection(args.collection)
+    n_points = info.points_count or 0
+    vector_size = info.config.params.vectors.size
+
+    current = config_from_collection_info(info)
+    print(f"[현재] {describe_config(current)}")
+    print(f"[현재] 예상 사용량: {memory_footprint(n_points, vector_size, current)}")
+
+    target = load_collection_config()
+    print(f"[목표] {describe_config(target)}")
+    print(f"[목표] 예상 사용량: {memory_footprint(n_points, vector_size, target)}")
+
+    if target["sparse_vectors"] and not current["sparse_vectors"]:
+        # 희소 벡터 설정은 기존 컬렉션에 추가할 수 없으므로 다시 생성해야 함
+        print("\n[주의] BM25 희소 벡터는 --apply로 추가되지 않습니다. 컬렉션을 다시 만든 뒤 로더를 실행하세요.")
+
+    if args.apply:
+        apply_collection_config(client, args.collection, target)
+        create_payload_indexes(client, args.collection)
+        print("✓ payload 인덱스 확인 완료 (data_source, country, category)")
+    else:
+        print("\n설정을 적용하려면 --apply 옵션을 주세요.")
+
+
+if __name__ == "__main__":
+    main()
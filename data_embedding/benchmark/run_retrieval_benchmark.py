@@ -0,0 +1,225 @@
+"""
+검색 벤치마크 실행 스크립트
+
+정답 질의 세트(fraud / cisg / incoterms)를 지정한 컬렉션에 검색하여
+recall@k, MRR, nDCG@k, 지연(p50/p95/p99), QPS를 측정하고 JSON 리포트로 저장합니다.
+
+예)
+    python run_retrieval_benchmark.py --collection trade_collection --k 1 3 5 10
+    python run_retrieval_benchmark.py --suites fraud --filter-source --output reports/fraud_h1.json
+        # 제목 구조 청킹의 recall@k와 질의당 결과 토큰 수(tokens@k)
+    python run_retrieval_benchmark.py --backend numpy --embed-backend local   # 네트워크 없이 실행
+    SEARCH_OVERSAMPLING=3 python run_retrieval_benchmark.py --compare-exact --label int8_os3
+        # 양자화/HNSW 검색과 완전 탐색(exact)의 recall 차이 + 메모리 사용량 추정
+    python run_retrieval_benchmark.py --collection trade_collection_d512 --label d512
+        # migrate_dimensions.py로 만든 축소 차원 컬렉션의 recall (질의 차원은 컬렉션 차원을 따름)
+    python run_retrieval_benchmark.py --full-payload --label full_payload
+        # 필드 목록 대신 전체 payload를 받아 응답 크기(payload_bytes_mean)/지연 비교
+    python run_retrieval_benchmark.py --route --label routed
+        # 질의 라우터가 고른 data_source로 필터링 (--filter-source는 정답 소스로 필터링하는 상한선)
+    python run_retrieval_benchmark.py --rerank blend --rerank-candidates 50 --label blend50
+        # 후보 50개를 가져와 재정렬 후 상위 k개 평가 (지연에 재정렬 시간 포함)
+    python run_retrieval_benchmark.py --hybrid --k 1 3 5 --label hybrid_rrf
+        # dense + BM25 희소 벡터 RRF 검색 (컬렉션에 bm25 희소 벡터가 있어야 함)
+    python run_retrieval_benchmark.py --suites cisg --small-to-big --label cisg_s2b
+        # 호/항 매칭을 감싸는 조로 바꿔 조 단위로 평가 (CISG를 Hierarchical 전략으로 적재한 컬렉션)
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import tiktoken
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.embedding_cache import get_default_cache
+from common.backends import EMBED_BACKENDS, VECTOR_BACKENDS, get_embedder, get_qdrant_client
+from common.collection_provisioning import (
+    config_from_collection_info,
+    load_collection_config,
+    memory_footprint,
+    search_params,
+)
+from common.index_sync import normalize_point_id
+from common.small_to_big import collapse_to_parents, missing_parent_ids
+from common.reranker import RERANKERS, default_rerank_candidates, get_reranker, rerank_points
+from common.query_router import build_search_filter, route_query
+from common.sparse_vectors import collection_has_sparse, hybrid_query_kwargs
+from common.retrieval_benchmark import (
+    BENCHMARK_PAYLOAD_FIELDS,
+    DEFAULT_K_VALUES,
+    GOLD_SUITES,
+    print_summary,
+    run_benchmark,
+    save_report,
+)
+
+
+load_dotenv()
+
+EMBED_MODEL = "text-embedding-3-large"
+REPORT_DIR = Path(__file__).resolve().parent / "reports"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="정답 질의 세트 기반 오프라인 검색 벤치마크")
+    parser.add_argument("--collection", default="trade_collection", help="검색할 Qdrant 컬렉션")
+    parser.add_argument("--suites", nargs="+", default=list(GOLD_SUITES), choices=list(GOLD_SUITES))
+    parser.add_argument("--k", nargs="+", type=int, default=list(DEFAULT_K_VALUES), help="recall/nDCG를 계산할 k")
+    parser.add_argument("--filter-source", action="store_true", help="세트별 data_source로 필터링하여 검색")
+    parser.add_argument("--route", action="store_true", help="질의 라우터(route_query)가 고른 data_source로 필터링하여 검색")
+    parser.add_argument("--concurrency", type=int, default=1, help="동시에 보낼 검색 요청 수 (QPS 측정용)")
+    parser.add_argument("--embed-model", default=EMBED_MODEL)
+    parser.add_argument("--dimensions", type=int, default=None, help="질의 임베딩 차원 (기본: 컬렉션 벡터 차원)")
+    parser.add_argument("--backend", choices=VECTOR_BACKENDS, default=None, help="벡터 저장소 (기본: VECTOR_BACKEND 환경 변수)")
+    parser.add_argument("--backend-path", default=None, help="local/numpy 저장소 경로")
+    parser.add_argument("--embed-backend", choices=EMBED_BACKENDS, default=None, help="임베딩 (기본: EMBED_BACKEND 환경 변수)")
+    parser.add_argument("--compare-exact", action="store_true",
+                        help="같은 질의를 완전 탐색(양자화/HNSW 없음)으로도 실행하여 recall 차이를 리포트")
+    parser.add_argument("--hybrid", action="store_true", help="dense + BM25 희소 벡터를 RRF로 합친 하이브리드 검색")
+    parser.add_argument("--full-payload", action="store_true", help="필드 목록 대신 전체 payload 요청 (응답 크기 비교용)")
+    parser.add_argument("--rerank", choices=RERANKERS, default="none", help="2단계 재정렬 (blend: 점수+BM25, cross-encoder: 로컬 모델)")
+    parser.add_argument("--rerank-candidates", type=int, default=default_rerank_candidates(), help="재정렬할 후보 수")
+    parser.add_argument("--small-to-big", action="store_true", help="호/항 결과를 감싸는 조 포인트로 바꾸고 조 단위로 중복 제거")
+    parser.add_argument("--label", default="", help="리포트에 남길 실험 이름 (예: int8_hnsw_m16)")
+    parser.add_argument("--output", default=None, help="JSON 리포트 경로 (기본: benchmark/reports/retrieval_<시각>.json)")
+    return parser.parse_args()
+
+
+def make_qdrant_search(
+    client,
+    collection_name: str,
+    params=None,
+    hybrid: bool = False,
+    with_payload=BENCHMARK_PAYLOAD_FIELDS,
+    route: bool = False,
+    reranker=None,
+    rerank_candidates: Optional[int] = None,
+    small_to_big: bool = False,
+):
+    """
+    Qdrant query_points 기반 검색 함수 (params: 양자화 rescore/oversampling, hnsw_ef 등)
+
+    hybrid=True면 dense/BM25 prefetch + RRF를 한 번의 query_points 요청으로 실행
+    with_payload: 받을 payload 필드 목록 (True = 전체)
+    route=True면 data_source가 주어지지 않은 질의를 라우터가 고른 소스로 필터링
+    reranker가 있으면 후보 rerank_candidates개(None = RERANK_CANDIDATES 환경 변수)를 가져와 재정렬 후 상위 limit개 반환
+    small_to_big=True면 후보를 조 포인트로 합친 뒤 상위 limit개 반환 (합쳐지는 만큼 후보를 더 가져옴)
+    """
+    if rerank_candidates is None:
+        rerank_candidates = default_rerank_candidates()
+
+    def search(vector, limit, data_source=None, query=""):
+        sources = [data_source] if data_source else (route_query(query) if route else None)
+        query_filter = build_search_filter(sources)
+        fetch_limit = max(limit, rerank_candidates) if reranker or small_to_big else limit
+        if hybrid:
+            kwargs = hybrid_query_kwargs(vector, query, fetch_limit, query_filter, params)
+        else:
+            kwargs = {"query": vector, "limit": fetch_limit, "query_filter": query_filter, "search_params": params}
+        response = client.query_points(
+            collection_name=collection_name,
+            with_payload=with_payload,
+            **kwargs,
+        )
+        points, _ = rerank_points(reranker, query, response.points, len(response.points) if small_to_big else limit)
+        if small_to_big:
+            missing_ids = missing_parent_ids(points)
+            records = client.retrieve(collection_name, ids=missing_ids, with_payload=with_payload) if missing_ids else []
+            points = collapse_to_parents(points, {normalize_point_id(r.id): r for r in records}, limit)
+        return [point.payload or {} for point in points]
+
+    return search
+
+
+def main():
+    args = parse_args()
+
+    client = get_qdrant_client(args.backend, path=args.backend_path, timeout=60)
+    info = client.get_collection(args.collection)
+    vector_size = info.config.params.vectors.size
+    executor = get_embedder(args.embed_model, backend=args.embed_backend, dim=args.dimensions or vector_size)
+    cache = get_default_cache()
+
+    embed_texts = lambda texts: cache.embed(executor.cache_name, texts, executor.embed)
+    # 결과 텍스트의 토큰 수 (tokens@k: 모델에 전달되는 컨텍스트 크기)
+    encoding = tiktoken.encoding_for_model(EMBED_MODEL)
+    count_tokens = lambda text: len(encoding.encode_ordinary(text))
+    # 실제 컬렉션에 적용된 양자화/HNSW 설정 + 환경 변수의 검색 옵션(rescore/oversampling/hnsw_ef)
+    collection_config = config_from_collection_info(info, load_collection_config())
+    params = search_params(collection_config)
+    if args.hybrid and not collection_has_sparse(info):
+        raise SystemExit(f"'{args.collection}'에 BM25 희소 벡터가 없습니다. (SPARSE_VECTORS=1로 컬렉션을 다시 만든 뒤 로더 실행)")
+
+    config = {
+        "label": args.label,
+        "collection": args.collection,
+        "backend": args.backend or os.getenv("VECTOR_BACKEND", "cloud"),
+        "embed_model": executor.model,
+        "dimensions": executor.dimensions,
+        "points_count": info.points_count,
+        "search_params": params.model_dump(exclude_none=True) if params else None,
+        "hybrid": args.hybrid,
+        "route": args.route,
+        "rerank": args.rerank,
+        "rerank_candidates": args.rerank_candidates if args.rerank != "none" else None,
+        "small_to_big": args.small_to_big,
+        "with_payload": True if args.full_payload else BENCHMARK_PAYLOAD_FIELDS,
+        "collection_config": collection_config,
+    }
+    report = run_benchmark(
+        args.suites,
+        embed_texts,
+        make_qdrant_search(
+            client, args.collection, params, hybrid=args.hybrid,
+            with_payload=True if args.full_payload else BENCHMARK_PAYLOAD_FIELDS,
+            route=args.route,
+            reranker=get_reranker(args.rerank),
+            rerank_candidates=args.rerank_candidates,
+            small_to_big=args.small_to_big,
+        ),
+        k_values=sorted(set(args.k)),
+        filter_source=args.filter_source,
+        concurrency=args.concurrency,
+        config=config,
+        count_tokens=count_tokens,
+    )
+    report["memory_footprint"] = memory_footprint(info.points_count or 0, vector_size, collection_config)
+
+    if args.compare_exact:
+        print("\n[BENCH] 기준선: 완전 탐색(exact) 실행")
+        exact = run_benchmark(
+            args.suites,
+            embed_texts,
+            make_qdrant_search(client, args.collection, search_params(collection_config, exact=True)),
+            k_values=sorted(set(args.k)),
+            filter_source=args.filter_source,
+            concurrency=args.concurrency,
+        )
+        report["exact_baseline"] = {name: result["summary"] for name, result in exact["suites"].items()}
+        report["delta_vs_exact"] = {
+            name: {
+                metric: round(result["summary"][metric] - exact["suites"][name]["summary"][metric], 4)
+                for metric in result["summary"]
+                if metric.startswith(("recall@", "ndcg@", "mrr"))
+            }
+            for name, result in report["suites"].items()
+        }
+
+    output = args.output or REPORT_DIR / f"retrieval_{datetime.now():%Y%m%d_%H%M%S}.json"
+    path = save_report(report, output)
+
+    print("\n=== 벤치마크 결과 ===")
+    print_summary(report)
+    print(f"  [메모리] {report['memory_footprint']}")
+    for name, delta in report.get("delta_vs_exact", {}).items():
+        print(f"  [{name}] exact 대비: {delta}")
+    print(f"\n✓ 리포트 저장: {path}")
+
+
+if __name__ == "__main__":
+    main()
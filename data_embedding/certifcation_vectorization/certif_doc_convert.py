@@ -3,15 +3,45 @@
 
 인증 CSV 데이터를 RAG에 최적화된 문서로 변환합니다.
 다양한 출력 형식과 선택적 자동 요약 기능을 지원합니다.
+
+convert_all()은 CSV를 한 번만 읽고(chunksize를 주면 청크 단위로 읽어 메모리 사용량 일정),
+요약/문서 텍스트/JSON 인코딩을 행 반복 대신 pandas 문자열 연산으로 열 단위 계산한 뒤
+요청한 모든 형식(jsonl / json / txt / individual)을 한 번에 버퍼 쓰기합니다.
+개별 convert_to_* 메서드도 같은 경로를 사용하며 출력 내용은 이전과 같습니다.
 """
 
 import pandas as pd
 import json
+from json.encoder import encode_basestring
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterable, Iterator, Optional, Sequence
 import re
 
 
+OUTPUT_FORMATS = ("jsonl", "json", "txt", "individual")
+DEFAULT_OUTPUT_NAMES = {
+    "jsonl": "certifications.jsonl",
+    "json": "certifications.json",
+    "txt": "certifications.txt",
+    "individual": "individual_docs",
+}
+DOCUMENT_FIELDS = ("country", "category", "cert_type", "main_cert", "cert_name", "cert_subject", "url")
+WRITE_BUFFER_SIZE = 1024 * 1024  # 1MB 쓰기 버퍼
+SEPARATOR = '=' * 80
+METADATA_JSON = json.dumps({"source": "globalcerti.kr", "type": "certification"}, ensure_ascii=False)
+METADATA_JSON_INDENTED = '{\n      "source": "globalcerti.kr",\n      "type": "certification"\n    }'
+
+_dumps = partial(json.dumps, ensure_ascii=False)
+
+
+def _to_json(value) -> str:
+    """json.dumps(value, ensure_ascii=False)와 같은 결과 (문자열은 C 인코더로 바로 처리)"""
+    return encode_basestring(value) if isinstance(value, str) else _dumps(value)
+
+
 class CertificationRAGConverter:
     """인증 데이터를 RAG에 최적화된 문서로 변환합니다."""
 
@@ -154,6 +184,180 @@ class CertificationRAGConverter:
 
         return doc
 
+    # ------------------------------------------------------------
+    # 열 단위(벡터화) 변환
+    # ------------------------------------------------------------
+    @staticmethod
+    def generate_auto_summaries(cert_subject: pd.Series, max_length: int = 150) -> pd.Series:
+        """generate_auto_summary와 같은 규칙을 열 전체에 한 번에 적용합니다."""
+        missing = cert_subject.isna() | (cert_subject == "")
+        text = cert_subject.where(~missing, "").astype(str).str.strip()
+        first_sentence = text.str.split(r'[.!?]\s+', n=1, regex=True).str[0]
+
+        first_len = first_sentence.str.len()
+        from_sentence = first_sentence.where(first_len <= max_length, first_sentence.str[:max_length] + "...")
+        truncated = text.where(text.str.len() <= max_length, text.str[:max_length] + "...")
+        summary = from_sentence.where(first_len > 20, truncated)
+        return summary.mask(missing, "요약 정보 없음")
+
+    @staticmethod
+    def _columns(chunk: pd.DataFrame) -> Dict[str, pd.Series]:
+        """문서 필드 열 (CSV에 없는 열은 row.get 기본값과 같이 빈 값)"""
+        return {
+            field: chunk[field] if field in chunk.columns else pd.Series([None] * len(chunk), index=chunk.index, dtype=object)
+            for field in DOCUMENT_FIELDS
+        }
+
+    def build_documents(self, chunk: pd.DataFrame, formats: Sequence[str], include_summary: bool = True) -> Dict[str, pd.Series]:
+        """
+        청크 하나의 출력 문자열을 형식별 열로 계산합니다.
+
+        Returns:
+            {"text": create_document_text 결과 열, "jsonl": JSON 한 줄 열, "json": 들여쓰기 JSON 열, "filename": 개별 파일명 열}
+            (요청한 형식에 필요한 열만 포함)
+        """
+        cols = self._columns(chunk)
+        ids = pd.Series(chunk.index, index=chunk.index)
+        id_str = ids.astype(str)
+        summaries = self.generate_auto_summaries(cols["cert_subject"]) if include_summary else None
+        result = {}
+
+        if {"txt", "individual"} & set(formats):
+            # f-string과 같이 결측값은 'nan', 열이 없으면 'N/A'
+            shown = {
+                field: _display(col) if field in chunk.columns else pd.Series("N/A", index=chunk.index)
+                for field, col in cols.items()
+            }
+            doc = (
+                SEPARATOR + "\n[ID: " + id_str + "]\n\n"
+                + "국가: " + shown["country"] + "\n"
+                + "카테고리: " + shown["category"] + "\n"
+                + "인증 구분: " + shown["cert_type"] + "\n"
+                + "대표 인증: " + shown["main_cert"] + "\n"
+                + "인증명: " + shown["cert_name"] + "\n\n"
+                + "설명:\n" + shown["cert_subject"] + "\n"
+            )
+            if include_summary:
+                doc = doc + ("\n요약:\n" + summaries + "\n").where(summaries != "", "")
+            result["text"] = doc + "\n출처:\n" + shown["url"] + "\n" + SEPARATOR + "\n"
+
+        if {"jsonl", "json"} & set(formats):
+            # 값별 JSON 인코딩은 열마다 한 번씩, 객체 조립은 문자열 연결로
+            raw = {field: col if field in chunk.columns else pd.Series("", index=chunk.index) for field, col in cols.items()}
+            encoded = {field: col.map(_to_json) for field, col in raw.items()}
+            shown = {field: _display(col) for field, col in raw.items()}
+            search_text = (
+                "인증명: " + shown["cert_name"] + "\n"
+                + "국가: " + shown["country"] + " | 카테고리: " + shown["category"] + " | 인증구분: " + shown["cert_type"] + "\n"
+                + "대표인증: " + shown["main_cert"] + "\n\n"
+                + shown["cert_subject"]
+            )
+            if include_summary:
+                search_text = search_text + "\n\n요약: " + summaries
+            encoded["text"] = search_text.map(_to_json)
+            if include_summary:
+                encoded["auto_summary"] = summaries.map(_to_json)
+
+            keys = ["id"] + list(DOCUMENT_FIELDS) + ["metadata"] + (["auto_summary"] if include_summary else []) + ["text"]
+            encoded["id"] = id_str
+            if "jsonl" in formats:
+                encoded["metadata"] = pd.Series(METADATA_JSON, index=chunk.index)
+                line = pd.Series("{", index=chunk.index)
+                for i, key in enumerate(keys):
+                    line = line + ("" if i == 0 else ", ") + f'"{key}": ' + encoded[key]
+                result["jsonl"] = line + "}"
+            if "json" in formats:
+                encoded["metadata"] = pd.Series(METADATA_JSON_INDENTED, index=chunk.index)
+                item = pd.Series("  {\n", index=chunk.index)
+                for i, key in enumerate(keys):
+                    item = item + ("" if i == 0 else ",\n") + f'    "{key}": ' + encoded[key]
+                result["json"] = item + "\n  }"
+
+        if "individual" in formats:
+            # cert_name에서 파일명 생성 (정제)
+            name = cols["cert_name"].where(cols["cert_name"].notna(), "cert_" + id_str).astype(str)
+            name = name.str.replace(r'[^\w\s-]', '', regex=True).str.replace(r'[-\s]+', '_', regex=True)
+            result["filename"] = ids.map("{:04d}".format) + "_" + name.str[:50] + ".txt"
+
+        return result
+
+    def iter_chunks(self, chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """이미 로드한 DataFrame 또는 CSV를 청크 단위로 반환 (chunksize가 없으면 전체를 한 번에)"""
+        if self.df is not None:
+            yield self.df
+        elif chunksize:
+            print(f"Streaming data from {self.csv_path} (chunksize={chunksize})...")
+            yield from pd.read_csv(self.csv_path, encoding='utf-8-sig', chunksize=chunksize)
+        else:
+            yield self.load_data()
+
+    def convert_all(
+        self,
+        output_dir: Optional[str] = None,
+        formats: Iterable[str] = ("jsonl", "json", "txt"),
+        include_summary: bool = True,
+        chunksize: Optional[int] = None,
+        output_paths: Optional[Dict[str, str]] = None,
+        max_workers: int = 8,
+    ) -> int:
+        """
+        CSV를 한 번 읽어 요청한 모든 형식으로 변환합니다.
+
+        Args:
+            output_dir: 출력 폴더 (형식별 기본 파일명 사용)
+            formats: "jsonl", "json", "txt", "individual" 중 선택
+            include_summary: 자동 요약 포함 여부
+            chunksize: CSV를 이 행 수 단위로 읽음 (None이면 한 번에, 큰 CSV는 메모리 일정)
+            output_paths: 형식별 출력 경로 (output_dir 기본값보다 우선)
+            max_workers: 개별 파일 쓰기 스레드 수
+
+        Returns:
+            변환한 문서 수
+        """
+        formats = list(dict.fromkeys(formats))
+        unknown = set(formats) - set(OUTPUT_FORMATS)
+        if unknown:
+            raise ValueError(f"알 수 없는 출력 형식: {sorted(unknown)} (선택: {', '.join(OUTPUT_FORMATS)})")
+        paths = {fmt: Path(output_dir) / DEFAULT_OUTPUT_NAMES[fmt] for fmt in formats} if output_dir else {}
+        paths.update({fmt: Path(path) for fmt, path in (output_paths or {}).items() if fmt in formats})
+        missing = [fmt for fmt in formats if fmt not in paths]
+        if missing:
+            raise ValueError(f"출력 경로가 없습니다: {missing} (output_dir 또는 output_paths 지정)")
+
+        for fmt, path in paths.items():
+            (path if fmt == "individual" else path.parent).mkdir(parents=True, exist_ok=True)
+            print(f"Converting to {fmt} format: {path}")
+
+        total = 0
+        with ExitStack() as stack:
+            files = {
+                fmt: stack.enter_context(open(paths[fmt], 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE))
+                for fmt in ("jsonl", "json", "txt") if fmt in formats
+            }
+            pool = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers)) if "individual" in formats else None
+
+            for chunk in self.iter_chunks(chunksize):
+                if chunk.empty:
+                    continue
+                docs = self.build_documents(chunk, formats, include_summary)
+                if "jsonl" in files:
+                    files["jsonl"].write("\n".join(docs["jsonl"]) + "\n")
+                if "txt" in files:
+                    files["txt"].write("\n".join(docs["text"]) + "\n")
+                if "json" in files:
+                    # json.dump(indent=2)와 같은 배열 형식을 스트리밍으로 기록
+                    files["json"].write(("[\n" if total == 0 else ",\n") + ",\n".join(docs["json"]))
+                if pool is not None:
+                    list(pool.map(_write_text, [paths["individual"] / name for name in docs["filename"]], docs["text"]))
+                total += len(chunk)
+
+            if "json" in files:
+                files["json"].write("\n]" if total else "[]")
+
+        for fmt, path in paths.items():
+            print(f"✓ Saved {total} documents to {path}")
+        return total
+
     def convert_to_text_format(self, output_path: str, include_summary: bool = True) -> None:
         """
         모든 인증을 단일 텍스트 파일로 변환합니다.
@@ -162,20 +366,7 @@ class CertificationRAGConverter:
             output_path: 출력 텍스트 파일 경로
             include_summary: 자동 요약 포함 여부
         """
-        if self.df is None:
-            self.load_data()
-
-        output_file = Path(output_path)
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-
-        print(f"Converting to text format: {output_file}")
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for idx, row in self.df.iterrows():
-                doc_text = self.create_document_text(row, idx, include_summary)
-                f.write(doc_text + "\n")
-
-        print(f"✓ Saved {len(self.df)} documents to {output_file}")
+        self.convert_all(formats=['txt'], include_summary=include_summary, output_paths={'txt': output_path})
 
     def convert_to_jsonl(self, output_path: str, include_summary: bool = True) -> None:
         """
@@ -186,20 +377,7 @@ class CertificationRAGConverter:
             output_path: 출력 JSONL 파일 경로
             include_summary: 자동 요약 포함 여부
         """
-        if self.df is None:
-            self.load_data()
-
-        output_file = Path(output_path)
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-
-        print(f"Converting to JSONL format: {output_file}")
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for idx, row in self.df.iterrows():
-                doc_dict = self.create_document_dict(row, idx, include_summary)
-                f.write(json.dumps(doc_dict, ensure_ascii=False) + "\n")
-
-        print(f"✓ Saved {len(self.df)} documents to {output_file}")
+        self.convert_all(formats=['jsonl'], include_summary=include_summary, output_paths={'jsonl': output_path})
 
     def convert_to_json(self, output_path: str, include_summary: bool = True) -> None:
         """
@@ -209,23 +387,7 @@ class CertificationRAGConverter:
             output_path: 출력 JSON 파일 경로
             include_summary: 자동 요약 포함 여부
         """
-        if self.df is None:
-            self.load_data()
-
-        output_file = Path(output_path)
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-
-        print(f"Converting to JSON format: {output_file}")
-
-        documents = []
-        for idx, row in self.df.iterrows():
-            doc_dict = self.create_document_dict(row, idx, include_summary)
-            documents.append(doc_dict)
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(documents, f, ensure_ascii=False, indent=2)
-
-        print(f"✓ Saved {len(documents)} documents to {output_file}")
+        self.convert_all(formats=['json'], include_summary=include_summary, output_paths={'json': output_path})
 
     def convert_to_individual_files(self, output_dir: str, include_summary: bool = True) -> None:
         """
@@ -236,28 +398,7 @@ class CertificationRAGConverter:
             output_dir: 출력 파일 디렉토리
             include_summary: 자동 요약 포함 여부
         """
-        if self.df is None:
-            self.load_data()
-
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
-
-        print(f"Converting to individual files in: {output_path}")
-
-        for idx, row in self.df.iterrows():
-            # cert_name에서 파일명 생성 (정제)
-            cert_name = row.get('cert_name', f'cert_{idx}')
-            filename = re.sub(r'[^\w\s-]', '', cert_name)
-            filename = re.sub(r'[-\s]+', '_', filename)
-            filename = f"{idx:04d}_{filename[:50]}.txt"
-
-            doc_text = self.create_document_text(row, idx, include_summary)
-
-            file_path = output_path / filename
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(doc_text)
-
-        print(f"✓ Saved {len(self.df)} documents to {output_path}")
+        self.convert_all(formats=['individual'], include_summary=include_summary, output_paths={'individual': output_dir})
 
     def get_statistics(self) -> Dict:
         """인증 데이터에 대한 통계를 가져옵니다."""
@@ -276,6 +417,16 @@ class CertificationRAGConverter:
         return stats
 
 
+def _display(col: pd.Series) -> pd.Series:
+    """f-string 출력과 같은 문자열 열 (결측값은 'nan')"""
+    return col.astype(object).fillna("nan").astype(str)
+
+
+def _write_text(path: Path, text: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
 def main():
     """예제를 포함한 메인 실행 함수입니다."""
 
@@ -306,33 +457,20 @@ def main():
     output_dir = Path("/Users/hoon/Desktop/SKN-17-Final-5Team/retrieval_test/output")
     output_dir.mkdir(exist_ok=True)
 
-    # 다양한 형식으로 변환
+    # 다양한 형식으로 변환 (한 번의 패스로 모든 형식 기록)
     print("Converting to multiple RAG-optimized formats...\n")
 
     # 1. JSON Lines 형식 (벡터 DB에 권장)
-    converter.convert_to_jsonl(
-        output_dir / "certifications.jsonl",
-        include_summary=True
-    )
-
-    # 2. 단일 텍스트 파일
-    converter.convert_to_text_format(
-        output_dir / "certifications.txt",
-        include_summary=True
+    # 2. 구조화된 JSON
+    # 3. 단일 텍스트 파일
+    # 4. 개별 텍스트 파일 (선택 사항 - formats에 "individual" 추가)
+    converter.convert_all(
+        output_dir,
+        formats=["jsonl", "json", "txt"],
+        include_summary=True,
+        chunksize=None,  # 큰 CSV는 행 수 지정 (예: 10000) → 청크 단위로 읽어 메모리 일정
     )
 
-    # 3. 구조화된 JSON
-    converter.convert_to_json(
-        output_dir / "certifications.json",
-        include_summary=True
-    )
-
-    # 4. 개별 텍스트 파일 (선택 사항 - 기본적으로 주석 처리됨)
-    # converter.convert_to_individual_files(
-    #     output_dir / "individual_docs",
-    #     include_summary=True
-    # )
-
     print("\n" + "="*80)
     print("✓ CONVERSION COMPLETE")
     print("="*80)
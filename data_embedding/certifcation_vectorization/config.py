@@ -6,10 +6,11 @@ Qdrant RAG 시스템 설정
 DEFAULT_CONFIG = {
     # Qdrant 설정
     "collection_name": "trade_collection",
-    "use_cloud": True,  # 로컬 저장소 사용 시 False로 설정
+    "vector_backend": None,  # None = VECTOR_BACKEND 환경 변수(기본 "cloud"), "local"(임베디드 Qdrant), "memory", "numpy"
+    "local_path": None,  # None = LOCAL_QDRANT_PATH / NUMPY_INDEX_PATH 또는 data_embedding/.cache 아래 기본 경로
 
     # Embedding 설정
-    "embedding_provider": "openai",  # "openai" 또는 "huggingface"(사용 X)
+    "embedding_provider": None,  # None = EMBED_BACKEND 환경 변수(기본 "openai"), "local"(네트워크 없는 해시 임베딩, 벤치마크용)
     "embedding_model": None,  # None = provider 기본값 사용
     # 기본값:
     #   - openai: "text-embedding-3-large"
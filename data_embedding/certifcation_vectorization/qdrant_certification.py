@@ -4,19 +4,23 @@ Interactive CLI (실행 파일)
 """
 
 import json
+import os
 from typing import List, Dict
 from qdrant_certification_core import CertificationQdrant
 from config import DEFAULT_CONFIG
+from common.metrics import write_run_report  # common 경로는 qdrant_certification_core에서 추가됨
 
 
 
-def main(update_existing: bool = False):
+def main(update_existing: bool = False, incremental: bool = True):
     """
     메인 CLI 진입점
 
     Args:
-        update_existing: True면 기존 'certification' 데이터를 삭제하고 새로 업로드 (업데이트 모드)
+        update_existing: True면 기존 'certification' 데이터를 새 내용으로 갱신 (업데이트 모드)
                         False면 기존 데이터 유지
+        incremental: 업데이트 모드에서 True면 바뀐 청크만 다시 인덱싱,
+                     False면 기존 'certification' 데이터를 삭제하고 새로 업로드
     """
     print("=" * 80)
     print("QDRANT CERTIFICATION RAG 시스템")
@@ -25,8 +29,8 @@ def main(update_existing: bool = False):
     # 설정 표시
     print("\n설정:")
     print(f"  컬렉션: {DEFAULT_CONFIG['collection_name']}")
-    print(f"  저장소: {'Qdrant Cloud' if DEFAULT_CONFIG['use_cloud'] else '로컬'}")
-    print(f"  Embedding: {DEFAULT_CONFIG['embedding_provider']}")
+    print(f"  저장소: {DEFAULT_CONFIG['vector_backend'] or os.getenv('VECTOR_BACKEND', 'cloud')}")
+    print(f"  Embedding: {DEFAULT_CONFIG['embedding_provider'] or os.getenv('EMBED_BACKEND', 'openai')}")
     print(f"  청킹: {'활성화' if DEFAULT_CONFIG['chunk_size'] else '비활성화'}")
     if DEFAULT_CONFIG['chunk_size']:
         print(f"    - 청크 크기: {DEFAULT_CONFIG['chunk_size']}")
@@ -40,7 +44,8 @@ def main(update_existing: bool = False):
         embedding_model=DEFAULT_CONFIG['embedding_model'],
         chunk_size=DEFAULT_CONFIG['chunk_size'],
         chunk_overlap=DEFAULT_CONFIG['chunk_overlap'],
-        use_cloud=DEFAULT_CONFIG['use_cloud']
+        vector_backend=DEFAULT_CONFIG['vector_backend'],
+        local_path=DEFAULT_CONFIG.get('local_path')
     )
 
     # 컬렉션 생성
@@ -57,8 +62,17 @@ def main(update_existing: bool = False):
             DEFAULT_CONFIG['jsonl_path'],
             batch_size=DEFAULT_CONFIG['batch_size'],
             text_field=DEFAULT_CONFIG['text_field'],
-            update_existing=update_existing
+            update_existing=update_existing,
+            incremental=incremental
         )
+
+        # 단계별 시간/토큰/업로드 바이트/재시도 리포트 (JSON + Prometheus text)
+        write_run_report("certification", {
+            "collection": DEFAULT_CONFIG['collection_name'],
+            "chunks": num_chunks,
+            "embed_model": rag.embedding_executor.cache_name,
+            "embedding_cache": rag.embedding_cache.stats(),
+        })
     else:
         print(f"\n✓ 컬렉션에 이미 {info['points_count']}개의 청크가 인덱싱되어 있습니다")
 
@@ -78,6 +92,6 @@ def main(update_existing: bool = False):
 
 
 if __name__ == "__main__":
-    # update_existing=True: 기존 certification 데이터를 삭제하고 새로 인덱싱 (다른 소스는 유지)
-    # update_existing=False: 기존 데이터에 추가 (중복 가능)
+    # update_existing=True: 바뀐 certification 청크만 다시 인덱싱 (다른 소스는 유지)
+    # update_existing=False: 기존 데이터에 추가
     main(update_existing=True)
@@ -1,12 +1,24 @@
 import json
-import os
+import sys
+from pathlib import Path
 from typing import List, Dict, Optional, Literal
 from dotenv import load_dotenv
 
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue
 import numpy as np
-import uuid
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.embedding_cache import get_default_cache
+from common.embedding_executor import EmbeddingExecutor
+from common.backends import get_embedder, get_qdrant_client
+from common.qdrant_uploader import QdrantUploader
+from common.pipeline import run_ingest_pipeline
+from common.index_sync import make_point_id, sync_data_source
+from common.collection_provisioning import collection_create_kwargs, create_payload_indexes
+from common.matryoshka import embedding_dimensions
+from common.sparse_vectors import HybridVectors
+from common.payload_schema import make_payload
+from common.metrics import get_metrics
 
 
 load_dotenv()
@@ -18,66 +30,43 @@ class CertificationQdrant:
     def __init__(
         self,
         collection_name: str = "trade_collection",
-        embedding_provider: Literal["openai"] = "openai",
+        embedding_provider: Optional[Literal["openai", "local"]] = None,
         embedding_model: Optional[str] = None,
         chunk_size: Optional[int] = 1000,
         chunk_overlap: Optional[int] = 100,
-        use_cloud: bool = True
+        vector_backend: Optional[Literal["cloud", "local", "memory", "numpy"]] = None,
+        local_path: Optional[str] = None
     ):
         """RAG 시스템 초기화
 
         Args:
             collection_name: Qdrant 컬렉션 이름
-            embedding_provider: "openai" (지원되는 유일한 provider)
-            embedding_model: 모델 이름 (None = provider 기본값)
+            embedding_provider: "openai" 또는 "local" (네트워크 없는 결정적 해시 임베딩)
+                                (None = EMBED_BACKEND 환경 변수, 기본 openai)
+            embedding_model: 모델 이름 (None = text-embedding-3-large)
             chunk_size: 텍스트 청크 크기 (None = 청킹 안함)
             chunk_overlap: 청크 간 겹침
-            use_cloud: Qdrant Cloud 사용 (True) 또는 로컬 (지원 안함)
+            vector_backend: "cloud" | "local"(임베디드 Qdrant) | "memory"(Qdrant :memory:) | "numpy"(NumPy 플랫 인덱스)
+                            (None = VECTOR_BACKEND 환경 변수, 기본 cloud)
+            local_path: local/numpy 저장 경로 (None = 환경 변수 기본값, ":memory:" = 저장 안 함)
         """
         self.collection_name = collection_name
-        self.embedding_provider = embedding_provider
+        # dense 벡터 + BM25 희소 벡터 (컬렉션에 bm25 설정이 있을 때)
+        self.point_vectors = HybridVectors()
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
 
-        # Embedding 모델 초기화
-        if embedding_provider == "openai":
-            self._init_openai_embeddings(embedding_model)
-        else:
-            raise ValueError(f"지원하지 않는 embedding provider: {embedding_provider}")
-
-        # Qdrant 클라이언트 초기화
-        if use_cloud:
-            self._init_qdrant_cloud()
-        else:
-            raise ValueError("로컬 Qdrant는 지원하지 않습니다. use_cloud=True로 설정하세요.")
+        # Embedding 초기화 (다른 로더와 같은 common.backends 사용, EMBED_BACKEND=local이면 로컬 해시 임베딩)
+        model = embedding_model or "text-embedding-3-large"
+        # EMBED_DIMENSIONS가 있으면 Matryoshka 축소 차원으로 임베딩/컬렉션 생성
+        self.embedding_executor = get_embedder(model, backend=embedding_provider, dim=embedding_dimensions(model))
+        self.embedding_model_name = self.embedding_executor.model
+        self.embedding_dimension = self.embedding_executor.dimensions
+        self.embedding_cache = get_default_cache()
+        print(f"✓ embedding 초기화 완료: {self.embedding_model_name} ({self.embedding_dimension}차원)")
 
-
-    def _init_openai_embeddings(self, model: Optional[str] = None):
-        """OpenAI embedding 초기화"""
-        try:
-            from openai import OpenAI
-            self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            self.embedding_model_name = model or "text-embedding-3-large"
-            self.embedding_dimension = 3072 if "large" in self.embedding_model_name else 1536
-            print(f"✓ OpenAI embedding 초기화 완료: {self.embedding_model_name}")
-        except ImportError:
-            raise ImportError("openai 설치 필요: pip install openai")
-
-
-    def _init_qdrant_cloud(self):
-        """Qdrant Cloud 클라이언트 초기화"""
-        url = os.getenv("QDRANT_URL")
-        api_key = os.getenv("QDRANT_API_KEY")
-
-        if not url or not api_key:
-            raise ValueError(".env에 QDRANT_URL과 QDRANT_API_KEY를 설정하세요")
-
-        self.client = QdrantClient(
-            url=url,
-            api_key=api_key,
-            timeout=300  # 5분 타임아웃 (대용량 업로드 대비)
-        )
-        print(f"✓ Qdrant Cloud 연결 완료")
+        # Qdrant 클라이언트 초기화 (VECTOR_BACKEND=cloud(기본) | local | memory | numpy)
+        self.client = get_qdrant_client(vector_backend, path=local_path, timeout=300)  # 5분 타임아웃 (대용량 업로드 대비)
 
 
     def _ensure_payload_index(self) -> None:
@@ -152,24 +141,20 @@ class CertificationQdrant:
             print(f"✓ 기존 컬렉션 삭제 완료: {self.collection_name}")
 
         if not exists:
+            # 양자화/on_disk/HNSW 설정은 공용 설정(COLLECTION_QUANTIZATION 등 환경 변수)을 따름
             self.client.create_collection(
                 collection_name=self.collection_name,
-                vectors_config=VectorParams(
-                    size=self.embedding_dimension,
-                    distance=Distance.COSINE
-                )
+                **collection_create_kwargs(self.embedding_dimension)
             )
             print(f"✓ 컬렉션 생성 완료: {self.collection_name}")
         else:
             print(f"✓ 컬렉션 존재: {self.collection_name}")
+        # data_source / country / category 필터 검색용 인덱스 (기존 컬렉션에도 없으면 생성)
+        create_payload_indexes(self.client, self.collection_name)
 
     def embed_text(self, text: str) -> List[float]:
-        """OpenAI를 사용하여 텍스트의 임베딩 생성"""
-        response = self.openai_client.embeddings.create(
-            model=self.embedding_model_name,
-            input=text
-        )
-        return response.data[0].embedding
+        """임베딩 실행기(OpenAI 또는 로컬)로 텍스트의 임베딩 생성"""
+        return self.embedding_executor.embed([text])[0]
 
     def chunk_text(self, text: str) -> List[str]:
         """텍스트를 청크로 분할"""
@@ -193,7 +178,8 @@ class CertificationQdrant:
         jsonl_path: str,
         text_field: Literal["auto", "summary", "full", "combined"] = "full",
         batch_size: int = 32,
-        update_existing: bool = False
+        update_existing: bool = False,
+        incremental: bool = True
     ) -> int:
         """JSONL 파일에서 문서를 로드하고 인덱싱
 
@@ -201,135 +187,114 @@ class CertificationQdrant:
             jsonl_path: JSONL 파일 경로
             text_field: 임베딩할 필드 ("auto", "summary", "full", "combined")
             batch_size: 임베딩 배치 크기
-            update_existing: True면 기존 certification 데이터를 삭제하고 새로 업로드
+            update_existing: True면 기존 certification 데이터를 새 내용으로 갱신
+            incremental: 업데이트 모드에서 True면 바뀐 청크만 임베딩/업서트하고 사라진 청크만 삭제,
+                         False면 기존 certification 데이터를 모두 삭제하고 새로 업로드
 
         Returns:
             인덱싱된 청크 수
         """
-        # 업데이트 모드: 기존 certification 데이터 삭제
-        if update_existing:
+        # 업데이트 모드(전체 재업로드): 기존 certification 데이터 삭제
+        if update_existing and not incremental:
             self.delete_by_data_source('certification')
         print(f"\n문서 로드 중: {jsonl_path}")
 
-        # 문서 로드
-        documents = []
+        records = self._iter_chunk_records(jsonl_path, text_field)
+        self.point_vectors.bind(self.client, self.collection_name)
+        embed_texts = lambda texts: self.embedding_cache.embed(
+            self.embedding_executor.cache_name,
+            texts,
+            lambda missing: self.embedding_executor.embed(missing, max_batch_items=batch_size),
+        )
+
+        if update_existing and incremental:
+            # 기존 포인트의 content_hash와 비교하여 바뀐 청크만 업서트, 사라진 청크 삭제
+            stats = sync_data_source(
+                self.client, self.collection_name, 'certification', records, embed_texts, self._make_point,
+                extra_hash=self.embedding_executor.cache_name + self.point_vectors.hash_suffix, get_id=self._point_id,
+            )
+            total = stats['unchanged'] + stats['upserted']
+            summary = f"업서트 {stats['upserted']}개, 유지 {stats['unchanged']}개, 삭제 {stats['deleted']}개"
+        else:
+            # 로드/청킹 → 임베딩(캐시 미스분만, 요청당 최대 batch_size개) → 업로드를
+            # 제한된 큐로 연결한 스트리밍 파이프라인으로 처리 (전체 문서/벡터를 메모리에 올리지 않음)
+            with QdrantUploader(self.client, self.collection_name) as uploader:
+                total = run_ingest_pipeline(records, embed_texts, self._make_point, uploader)
+            summary = f"{total}개 point 업로드"
+
+        print(f"  임베딩 캐시: {self.embedding_cache.stats()}, API: {self.embedding_executor.stats()}")
+        print(f"✓ {self.collection_name}에 {summary} 완료")
+        return total
+
+    def _iter_chunk_records(self, jsonl_path: str, text_field: str):
+        """JSONL을 한 줄씩 읽어 청크 레코드를 하나씩 반환 (제너레이터)"""
+        num_docs = 0
+        num_chunks = 0
+        metrics = get_metrics()
+
         with open(jsonl_path, 'r', encoding='utf-8') as f:
             for line in f:
-                documents.append(json.loads(line))
-
-        print(f"✓ {len(documents)}개 문서 로드 완료")
-
-        # 메타데이터 및 텍스트 준비
-        doc_metadata = []
-        texts_to_embed = []
-
-        for doc in documents:
-            # 텍스트 필드 선택
-            if text_field == "summary":
-                text = doc.get('auto_summary', '') or doc.get('cert_subject', '')
-            elif text_field == "full":
-                text = doc.get('cert_subject', '')
-            elif text_field == "combined":
-                text = f"{doc.get('auto_summary', '')}\n\n{doc.get('cert_subject', '')}"
-            else:  # auto
-                text = doc.get('auto_summary', '') or doc.get('cert_subject', '')
-
-            # 텍스트 청킹
-            chunks = self.chunk_text(text)
-
-            for chunk_idx, chunk in enumerate(chunks):
-                doc_metadata.append({
-                    'doc': doc,
-                    'chunk_idx': chunk_idx,
-                    'total_chunks': len(chunks),
-                    'chunk_text': chunk
-                })
-                texts_to_embed.append(chunk)
-
-        print(f"✓ {len(documents)}개 문서에서 {len(texts_to_embed)}개 청크 생성 완료")
-
-        # 배치 단위로 임베딩 생성
-        print(f"\n임베딩 생성 중...")
-        all_embeddings = []
-
-        for i in range(0, len(texts_to_embed), batch_size):
-            batch_texts = texts_to_embed[i:i + batch_size]
-
-            response = self.openai_client.embeddings.create(
-                model=self.embedding_model_name,
-                input=batch_texts
-            )
-            batch_embeddings = [item.embedding for item in response.data]
-
-            all_embeddings.extend(batch_embeddings)
-
-            if (i + batch_size) % (batch_size * 10) == 0:
-                print(f"  진행: {min(i + batch_size, len(texts_to_embed))}/{len(texts_to_embed)}")
-
-        print(f"✓ {len(all_embeddings)}개 임베딩 생성 완료")
-
-        # Point 생성
-        print(f"\nQdrant point 생성 중...")
-        points = []
-
-        for metadata, embedding in zip(doc_metadata, all_embeddings):
-            doc = metadata['doc']
-
-            if isinstance(embedding, np.ndarray):
-                embedding = embedding.tolist()
-
-            point = PointStruct(
-                id=str(uuid.uuid4()),
-                vector=embedding,
-                payload={
-                    "data_source": "certification",
-                    "doc_id": f"cert_{doc['id']}",
-                    "source_doc_id": doc["id"],
-                    "title": doc['cert_name'],
-                    "content": doc['cert_subject'][:2000],
-
-                    "certification_meta": {
-                        "country": doc.get('country', ''),
-                        "category": doc.get('category', ''),
-                        "cert_type": doc.get('cert_type', ''),
-                        "main_cert": doc.get('main_cert', ''),
-                        "url": doc.get('url', ''),
-                        "summary": doc.get('auto_summary', ''),
-                    },
-
-                    "chunk_info": {
-                        "chunk_idx": metadata['chunk_idx'],
-                        "total_chunks": metadata['total_chunks'],
-                        "chunk_text": metadata['chunk_text'][:500]
-                    },
-
-                    "embedding_info": {
-                        "model": self.embedding_model_name,
-                        "provider": self.embedding_provider
+                # 줄 읽기/JSON 파싱은 load, 나머지(텍스트 선택/청킹)는 파이프라인의 chunk 단계로 기록
+                with metrics.span("load"):
+                    doc = json.loads(line)
+                num_docs += 1
+
+                # 텍스트 필드 선택
+                if text_field == "summary":
+                    text = doc.get('auto_summary', '') or doc.get('cert_subject', '')
+                elif text_field == "full":
+                    text = doc.get('cert_subject', '')
+                elif text_field == "combined":
+                    text = f"{doc.get('auto_summary', '')}\n\n{doc.get('cert_subject', '')}"
+                else:  # auto
+                    text = doc.get('auto_summary', '') or doc.get('cert_subject', '')
+
+                # 텍스트 청킹
+                chunks = self.chunk_text(text)
+                # chunk_text는 고정 간격으로 자르므로 청크 시작 위치 = 청크 번호 × 간격
+                step = self.chunk_size - (self.chunk_overlap or 0) if self.chunk_size else 0
+
+                for chunk_idx, chunk in enumerate(chunks):
+                    num_chunks += 1
+                    yield {
+                        'doc': doc,
+                        'chunk_idx': chunk_idx,
+                        'total_chunks': len(chunks),
+                        'chunk_text': chunk,
+                        'text': chunk,
+                        'start': chunk_idx * step,
+                        'end': chunk_idx * step + len(chunk),
                     }
-                }
-            )
-            points.append(point)
-
-        # Qdrant에 업로드
-        upload_batch_size = 20  # 타임아웃 방지를 위해 50에서 20으로 축소
-        print(f"Qdrant 업로드 중 (batch_size={upload_batch_size})...")
 
-        for i in range(0, len(points), upload_batch_size):
-            batch = points[i:i + upload_batch_size]
-            batch_num = i // upload_batch_size + 1
-            total_batches = (len(points) + upload_batch_size - 1) // upload_batch_size
-
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=batch,
-                wait=True
+        print(f"✓ {num_docs}개 문서에서 {num_chunks}개 청크 생성 완료")
+
+    @staticmethod
+    def _point_id(metadata: Dict) -> str:
+        """(data_source, 문서 id, 청크 span)의 UUIDv5 point id (재실행 시 같은 청크는 덮어씀)"""
+        return make_point_id('certification', metadata['doc']['id'], metadata['start'], metadata['end'])
+
+    def _make_point(self, metadata: Dict, embedding) -> PointStruct:
+        """청크 메타데이터와 임베딩으로 Qdrant point 생성"""
+        doc = metadata['doc']
+
+        if isinstance(embedding, np.ndarray):
+            embedding = embedding.tolist()
+
+        return PointStruct(
+            id=self._point_id(metadata),
+            vector=self.point_vectors(embedding, metadata['text']),
+            # 공통 최소 payload (중첩 메타데이터/요약/임베딩 정보는 검색 응답에 불필요하므로 저장하지 않음)
+            payload=make_payload(
+                "certification",
+                metadata['chunk_text'],
+                source=doc['cert_name'],
+                chunk_id=f"cert_{doc['id']}_{metadata['chunk_idx']}",
+                doc_id=f"cert_{doc['id']}",
+                country=doc.get('country'),
+                category=doc.get('category'),
+                url=doc.get('url'),
             )
-
-            print(f"  - 배치 {batch_num}/{total_batches} 업로드 완료 ({len(batch)}개)")
-
-        print(f"✓ {self.collection_name}에 {len(points)}개 point 업로드 완료")
-        return len(points)
+        )
 
     def get_collection_info(self) -> Dict:
         """컬렉션 정보 조회"""
@@ -1,6 +1,6 @@
 import json
-import re
 import os
+import sys
 import hashlib
 from pathlib import Path
 from itertools import groupby
@@ -9,7 +9,24 @@ from dotenv import load_dotenv
 # RAG 관련
 import openai
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import PointStruct
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.embedding_cache import get_default_cache
+from common.backends import get_embedder, get_qdrant_client
+from common.qdrant_uploader import QdrantUploader
+from common.pipeline import run_ingest_pipeline
+from common.index_sync import sync_data_source
+from common.collection_provisioning import collection_create_kwargs, create_payload_indexes
+from common.matryoshka import NATIVE_DIMENSIONS, embedding_dimensions
+from common.sparse_vectors import HybridVectors
+from common.payload_schema import make_payload
+from common.span_aligner import align_spans
+from common.small_to_big import link_parents
+from common.metrics import get_metrics, write_run_report
+
+# dense 벡터 + BM25 희소 벡터 (컬렉션에 bm25 설정이 있을 때, "제25조" 같은 조문 번호 검색용)
+point_vectors = HybridVectors()
 
 # Deprecation 경고 무시
 import warnings
@@ -38,7 +55,15 @@ class CONFIG_UPLOAD:
     # "Ho_Segmented": 가장 세분화된 단위 (기본)
     # "Paragraph": '항' 단위로 병합
     # "Article": '조' 단위로 병합
-    CHUNK_STRATEGY = "Article"
+    # "Hierarchical": 호/항/조 세 단위를 모두 색인하고 상위 단위 링크(parent_id, article_id)를 저장
+    #                 (검색은 작은 단위로 매칭하고 감싸는 조문을 중복 없이 반환 - small-to-big)
+    CHUNK_STRATEGY = "Hierarchical"
+
+    # --- 4-1. 증분 동기화 여부 ---
+    # True: 컬렉션의 기존 'cisg' 포인트와 비교하여 바뀐 청크만 임베딩/업서트하고,
+    #       이번 청크 목록에 없는 'cisg' 포인트(예: 이전 전략으로 올린 청크)는 삭제합니다.
+    # False: 모든 청크를 업서트만 합니다. (삭제 없음)
+    INCREMENTAL_SYNC = True
 
     # --- 5. 환경 변수 키 이름 (.env 파일에서 로드) ---
     QDRANT_URL_KEY = "QDRANT_URL"
@@ -59,25 +84,26 @@ def get_model_handler(model_name: str, keys: dict) -> dict:
         raise ValueError(f"OpenAI 모델만 지원합니다. 'openai_'로 시작하는 모델명을 사용하세요: {model_name}")
 
     model_id = model_name.split('_', 1)[1]
-    client = openai.OpenAI(api_key=keys['openai'])
+    # EMBED_BACKEND=local이면 OpenAI 키 없이 로컬 해시 임베딩 사용
+    client = openai.OpenAI(api_key=keys['openai']) if keys.get('openai') else None
 
-    # 모델별 차원 설정
-    if model_id == "text-embedding-3-large":
-        dim = 3072
-    elif model_id == "text-embedding-ada-002":
-        dim = 1536
-    else:
+    # 모델별 차원 설정 (EMBED_DIMENSIONS가 있으면 Matryoshka 축소 차원)
+    if model_id not in NATIVE_DIMENSIONS:
         raise ValueError(f"지원되지 않는 OpenAI 모델입니다: {model_id}")
+    dim = embedding_dimensions(model_id)
+
+    # 임베딩 함수 정의 (캐시 미스분만 토큰 예산 기반 동시 요청)
+    cache = get_default_cache()
+    executor = get_embedder(model_id, client=client, dim=dim)
 
-    # 임베딩 함수 정의
     def embed_texts(texts: list) -> list:
-        response = client.embeddings.create(input=texts, model=model_id)
-        return [item.embedding for item in response.data]
+        return cache.embed(executor.cache_name, texts, executor.embed)
 
-    print(f"  [모델 로더] OpenAI '{model_id}' 핸들러 생성 완료 (차원: {dim})")
+    print(f"  [모델 로더] '{executor.model}' 핸들러 생성 완료 (차원: {dim})")
     return {
-        "name": model_name,
+        "name": model_name if executor.cache_name == model_id else executor.cache_name,
         "embed_texts": embed_texts,
+        "executor": executor,
         "dim": dim
     }
 
@@ -103,12 +129,18 @@ def load_base_chunks(path) -> list:
     return chunks
 
 def attach_chunk_spans(text: str, chunks: list) -> list:
-    """청크의 content를 원본 text와 비교하여 'start', 'end' 위치를 찾습니다."""
+    """
+    청크의 content를 원본 text와 비교하여 'start', 'end' 위치를 찾습니다.
+
+    공백 정규화 뷰 + Aho–Corasick으로 모든 청크를 원문 한 번 탐색으로 정렬합니다. (common.span_aligner)
+    줄바꿈/공백만 다른 청크도 원문 span을 정확히 찾고, 순서가 어긋난 청크도 버리지 않습니다.
+    """
     print(f"  [SPAN] 청크 위치(span) 계산 중...")
-    current_search_idx, not_found = 0, 0
+    not_found = 0
     new_chunks = []
     skipped_chunks = []  # 누락된 청크 추적
 
+    candidates = []
     for i, chunk in enumerate(chunks):
         chunk_id = chunk.get("chunk_id")
         if not chunk_id:
@@ -117,33 +149,34 @@ def attach_chunk_spans(text: str, chunks: list) -> list:
             continue
         chunk["id"] = chunk_id
 
-        json_content = chunk.get("content")
-        if not json_content:
+        if not chunk.get("content"):
             not_found += 1
             skipped_chunks.append({"index": i, "chunk_id": chunk_id, "reason": "content 없음"})
             continue
+        candidates.append((i, chunk))
 
-        start = text.find(json_content, current_search_idx)
-        if start == -1:
-            temp_content = re.sub(r'\s+', ' ', json_content).strip()
-            start = text.find(temp_content, current_search_idx)
-        if start == -1:
-            print(f"    ⚠ 청크 #{i} ('{chunk_id}') span 찾기 실패. 스킵.")
+    spans, stats = align_spans(text, [chunk["content"] for _, chunk in candidates])
+    for (i, chunk), span in zip(candidates, spans):
+        if span is None:
+            json_content = chunk["content"]
+            print(f"    ⚠ 청크 #{i} ('{chunk['chunk_id']}') span 찾기 실패. 스킵.")
             not_found += 1
             skipped_chunks.append({
                 "index": i,
-                "chunk_id": chunk_id,
+                "chunk_id": chunk["chunk_id"],
                 "reason": "원본에서 찾을 수 없음",
                 "content_preview": json_content[:100] + "..." if len(json_content) > 100 else json_content
             })
             continue
 
-        end = start + len(json_content)
-        chunk["text"] = text[start:end]  # 'text' 필드 표준화
+        start, end = span
+        chunk["text"] = text[start:end]  # 'text' 필드 표준화 (원문 그대로의 구간)
         chunk["start"] = start
         chunk["end"] = end
         new_chunks.append(chunk)
-        current_search_idx = end
+
+    if stats["out_of_order"]:
+        print(f"    [SPAN] 목록 순서와 원문 순서가 다른 청크 {stats['out_of_order']}개도 위치를 찾아 사용")
 
     # 누락된 청크가 있으면 경고 출력
     if skipped_chunks:
@@ -166,6 +199,7 @@ def merge_chunks(base_chunks: list, strategy_name: str, raw_text: str) -> list:
     print(f"  [Chunking] 전략 '{strategy_name}' 실행 중...")
     
     if strategy_name == "Ho_Segmented":
+        used_ids = set()
         for chunk in base_chunks:
             chunk['strategy_name'] = strategy_name
             # 데이터소스  구분용 메타데이터
@@ -173,6 +207,10 @@ def merge_chunks(base_chunks: list, strategy_name: str, raw_text: str) -> list:
             # 동일하게 생성되는 ID 생성
             if 'id' not in chunk or len(chunk.get('id', '')) > 20:
                 id_string = f"CISG_{chunk.get('article', 'unknown')}_{chunk.get('paragraph_no', 'unknown')}_{chunk.get('ho_no', 'unknown')}"
+                # 항/호 번호가 없는 청크끼리 같은 키가 되면 시작 위치를 붙여 구분 (덮어쓰기 방지)
+                if id_string in used_ids:
+                    id_string = f"{id_string}_{chunk['start']}"
+                used_ids.add(id_string)
                 chunk['id'] = hashlib.md5(id_string.encode()).hexdigest()
         print(f"    [Chunking] '{strategy_name}' 완료. {len(base_chunks)}개 청크 사용.")
         return base_chunks
@@ -185,11 +223,17 @@ def merge_chunks(base_chunks: list, strategy_name: str, raw_text: str) -> list:
         raise ValueError(f"알 수 없는 병합 전략: {strategy_name}")
 
     merged_chunks = []
+    seen_keys = set()
     base_chunks.sort(key=lambda x: x['start'])
     
     for key, group in groupby(base_chunks, key=get_key):
         if key is None or (isinstance(key, tuple) and None in key):
             continue
+        if key in seen_keys:
+            # 같은 조/항이 떨어진 위치에 다시 나오면 (예: 절 제목에 잘못 붙은 조 번호) 첫 그룹만 사용
+            print(f"    ⚠ '{key}' 청크가 연속되지 않은 위치에 다시 나와 스킵합니다.")
+            continue
+        seen_keys.add(key)
             
         group_list = list(group)
         first_chunk = group_list[0]
@@ -225,6 +269,44 @@ def merge_chunks(base_chunks: list, strategy_name: str, raw_text: str) -> list:
 
 
 
+def build_hierarchy(base_chunks: list, raw_text: str) -> list:
+    """
+    호/항/조 세 단위 청크를 모두 만들고 span 포함 관계로 상위 단위를 연결합니다.
+    (호 → 항 → 조, 감싸는 항이 없는 호는 조에 바로 연결)
+    """
+    print(f"  [Chunking] 전략 'Hierarchical' 실행 중...")
+    ho_chunks = merge_chunks([dict(c) for c in base_chunks], "Ho_Segmented", raw_text)
+    paragraphs = merge_chunks([dict(c) for c in base_chunks], "Paragraph", raw_text)
+    articles = merge_chunks([dict(c) for c in base_chunks], "Article", raw_text)
+
+    link_parents(paragraphs, articles)
+    for paragraph in paragraphs:
+        paragraph["article_id"] = paragraph["parent_id"]
+
+    # 호는 감싸는 항에 연결하고, 항이 없으면(항 번호 없는 조 등) 조에 바로 연결
+    link_parents(ho_chunks, paragraphs)
+    article_of = {p["id"]: p["article_id"] for p in paragraphs}
+    link_parents([ch for ch in ho_chunks if ch["parent_id"] is None], articles)
+    for ch in ho_chunks:
+        ch["article_id"] = article_of.get(ch["parent_id"], ch["parent_id"])
+
+    for article in articles:
+        article["parent_id"] = None
+        article["article_id"] = article["id"]
+
+    for level, chunks in (("ho", ho_chunks), ("paragraph", paragraphs), ("article", articles)):
+        for ch in chunks:
+            ch["level"] = level
+            ch["strategy_name"] = "Hierarchical"
+
+    orphans = sum(1 for ch in ho_chunks + paragraphs if ch["article_id"] is None)
+    print(
+        f"    [Chunking] 'Hierarchical' 완료. 호 {len(ho_chunks)} + 항 {len(paragraphs)} + 조 {len(articles)}개"
+        f" (조에 속하지 않는 청크 {orphans}개는 단독 사용)"
+    )
+    return articles + paragraphs + ho_chunks
+
+
 # ----------------------------------------------------
 # Qdrant 업로드 함수 (핵심 로직)
 # ----------------------------------------------------
@@ -237,42 +319,53 @@ def create_collection_if_not_exists(client: QdrantClient, collection_name: str,
         print(f"  [QDRANT] 컬렉션 '{collection_name}'이(가) 이미 존재합니다. 데이터를 추가(upsert)합니다.")
     else:
         print(f"  [QDRANT] 새 컬렉션 '{collection_name}'을(를) 생성합니다. (dim={vector_size})")
+        # 양자화/on_disk/HNSW 설정은 공용 설정(COLLECTION_QUANTIZATION 등 환경 변수)을 따름
         client.create_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+            **collection_create_kwargs(vector_size),
         )
+        # data_source / country / category 필터 검색용 인덱스
+        create_payload_indexes(client, collection_name)
 
-def upload_to_qdrant(client: QdrantClient, collection_name: str, model_handler: dict, chunks: list, batch_size: int = 20):
+def make_point(ch: dict, vec) -> PointStruct:
     """
-    청크 리스트를 임베딩하여 Qdrant에 'upsert' (추가 또는 덮어쓰기)합니다.
-    대용량 데이터를 처리하기 위해 배치 단위로 업로드합니다.
+    청크 → Qdrant 포인트 (payload는 공통 최소 스키마: 청크 dict 전체 대신 검색/인용에 필요한 필드만)
     """
-    texts = [c["text"] for c in chunks]
-    print(f"    [QDRANT] 임베딩 계산 중 ({model_handler['name']}, {len(texts)}개)...")
-
-    # 모델 핸들러를 사용해 텍스트를 벡터로 변환
-    embeddings = model_handler['embed_texts'](texts)
-
-    # Qdrant에 저장할 'Point' 객체 생성
-    points = [
-        PointStruct(id=ch["id"], vector=vec, payload=ch)
-        for vec, ch in zip(embeddings, chunks)
-    ]
-
-    # 배치 단위로 업로드
-    total_points = len(points)
-    print(f"    [QDRANT] 배치 업로드 시작 (총 {total_points}개, 배치 크기: {batch_size})...")
-
-    for i in range(0, total_points, batch_size):
-        batch = points[i:i + batch_size]
-        batch_num = i // batch_size + 1
-        total_batches = (total_points + batch_size - 1) // batch_size
-
-        print(f"      - 배치 {batch_num}/{total_batches} 업로드 중 ({len(batch)}개)...")
-        # 'upsert'는 ID가 없으면 새로 추가하고, ID가 이미 있으면 덮어쓰는 '안전한' 명령어입니다.
-        client.upsert(collection_name=collection_name, points=batch, wait=True)
+    return PointStruct(
+        id=ch["id"],
+        vector=point_vectors(vec, ch["text"]),
+        payload=make_payload(
+            "cisg",
+            ch["text"],
+            source=f"CISG Article {ch.get('article')}",
+            chunk_id=ch.get("chunk_id"),
+            article=ch.get("article"),
+            paragraph_no=ch.get("paragraph_no"),
+            level=ch.get("level"),
+            parent_id=ch.get("parent_id"),
+            article_id=ch.get("article_id"),
+        ),
+    )
+
+def upload_to_qdrant(client: QdrantClient, collection_name: str, model_handler: dict, chunks):
+    """
+    청크를 임베딩하여 Qdrant에 'upsert' (추가 또는 덮어쓰기)합니다.
+    embed → upsert 단계를 제한된 큐로 연결한 스트리밍 파이프라인으로 처리하므로,
+    업로드가 다음 윈도우의 임베딩과 겹쳐서 진행되고 전체 벡터를 메모리에 올리지 않습니다.
+    """
+    print(f"    [QDRANT] 임베딩/업로드 파이프라인 시작 ({model_handler['name']})...")
+
+    # 'upsert'는 ID가 없으면 새로 추가하고, ID가 이미 있으면 덮어쓰는 '안전한' 명령어입니다.
+    with QdrantUploader(client, collection_name) as uploader:
+        total = run_ingest_pipeline(
+            chunks,
+            model_handler['embed_texts'],
+            make_point,
+            uploader,
+        )
 
-    print(f"    [QDRANT] {total_points}개 벡터 업로드/업데이트 완료.")
+    print(f"    [QDRANT] {total}개 벡터 업로드/업데이트 완료.")
+    print(f"    [CACHE] 임베딩 캐시: {get_default_cache().stats()}, API: {model_handler['executor'].stats()}")
 
 
 
@@ -291,17 +384,27 @@ def main_upload():
             'openai': os.getenv(CONFIG_UPLOAD.OPENAI_API_KEY)
         }
 
-        # 필수 키 확인
-        missing_keys = [k for k, v in keys.items() if not v]
+        # 필수 키 확인 (로컬 백엔드를 쓰면 해당 키는 필요 없음)
+        vector_backend = os.getenv("VECTOR_BACKEND", "cloud")
+        required = []
+        if vector_backend == "cloud":
+            required += ['qdrant_url', 'qdrant_api']
+        if os.getenv("EMBED_BACKEND", "openai") == "openai":
+            required.append('openai')
+        missing_keys = [k for k in required if not keys[k]]
         if missing_keys:
             raise ValueError(f"누락된 환경 변수: {missing_keys}")
 
         # Qdrant DB에 연결합니다. (timeout 증가: 대용량 업로드 대비)
-        qdrant_client = QdrantClient(
-            url=keys['qdrant_url'],
-            api_key=keys['qdrant_api'],
-            timeout=300  # 5분 타임아웃 (기본값: 60초)
-        )
+        if vector_backend == "cloud":
+            qdrant_client = QdrantClient(
+                url=keys['qdrant_url'],
+                api_key=keys['qdrant_api'],
+                timeout=300  # 5분 타임아웃 (기본값: 60초)
+            )
+        else:
+            # VECTOR_BACKEND=local | memory | numpy (네트워크 없이 실행)
+            qdrant_client = get_qdrant_client(vector_backend)
         print("  [메인] Qdrant 및 API 키 로드 완료.")
     except Exception as e:
         print(f"🚨 [오류] 환경 변수 로드 실패. .env 파일에 필요한 키 3개를 모두 설정했는지 확인하세요.")
@@ -311,12 +414,16 @@ def main_upload():
 
     print("\n--- (2/3) 데이터 준비: 로드, 정제, 청킹 ---")
 
+    metrics = get_metrics()
+
     # 1. 원본 텍스트와 기반 청크(cisg_chunks.json)를 로드합니다.
-    raw_text = load_document(CONFIG_UPLOAD.DOCUMENT_PATH)
-    base_chunks_raw = load_base_chunks(CONFIG_UPLOAD.BASE_CHUNKS_PATH)
+    with metrics.span("load"):
+        raw_text = load_document(CONFIG_UPLOAD.DOCUMENT_PATH)
+        base_chunks_raw = load_base_chunks(CONFIG_UPLOAD.BASE_CHUNKS_PATH)
     
     # 2. 청크의 'start'/'end' 위치를 계산합니다. (매우 중요)
-    base_chunks_ready = attach_chunk_spans(raw_text, base_chunks_raw)
+    with metrics.span("chunk"):
+        base_chunks_ready = attach_chunk_spans(raw_text, base_chunks_raw)
     
     if not base_chunks_ready:
         print("🚨 [오류] 유효한 기반 청크가 없습니다. BASE_CHUNKS_PATH 파일과 DOCUMENT_PATH 파일의 내용이 일치하는지 확인하세요.")
@@ -324,7 +431,11 @@ def main_upload():
         
     # 3. (2)번 설정에서 선택한 '청킹 전략'을 실행합니다.
     # 예: 'Paragraph'를 선택했다면, 'Ho_Segmented' 청크들을 'Paragraph' 단위로 병합합니다.
-    chunks_to_upload = merge_chunks(base_chunks_ready, CONFIG_UPLOAD.CHUNK_STRATEGY, raw_text)
+    with metrics.span("chunk"):
+        if CONFIG_UPLOAD.CHUNK_STRATEGY == "Hierarchical":
+            chunks_to_upload = build_hierarchy(base_chunks_ready, raw_text)
+        else:
+            chunks_to_upload = merge_chunks(base_chunks_ready, CONFIG_UPLOAD.CHUNK_STRATEGY, raw_text)
 
     if not chunks_to_upload:
         print(f"🚨 [오류] '{CONFIG_UPLOAD.CHUNK_STRATEGY}' 전략으로 청크를 생성하지 못했습니다.")
@@ -343,20 +454,41 @@ def main_upload():
             CONFIG_UPLOAD.COLLECTION_NAME, 
             model_handler['dim']
         )
+        point_vectors.bind(qdrant_client, CONFIG_UPLOAD.COLLECTION_NAME)
         
         # 6. 최종 청크를 임베딩하여 Qdrant에 업로드(Upsert)합니다.
-        upload_to_qdrant(
-            qdrant_client,
-            CONFIG_UPLOAD.COLLECTION_NAME,
-            model_handler,
-            chunks_to_upload
-        )
+        if CONFIG_UPLOAD.INCREMENTAL_SYNC:
+            # 바뀐 청크만 업서트, 더 이상 없는 cisg 청크는 삭제
+            sync_data_source(
+                qdrant_client,
+                CONFIG_UPLOAD.COLLECTION_NAME,
+                'cisg',
+                chunks_to_upload,
+                model_handler['embed_texts'],
+                make_point,
+                extra_hash=model_handler['name'] + point_vectors.hash_suffix,
+            )
+        else:
+            upload_to_qdrant(
+                qdrant_client,
+                CONFIG_UPLOAD.COLLECTION_NAME,
+                model_handler,
+                chunks_to_upload
+            )
         
         print(f"\n🎉 === 업로드 성공! ===")
         print(f"  - 컬렉션: {CONFIG_UPLOAD.COLLECTION_NAME}")
         print(f"  - 청크 수: {len(chunks_to_upload)}개")
         print(f"  - 모델: {CONFIG_UPLOAD.MODEL_NAME}")
 
+        # 단계별 시간/토큰/업로드 바이트/재시도 리포트 (JSON + Prometheus text)
+        write_run_report("cisg", {
+            "collection": CONFIG_UPLOAD.COLLECTION_NAME,
+            "chunk_strategy": CONFIG_UPLOAD.CHUNK_STRATEGY,
+            "chunks": len(chunks_to_upload),
+            "embed_model": model_handler['name'],
+        })
+
     except Exception as e:
         print(f"🚨 [오류] 업로드 작업 중 심각한 오류 발생: {e}")
         import traceback
@@ -1,90 +1,152 @@
+import sys
 from pathlib import Path
 from types import SimpleNamespace
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams, PointStruct, Filter
-import os
+from qdrant_client.http.models import PointStruct
 from dotenv import load_dotenv
 import json
 import time
-import uuid
+import tiktoken
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.embedding_cache import get_default_cache
+from common.backends import get_embedder, get_qdrant_client
+from common.qdrant_uploader import QdrantUploader
+from common.pipeline import run_ingest_pipeline
+from common.index_sync import make_point_id, sync_data_source
+from common.collection_provisioning import collection_create_kwargs, create_payload_indexes
+from common.matryoshka import embedding_dimensions
+from common.sparse_vectors import HybridVectors
+from common.payload_schema import make_payload
+from common.text_dedup import dedup_records
+from common.metrics import get_metrics, write_run_report
 
 load_dotenv()
 
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-
-qdrant_client = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY,
+# VECTOR_BACKEND=cloud(기본) | local | memory | numpy
+qdrant_client = get_qdrant_client(
     check_compatibility=False,
     timeout=300  # 5분 타임아웃 (대용량 업로드 대비)
 )
 
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-large",
-    api_key=os.getenv("OPENAI_API_KEY")
-)
-
-def docs_to_lists(docs):
-    texts = [d.page_content for d in docs]
-    metadatas = [getattr(d, "metadata", {}) for d in docs]
-    ids = [str(i) for i in range(len(docs))]
-    return texts, metadatas, ids
+EMBED_MODEL = "text-embedding-3-large"
+EMBED_DIM = embedding_dimensions(EMBED_MODEL)  # 기본 3072, EMBED_DIMENSIONS로 축소 (Matryoshka)
+
+# 토큰 예산 기반 동시 임베딩 (RPM/TPM, retry-after 반영), EMBED_BACKEND=local이면 로컬 해시 임베딩
+embed_executor = get_embedder(EMBED_MODEL, dim=EMBED_DIM)
+# dense 벡터 + BM25 희소 벡터 (컬렉션에 bm25 설정이 있을 때, 조문 번호/코드 등 어휘 일치 검색용)
+point_vectors = HybridVectors()
+
+# 변경되지 않은 청크는 디스크 캐시에서 재사용 (임베딩 API 호출 없음)
+embedding_cache = get_default_cache()
+
+# True: 기존 claim 포인트와 비교하여 바뀐 청크만 업서트하고 사라진 청크는 삭제 (증분 동기화)
+# False: 모든 청크를 업서트 (같은 청크는 결정적 ID로 덮어씀)
+INCREMENTAL_SYNC = True
+
+# 적재 전 중복 제거: 완전 중복 청크는 첫 청크 하나로 합치고(payload의 merged_chunk_ids에 기록),
+# 유사 중복(MinHash Jaccard 추정치 ≥ NEAR_DUP_THRESHOLD)은 대표 청크의 벡터를 재사용 (None이면 완전 중복만)
+DEDUP = True
+NEAR_DUP_THRESHOLD = 0.9
+# 절감량 리포트의 임베딩 토큰 수 계산용
+encoding = tiktoken.encoding_for_model(EMBED_MODEL)
+
+# 단계별 시간/카운터 (실행 끝에 JSON + Prometheus text 리포트로 저장)
+metrics = get_metrics()
+
+def point_id(record):
+    # (data_source, 원본 행, 청크 span)의 UUIDv5 → 재실행 시 중복 없이 덮어씀
+    metadata = record["metadata"]
+    start = metadata["start_index"]
+    return make_point_id("claim", metadata["row_index"], start, start + len(record["text"]))
+
+def make_point(record, vector):
+    metadata = record["metadata"] or {}
+    # 공통 최소 payload (원본 JSON 메타데이터 전체는 저장하지 않음)
+    payload = make_payload(
+        "claim",  # 데이터 출처 식별용
+        record["text"],
+        source=metadata.get("document_name", "무역클레임중재QA"),
+        chunk_id=metadata.get("chunk_id"),
+        merged_chunk_ids=metadata.get("merged_chunk_ids"),
+    )
+    # UUID를 사용하여 다른 데이터 소스와 ID 충돌 방지
+    return PointStruct(
+        id=point_id(record),  # 정수 ID 대신 UUID 사용
+        vector=point_vectors(vector, record["text"]),
+        payload=payload
+    )
 
-def upsert_collection(collection_name, docs, batch_size=20):
-    texts, metadatas, ids = docs_to_lists(docs)
+def merge_duplicate(kept, duplicate):
+    # 같은 텍스트의 청크는 한 포인트로 저장하고, 합쳐진 청크 ID를 남겨 출처를 추적
+    kept["metadata"].setdefault("merged_chunk_ids", []).append(duplicate["metadata"].get("chunk_id"))
 
-    # OpenAI 임베딩 생성
-    print(f"  임베딩 생성 중... ({len(texts)}개)")
-    vectors = embeddings.embed_documents(texts)
-    vector_size = len(vectors[0])
+def print_dedup_report(report):
+    print(
+        f"  [DEDUP] 청크 {report['input_chunks']}개 → 포인트 {report['points']}개 "
+        f"(완전 중복 {report['exact_duplicates_merged']}개 병합, 유사 중복 {report['near_duplicates_shared_vector']}개 벡터 공유)"
+    )
+    print(
+        f"  [DEDUP] 임베딩 입력 {report['embedded_texts']}개 (-{report['embed_inputs_saved']}개), "
+        f"토큰 {report['embed_tokens']:,} (-{report['embed_tokens_saved']:,}, {report['embed_tokens_saved_ratio']:.1%}), "
+        f"인덱스 RAM -{report['index_saved']['estimated_ram_mb']}MB"
+    )
 
+def upsert_collection(collection_name, docs):
     # 컬렉션이 존재하지 않을 경우에만 생성 (기존 데이터 보존)
     try:
         qdrant_client.get_collection(collection_name)
         print(f"✓ 컬렉션 '{collection_name}' 이미 존재함 (기존 데이터 유지)")
     except:
+        # 양자화/on_disk/HNSW 설정은 공용 설정(COLLECTION_QUANTIZATION 등 환경 변수)을 따름
         qdrant_client.create_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+            **collection_create_kwargs(EMBED_DIM),
         )
+        # data_source / country / category 필터 검색용 인덱스
+        create_payload_indexes(qdrant_client, collection_name)
         print(f"✓ 새 컬렉션 '{collection_name}' 생성 완료")
+    point_vectors.bind(qdrant_client, collection_name)
 
-    # UUID를 사용하여 다른 데이터 소스와 ID 충돌 방지
-    points = []
-    for idx, (text, metadata, vector) in enumerate(zip(texts, metadatas, vectors)):
-        payload = {
-            **(metadata or {}),
-            "text": text,
-            "data_source": "claim"  # 데이터 출처 식별용
-        }
-        points.append(PointStruct(
-            id=str(uuid.uuid4()),  # 정수 ID 대신 UUID 사용
-            vector=vector,
-            payload=payload
-        ))
-
-    # 페이로드 크기 제한을 피하기 위한 배치 업로드
-    total_points = len(points)
-    total_batches = (total_points + batch_size - 1) // batch_size
-    print(f"  배치 업로드 시작 (총 {total_points}개, 배치 크기: {batch_size})...")
-
-    for i in range(0, total_points, batch_size):
-        batch = points[i:i + batch_size]
-        batch_num = i // batch_size + 1
-        qdrant_client.upsert(collection_name=collection_name, points=batch, wait=True)
-        print(f"    - 배치 {batch_num}/{total_batches} 업로드 완료 ({len(batch)}개)")
-
-    print(f"✓ [{collection_name}] {len(docs)}개 문서 업로드 완료")
-    return collection_name
+    # 청크 스트림 → OpenAI 임베딩 → 업로드 (단계 사이 큐 크기가 제한된 스트리밍 파이프라인)
+    records = (
+        {"text": d.page_content, "metadata": getattr(d, "metadata", {})}
+        for d in docs
+    )
+    embed_texts = lambda texts: embedding_cache.embed(embed_executor.cache_name, texts, embed_executor.embed)
+    dedup = None
+    if DEDUP:
+        # 합칠 중복을 모두 알아야 하므로 청크 레코드를 한 번 모은 뒤 파이프라인에 전달
+        # (청킹은 레코드를 모으는 동안 일어나므로 chunk 단계, 나머지는 dedup 단계로 기록)
+        with metrics.span("dedup"):
+            dedup = dedup_records(metrics.timed_iter(records, "chunk"), NEAR_DUP_THRESHOLD, merge=merge_duplicate)
+        records = dedup.records
+        embed_texts = dedup.wrap_embed(embed_texts)
+    print(f"  임베딩/업로드 파이프라인 시작...")
+    if INCREMENTAL_SYNC:
+        stats = sync_data_source(
+            qdrant_client, collection_name, "claim", records, embed_texts, make_point,
+            extra_hash=embed_executor.cache_name + point_vectors.hash_suffix, get_id=point_id,
+        )
+        total = stats["unchanged"] + stats["upserted"]
+    else:
+        with QdrantUploader(qdrant_client, collection_name) as uploader:
+            total = run_ingest_pipeline(records, embed_texts, make_point, uploader)
+
+    if dedup is not None:
+        report = dedup.report(lambda text: len(encoding.encode_ordinary(text)), EMBED_DIM)
+        print_dedup_report(report)
+        for key in ("exact_duplicates_merged", "near_duplicates_shared_vector", "embed_inputs_saved", "embed_tokens_saved"):
+            metrics.inc(f"dedup_{key}", report[key])
+    print(f"  임베딩 캐시: {embedding_cache.stats()}, API: {embed_executor.stats()}")
+    print(f"✓ [{collection_name}] {total}개 문서 업로드 완료")
+    return total
 
 
 # JSON 텍스트 데이터 로드
 json_path = Path('./used_data/사례_응답_근거조항.json')
 
-with json_path.open('r', encoding='utf-8') as f:
+with metrics.span("load"), json_path.open('r', encoding='utf-8') as f:
     json_records = json.load(f)
 
 text_docs = []
@@ -116,35 +178,41 @@ chunk_configs = [
     {"size": 512, "overlap": 77, "collection": "trade_collection"}
 ]
 
-chunk_collections = {}
-for cfg in chunk_configs:
+def iter_chunk_docs(docs, cfg):
+    """문서를 청크 단위로 하나씩 반환 (제너레이터)"""
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=cfg['size'],
         chunk_overlap=cfg['overlap'],
+        add_start_index=True,  # 원문 내 청크 시작 위치 (포인트 ID용 span)
     )
-    docs = []
-    for doc in text_docs:
-        chunks = splitter.split_text(doc.page_content)
+    for doc in docs:
+        chunks = splitter.create_documents([doc.page_content])
         for cid, chunk in enumerate(chunks):
-            docs.append(SimpleNamespace(
-                page_content=chunk,
+            yield SimpleNamespace(
+                page_content=chunk.page_content,
                 metadata={
                     **doc.metadata,
                     'chunk_size': cfg['size'],
                     'chunk_id': f"{doc.metadata.get('row_index')}_{cid}",
+                    'start_index': chunk.metadata['start_index'],
                     'source': f"json_chunk_{cfg['size']}"
                 }
-            ))
-    chunk_collections[cfg['collection']] = docs
-    print(f"청크 {cfg['size']}자: {len(docs)}개 생성")
+            )
 
-# Qdrant 업로드
+# 청크 생성 → Qdrant 업로드 (스트리밍)
 for cfg in chunk_configs:
-    docs = chunk_collections.get(cfg['collection'], [])
-    if not docs:
+    start_time = time.time()
+    total = upsert_collection(cfg['collection'], iter_chunk_docs(text_docs, cfg))
+    if not total:
         print(f"  ⚠ {cfg['collection']} 업로드할 문서가 없습니다.")
         continue
-    start_time = time.time()
-    upsert_collection(cfg['collection'], docs)
     elapsed = time.time() - start_time
-    print(f"  ✓ {cfg['collection']} 업로드 완료 ({elapsed:.2f}s)")
\ No newline at end of file
+    print(f"  ✓ {cfg['collection']} 청크 {cfg['size']}자 {total}개 업로드 완료 ({elapsed:.2f}s)")
+
+# 단계별 시간/토큰/업로드 바이트/재시도 리포트 (JSON + Prometheus text)
+write_run_report("claim", {
+    "collections": [cfg['collection'] for cfg in chunk_configs],
+    "documents": len(text_docs),
+    "embed_model": embed_executor.cache_name,
+    "embedding_cache": embedding_cache.stats(),
+})
@@ -0,0 +1,9 @@
+"""
+벡터화 파이프라인 공용 모듈
+
+각 *_vectorization 스크립트는 자신의 폴더에서 직접 실행되므로,
+다음과 같이 data_embedding 폴더를 sys.path에 추가한 뒤 import 합니다.
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from common.embedding_cache import get_default_cache
+"""
@@ -0,0 +1,194 @@
+"""
+의미 기반 답변 캐시 (semantic answer cache)
+
+에이전트 전체 실행(gpt-4o 호출 + 검색 tool 호출) 앞에 두어, 이미 답한 질문과 의미가 같은 질문이면
+저장된 최종 답변을 바로 반환합니다.
+- 질문 임베딩 → 로컬 NumPy 플랫 인덱스 (NumpyFlatIndex, 디스크 저장)
+- payload: 질문, 답변, 인용한 모든 포인트 ID별 content_hash, 생성 시각
+- 조회 시 인용 포인트의 현재 content_hash를 trade_collection에서 다시 읽어,
+  재색인으로 하나라도 바뀌었거나 삭제되었거나 content_hash가 없으면 해당 항목을 지우고 미스로 처리
+  (content_hash가 없는 인용 포인트가 있으면 무효화를 확인할 수 없으므로 저장하지 않음)
+- 인덱스 검색/저장(NumPy 연산 + 디스크 쓰기)은 이벤트 루프를 막지 않도록 asyncio.to_thread로 실행
+- 디스크 저장은 인덱스 전체를 다시 쓰므로 쓰기마다 하지 않고 ANSWER_CACHE_FLUSH초마다 + 종료 시 한 번
+
+    ANSWER_CACHE            = 1      0이면 사용 안 함
+    ANSWER_CACHE_THRESHOLD  = 0.95   코사인 유사도 기준 (낮추면 적중률↑, 다른 질문에 답할 위험↑)
+    ANSWER_CACHE_TTL        = 7일    초 단위
+    ANSWER_CACHE_DIR                 저장 폴더
+    ANSWER_CACHE_FLUSH      = 30     디스크 저장 최소 간격(초, 0이면 쓰기마다 저장)
+"""
+
+import asyncio
+import atexit
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from qdrant_client.models import Distance, PointIdsList, PointStruct, VectorParams
+
+from .embedding_cache import default_cache_dir, make_cache_key
+from .numpy_index import NumpyFlatIndex
+
+
+# 기본값 (검색 스크립트가 load_dotenv()를 import 이후에 호출하므로 환경 변수는 캐시를 만들 때 읽음)
+ANSWER_CACHE_ENABLED = "1"               # ANSWER_CACHE
+ANSWER_CACHE_THRESHOLD = 0.95            # ANSWER_CACHE_THRESHOLD
+ANSWER_CACHE_TTL = 7 * 24 * 3600         # ANSWER_CACHE_TTL (초, 기본 7일)
+ANSWER_CACHE_FLUSH = 30                  # ANSWER_CACHE_FLUSH (초)
+
+_FROM_ENV = object()
+
+def answer_cache_enabled() -> bool:
+    """답변 캐시 사용 여부 (ANSWER_CACHE, 0이면 사용 안 함)"""
+    return os.getenv("ANSWER_CACHE", ANSWER_CACHE_ENABLED) == "1"
+
+
+def default_answer_cache_dir() -> Path:
+    """답변 캐시 폴더 (ANSWER_CACHE_DIR, 기본: 임베딩 캐시 옆 answers)"""
+    return Path(os.getenv("ANSWER_CACHE_DIR", default_cache_dir().parent / "answers"))
+
+
+# 인용 포인트 ID 목록 → {포인트 ID: 현재 content_hash} (삭제되었거나 content_hash가 없는 포인트는 생략)
+FetchHashesFn = Callable[[List[str]], Awaitable[Dict[str, str]]]
+
+
+class SemanticAnswerCache:
+    """질문 임베딩 유사도로 조회하는 답변 캐시 (인용 포인트 content_hash로 무효화)"""
+
+    def __init__(
+        self,
+        model: str,
+        dimensions: int,
+        threshold: Optional[float] = None,
+        ttl_seconds=_FROM_ENV,
+        cache_dir=None,
+        flush_seconds: Optional[float] = None,
+    ):
+        """
+        Args:
+            model: 질문 임베딩 모델 이름 (차원 포함, 예: text-embedding-3-large@1024) - 모델별로 컬렉션 분리
+            dimensions: 질문 임베딩 차원
+            threshold: 적중으로 볼 최소 코사인 유사도
+            ttl_seconds: 답변 유효 기간 (None이면 무제한)
+            cache_dir: 인덱스 저장 폴더
+            flush_seconds: 디스크 저장 최소 간격 (남은 변경은 flush() / 프로세스 종료 시 저장)
+
+        지정하지 않은 값은 ANSWER_CACHE_* 환경 변수(없으면 기본값)를 사용합니다.
+        """
+        if threshold is None:
+            threshold = float(os.getenv("ANSWER_CACHE_THRESHOLD", ANSWER_CACHE_THRESHOLD))
+        if ttl_seconds is _FROM_ENV:
+            ttl_seconds = float(os.getenv("ANSWER_CACHE_TTL", ANSWER_CACHE_TTL))
+        if cache_dir is None:
+            cache_dir = default_answer_cache_dir()
+        if flush_seconds is None:
+            flush_seconds = float(os.getenv("ANSWER_CACHE_FLUSH", ANSWER_CACHE_FLUSH))
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.collection = "answers_" + re.sub(r"[^0-9A-Za-z]+", "_", model)
+        self.index = NumpyFlatIndex(str(cache_dir))
+        if not self.index.collection_exists(self.collection):
+            self.index.create_collection(self.collection, VectorParams(size=dimensions, distance=Distance.COSINE))
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush)
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def flush(self) -> None:
+        """쓰기 이후 바뀐 내용이 있으면 인덱스를 디스크에 저장"""
+        with self._lock:
+            if self._dirty:
+                self.index.close()
+                self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def _write(self, apply: Callable[[], None]) -> None:
+        with self._lock:
+            apply()
+            self._dirty = True
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def _delete(self, entry_id) -> None:
+        self._write(lambda: self.index.delete(self.collection, PointIdsList(points=[entry_id])))
+        self.invalidations += 1
+
+    def _upsert(self, point: PointStruct) -> None:
+        self._write(lambda: self.index.upsert(self.collection, [point]))
+
+    async def aget(self, vector: Sequence[float], fetch_hashes: FetchHashesFn) -> Optional[dict]:
+        """
+        유사 질문의 답변 조회 (없거나, 만료되었거나, 인용 포인트가 바뀌었으면 None)
+
+        Returns:
+            {"question", "answer", "cited", "created_at", "score"}
+        """
+        response = await asyncio.to_thread(
+            self.index.query_points, self.collection, query=list(vector), limit=1, score_threshold=self.threshold
+        )
+        if not response.points:
+            self.misses += 1
+            return None
+
+        point = response.points[0]
+        entry = dict(point.payload)
+        if self._expired(entry["created_at"]):
+            await asyncio.to_thread(self._delete, point.id)
+            self.misses += 1
+            return None
+
+        cited = entry.get("cited", {})
+        if cited:
+            current = await fetch_hashes(list(cited))
+            # 삭제되었거나 content_hash가 없는 포인트도 변경으로 봄 (확인할 수 없는 답변은 반환하지 않음)
+            changed = [pid for pid, old_hash in cited.items() if old_hash is None or current.get(pid) != old_hash]
+            if changed:
+                print(f"  ↪ 캐시 답변 무효화: 인용 포인트 {len(changed)}/{len(cited)}개 변경/삭제")
+                await asyncio.to_thread(self._delete, point.id)
+                self.misses += 1
+                return None
+
+        self.hits += 1
+        entry["score"] = point.score
+        return entry
+
+    async def aput(
+        self, question: str, vector: Sequence[float], answer: str, cited_point_ids, fetch_hashes: FetchHashesFn
+    ) -> None:
+        """답변 저장 (인용한 모든 포인트의 현재 content_hash를 함께 기록)"""
+        # 검색 결과로 받은 ID 그대로 사용 (로컬 Qdrant는 32자리 hex ID를 변환 없이 저장)
+        point_ids = sorted({str(pid) for pid in cited_point_ids})
+        current = await fetch_hashes(point_ids) if point_ids else {}
+        unhashed = [pid for pid in point_ids if pid not in current]
+        if unhashed:
+            # 증분 동기화 없이 올린 포인트 등은 재색인 여부를 알 수 없어 답변이 오래되어도 무효화되지 않음
+            print(f"  ↪ 답변 캐시 저장 생략: content_hash가 없는 인용 포인트 {len(unhashed)}/{len(point_ids)}개")
+            return
+        cited = {pid: current[pid] for pid in point_ids}
+        entry_id = str(uuid.UUID(make_cache_key(self.collection, question)[:32]))
+        await asyncio.to_thread(self._upsert, PointStruct(
+            id=entry_id,
+            vector=list(vector),
+            payload={"question": question, "answer": answer, "cited": cited, "created_at": time.time()},
+        ))
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "entries": self.index.count(self.collection).count,
+        }
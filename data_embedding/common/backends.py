@@ -0,0 +1,98 @@
+"""
+저장소/임베딩 백엔드 선택
+
+환경 변수로 벡터 저장소와 임베딩 구현을 바꿔 끼울 수 있습니다.
+
+VECTOR_BACKEND
+    cloud  : Qdrant Cloud (QDRANT_URL / QDRANT_API_KEY) - 기본값
+    local  : 임베디드 로컬 Qdrant (LOCAL_QDRANT_PATH 디렉터리에 저장)
+    memory : 임베디드 로컬 Qdrant (":memory:", 프로세스 종료 시 사라짐)
+    numpy  : NumPy 완전 탐색 인덱스 (NUMPY_INDEX_PATH, ":memory:"면 저장 안 함)
+
+EMBED_BACKEND
+    openai : OpenAI 임베딩 API (EmbeddingExecutor) - 기본값
+    local  : 결정적 해시 임베딩 (LocalHashEmbedder, 네트워크 없음)
+"""
+
+import atexit
+import os
+from pathlib import Path
+from typing import Optional
+
+from qdrant_client import QdrantClient
+
+from .local_embedder import LocalHashEmbedder
+from .numpy_index import NumpyFlatIndex
+
+
+DATA_EMBEDDING_DIR = Path(__file__).resolve().parent.parent
+
+# 스크립트가 load_dotenv()를 import 이후에 호출하므로, 백엔드 설정은 호출 시점에 환경 변수에서 읽음
+DEFAULT_LOCAL_QDRANT_PATH = str(DATA_EMBEDDING_DIR / ".cache" / "qdrant_local")
+DEFAULT_NUMPY_INDEX_PATH = str(DATA_EMBEDDING_DIR / ".cache" / "numpy_index")
+DEFAULT_LOCAL_EMBED_DIM = 3072  # 기존 컬렉션(text-embedding-3-large)과 같은 차원
+
+VECTOR_BACKENDS = ("cloud", "local", "memory", "numpy")
+EMBED_BACKENDS = ("openai", "local")
+
+
+def get_qdrant_client(backend: Optional[str] = None, path: Optional[str] = None, timeout: int = 300, **cloud_kwargs):
+    """
+    설정된 백엔드의 Qdrant(호환) 클라이언트를 생성
+
+    Args:
+        backend: "cloud" | "local" | "memory" | "numpy" (None = VECTOR_BACKEND 환경 변수)
+        path: local/numpy 백엔드의 저장 경로 (None = 환경 변수 기본값)
+        timeout: Qdrant Cloud 요청 타임아웃(초)
+        cloud_kwargs: Qdrant Cloud 클라이언트에 그대로 넘길 옵션 (예: check_compatibility=False)
+    """
+    backend = backend or os.getenv("VECTOR_BACKEND", "cloud")
+    if backend == "cloud":
+        url = os.getenv("QDRANT_URL")
+        api_key = os.getenv("QDRANT_API_KEY")
+        if not url:
+            raise ValueError(".env에 QDRANT_URL을 설정하거나 VECTOR_BACKEND=local 로 실행하세요")
+        return QdrantClient(url=url, api_key=api_key, timeout=timeout, **cloud_kwargs)
+    if backend == "local":
+        path = path or os.getenv("LOCAL_QDRANT_PATH", DEFAULT_LOCAL_QDRANT_PATH)
+        if path == ":memory:":
+            return QdrantClient(":memory:")
+        Path(path).mkdir(parents=True, exist_ok=True)
+        print(f"✓ 로컬 Qdrant 사용: {path}")
+        return QdrantClient(path=str(path))
+    if backend == "memory":
+        print("✓ 로컬 Qdrant(:memory:) 사용")
+        return QdrantClient(":memory:")
+    if backend == "numpy":
+        path = path or os.getenv("NUMPY_INDEX_PATH", DEFAULT_NUMPY_INDEX_PATH)
+        index = NumpyFlatIndex(path)
+        if index.path is not None:
+            # 스크립트 종료 시 디스크에 저장
+            atexit.register(index.close)
+        print(f"✓ NumPy 플랫 인덱스 사용: {path}")
+        return index
+    raise ValueError(f"알 수 없는 VECTOR_BACKEND: {backend} (선택: {', '.join(VECTOR_BACKENDS)})")
+
+
+def is_embedded_client(client) -> bool:
+    """임베디드 로컬 Qdrant(path / :memory:)인지 여부 (스레드 안전하지 않아 요청을 직렬화해야 함)"""
+    # QdrantClient는 연결 방식에 따라 QdrantRemote / QdrantLocal 구현을 감쌈 (비공개 모듈을 import하지 않고 이름으로 판별)
+    return type(getattr(client, "_client", None)).__name__ == "QdrantLocal"
+
+
+def get_embedder(model: str, client=None, backend: Optional[str] = None, dim: Optional[int] = None):
+    """
+    설정된 백엔드의 임베딩 실행기를 생성 (embed(texts) / stats() / model / cache_name 제공)
+
+    Args:
+        dim: 출력 차원 (OpenAI는 dimensions 파라미터, None = EMBED_DIMENSIONS 또는 모델 기본 차원)
+
+    캐시 키에는 반환된 실행기의 .cache_name을 사용해야 로컬 벡터나 다른 차원의 벡터가 섞이지 않습니다.
+    """
+    backend = backend or os.getenv("EMBED_BACKEND", "openai")
+    if backend == "openai":
+        from .embedding_executor import EmbeddingExecutor
+        return EmbeddingExecutor(model, client=client, dimensions=dim)
+    if backend == "local":
+        return LocalHashEmbedder(dim or int(os.getenv("LOCAL_EMBED_DIM", DEFAULT_LOCAL_EMBED_DIM)))
+    raise ValueError(f"알 수 없는 EMBED_BACKEND: {backend} (선택: {', '.join(EMBED_BACKENDS)})")
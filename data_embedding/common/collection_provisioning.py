@@ -0,0 +1,247 @@
+"""
+컬렉션 생성 설정 (양자화 / on_disk / HNSW)
+
+모든 로더가 같은 설정으로 trade_collection을 만들도록 생성 옵션을 한곳에서 관리합니다.
+float32 3072차원 벡터는 포인트당 약 12KB를 RAM에 올리므로, 설정에 따라
+- int8 스칼라 양자화 (약 1/4) 또는 binary 양자화 (약 1/32)를 RAM에 두고
+- 원본 벡터는 on_disk로 내려 rescore(원본 벡터로 재채점)에만 사용하며
+- HNSW m / ef_construct로 그래프 크기와 정확도를 조절합니다.
+
+설정은 환경 변수로 바꿉니다. (기본값은 기존과 같은 양자화 없는 float32 in-RAM)
+    COLLECTION_QUANTIZATION = none | int8 | binary
+    QUANTIZATION_ALWAYS_RAM = 1       양자화 벡터를 항상 RAM에 유지
+    VECTORS_ON_DISK         = 0       원본 벡터를 디스크(mmap)에 저장
+    PAYLOAD_ON_DISK         = 0       payload를 디스크에 저장
+    HNSW_M                  = 16
+    HNSW_EF_CONSTRUCT       = 100
+    SEARCH_HNSW_EF          = (없음)  검색 시 ef (없으면 서버 기본값)
+    SEARCH_RESCORE          = 1       양자화 검색 후 원본 벡터로 재채점
+    SEARCH_OVERSAMPLING     = 2.0     재채점할 후보 배수 (limit × oversampling)
+    SPARSE_VECTORS          = 1       BM25 희소 벡터("bm25")를 함께 저장 (하이브리드 검색)
+
+검색 필터(data_source / country / category)에 쓰는 keyword payload 인덱스도 생성 시점에 함께 만듭니다.
+
+양자화/HNSW 변경에 따른 recall 변화는 benchmark/run_retrieval_benchmark.py --compare-exact 로 측정합니다.
+"""
+
+import os
+from typing import Optional
+
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Disabled,
+    Distance,
+    PayloadSchemaType,
+    HnswConfigDiff,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+    VectorParamsDiff,
+)
+
+from .sparse_vectors import collection_has_sparse, sparse_vectors_config
+
+
+QUANTIZATION_TYPES = ("none", "int8", "binary")
+
+# 검색 필터에 쓰는 payload 필드 (common/query_router.build_search_filter)
+PAYLOAD_INDEXES = {
+    "data_source": PayloadSchemaType.KEYWORD,
+    "country": PayloadSchemaType.KEYWORD,   # certification
+    "category": PayloadSchemaType.KEYWORD,  # certification
+}
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def load_collection_config() -> dict:
+    """환경 변수에서 컬렉션 설정을 읽음 (스크립트의 load_dotenv() 이후에 호출)"""
+    hnsw_ef = os.getenv("SEARCH_HNSW_EF")
+    config = {
+        "quantization": os.getenv("COLLECTION_QUANTIZATION", "none"),
+        "quantization_always_ram": _env_bool("QUANTIZATION_ALWAYS_RAM", "1"),
+        "vectors_on_disk": _env_bool("VECTORS_ON_DISK", "0"),
+        "payload_on_disk": _env_bool("PAYLOAD_ON_DISK", "0"),
+        "hnsw_m": int(os.getenv("HNSW_M", 16)),
+        "hnsw_ef_construct": int(os.getenv("HNSW_EF_CONSTRUCT", 100)),
+        "search_hnsw_ef": int(hnsw_ef) if hnsw_ef else None,
+        "search_rescore": _env_bool("SEARCH_RESCORE", "1"),
+        "search_oversampling": float(os.getenv("SEARCH_OVERSAMPLING", 2.0)),
+        "sparse_vectors": _env_bool("SPARSE_VECTORS", "1"),
+    }
+    if config["quantization"] not in QUANTIZATION_TYPES:
+        raise ValueError(f"알 수 없는 COLLECTION_QUANTIZATION: {config['quantization']} (선택: {', '.join(QUANTIZATION_TYPES)})")
+    return config
+
+
+def quantization_config(config: dict):
+    if config["quantization"] == "int8":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=0.99,  # 상하위 이상치 1%를 잘라 int8 범위를 효율적으로 사용
+                always_ram=config["quantization_always_ram"],
+            )
+        )
+    if config["quantization"] == "binary":
+        return BinaryQuantization(
+            binary=BinaryQuantizationConfig(always_ram=config["quantization_always_ram"])
+        )
+    return None
+
+
+def collection_create_kwargs(vector_size: int, config: Optional[dict] = None, distance: Distance = Distance.COSINE) -> dict:
+    """client.create_collection(collection_name=..., **kwargs)에 넘길 생성 옵션"""
+    config = config or load_collection_config()
+    kwargs = {
+        "vectors_config": VectorParams(size=vector_size, distance=distance, on_disk=config["vectors_on_disk"]),
+        "hnsw_config": HnswConfigDiff(m=config["hnsw_m"], ef_construct=config["hnsw_ef_construct"]),
+        "on_disk_payload": config["payload_on_disk"],
+    }
+    if config["sparse_vectors"]:
+        kwargs["sparse_vectors_config"] = sparse_vectors_config()
+    quantization = quantization_config(config)
+    if quantization is not None:
+        kwargs["quantization_config"] = quantization
+    return kwargs
+
+
+def create_payload_indexes(client, collection_name: str) -> None:
+    """필터 검색용 keyword 인덱스 생성 (이미 있으면 무시, 인덱스가 없으면 필터 검색이 전체 스캔이 됨)"""
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        try:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=schema,
+            )
+        except Exception as e:
+            if "already exists" not in str(e).lower():
+                raise
+
+
+def search_params(config: Optional[dict] = None, exact: bool = False) -> Optional[SearchParams]:
+    """query_points(search_params=...)에 넘길 검색 옵션 (양자화가 없고 기본값이면 None)"""
+    config = config or load_collection_config()
+    if exact:
+        # 양자화/HNSW 없이 원본 벡터 완전 탐색 (recall 기준선)
+        return SearchParams(exact=True, quantization=QuantizationSearchParams(ignore=True))
+    quantization = None
+    if config["quantization"] != "none":
+        quantization = QuantizationSearchParams(
+            rescore=config["search_rescore"],
+            oversampling=config["search_oversampling"],
+        )
+    if quantization is None and config["search_hnsw_ef"] is None:
+        return None
+    return SearchParams(hnsw_ef=config["search_hnsw_ef"], quantization=quantization)
+
+
+def apply_collection_config(client, collection_name: str, config: Optional[dict] = None) -> None:
+    """
+    이미 있는 컬렉션에 양자화/on_disk/HNSW 설정을 적용 (데이터 재업로드 없이 서버가 백그라운드로 재구성)
+    """
+    config = config or load_collection_config()
+    # quantization_config=None은 "변경 없음"이므로, none이면 Disabled로 기존 양자화를 제거
+    quantization = quantization_config(config) or Disabled.DISABLED
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": VectorParamsDiff(on_disk=config["vectors_on_disk"])},
+        hnsw_config=HnswConfigDiff(m=config["hnsw_m"], ef_construct=config["hnsw_ef_construct"]),
+        quantization_config=quantization,
+    )
+    print(f"✓ 컬렉션 '{collection_name}' 설정 적용: {describe_config(config)}")
+
+
+def config_from_collection_info(info, default: Optional[dict] = None) -> dict:
+    """
+    get_collection() 결과에서 실제 적용된 양자화/on_disk/HNSW 설정을 읽음
+    (정보가 없는 항목은 default 또는 환경 변수 설정을 사용)
+    """
+    config = dict(default or load_collection_config())
+    collection_config = getattr(info, "config", None)
+    if collection_config is None:
+        return config
+
+    if hasattr(collection_config, "quantization_config"):
+        quantization = collection_config.quantization_config
+        if isinstance(quantization, ScalarQuantization):
+            config["quantization"] = "int8"
+            config["quantization_always_ram"] = bool(quantization.scalar.always_ram)
+        elif isinstance(quantization, BinaryQuantization):
+            config["quantization"] = "binary"
+            config["quantization_always_ram"] = bool(quantization.binary.always_ram)
+        else:
+            config["quantization"] = "none"
+
+    hnsw = getattr(collection_config, "hnsw_config", None)
+    if hnsw is not None:
+        config["hnsw_m"] = hnsw.m
+        config["hnsw_ef_construct"] = hnsw.ef_construct
+
+    params = getattr(collection_config, "params", None)
+    vectors = getattr(params, "vectors", None)
+    if isinstance(vectors, VectorParams):
+        config["vectors_on_disk"] = bool(vectors.on_disk)
+    if params is not None and hasattr(params, "on_disk_payload"):
+        config["payload_on_disk"] = bool(params.on_disk_payload)
+    config["sparse_vectors"] = collection_has_sparse(info)
+    return config
+
+
+def describe_config(config: dict) -> str:
+    return (
+        f"quantization={config['quantization']}, vectors_on_disk={config['vectors_on_disk']}, "
+        f"payload_on_disk={config['payload_on_disk']}, m={config['hnsw_m']}, ef_construct={config['hnsw_ef_construct']}, "
+        f"sparse_vectors={config['sparse_vectors']}"
+    )
+
+
+def memory_footprint(n_points: int, vector_size: int, config: Optional[dict] = None) -> dict:
+    """
+    설정별 예상 메모리/디스크 사용량 (MB)
+
+    - 원본 벡터: n × dim × 4 bytes (on_disk면 디스크, 아니면 RAM)
+    - 양자화 벡터: int8은 n × dim bytes, binary는 n × dim / 8 bytes (always_ram이면 RAM)
+    - HNSW 그래프: 레벨 0에서 포인트당 최대 2m개의 링크(4 bytes)
+    """
+    config = config or load_collection_config()
+    mb = 1024 * 1024
+    original = n_points * vector_size * 4
+    if config["quantization"] == "int8":
+        quantized = n_points * vector_size
+    elif config["quantization"] == "binary":
+        quantized = n_points * vector_size // 8
+    else:
+        quantized = 0
+    graph = n_points * config["hnsw_m"] * 2 * 4
+
+    ram = graph
+    disk = graph
+    if config["vectors_on_disk"]:
+        disk += original
+    else:
+        ram += original
+    if quantized:
+        disk += quantized
+        if config["quantization_always_ram"]:
+            ram += quantized
+
+    baseline_ram = original + n_points * 16 * 2 * 4  # 양자화 없음, in-RAM, m=16
+    return {
+        "n_points": n_points,
+        "vector_size": vector_size,
+        "original_vectors_mb": round(original / mb, 2),
+        "quantized_vectors_mb": round(quantized / mb, 2),
+        "hnsw_graph_mb": round(graph / mb, 2),
+        "estimated_ram_mb": round(ram / mb, 2),
+        "estimated_disk_mb": round(disk / mb, 2),
+        "ram_per_point_bytes": round(ram / n_points) if n_points else 0,
+        "ram_vs_float32_baseline": round(ram / baseline_ram, 3) if baseline_ram else None,
+    }
@@ -0,0 +1,325 @@
+"""
+임베딩 디스크 캐시
+
+(모델 이름, 정규화된 텍스트 해시)를 키로 float32 벡터를 저장합니다.
+- 벡터: 차원별 memmap 파일 (vectors_{dim}.f32)에 슬롯 단위로 저장
+- 인덱스: sqlite3 (키 → 슬롯, 생성/사용 시각)
+- 전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 항목부터 제거(LRU)
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import get_metrics
+
+
+# 스크립트가 load_dotenv()를 import 이후에 호출하므로, 캐시 설정은 캐시를 만들 때 환경 변수에서 읽음
+CACHE_ROOT = Path(__file__).resolve().parent.parent / ".cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 기본 2GB (EMBEDDING_CACHE_MAX_BYTES)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def default_cache_dir() -> Path:
+    """임베딩 캐시 폴더 (EMBEDDING_CACHE_DIR, 기본 data_embedding/.cache/embeddings)"""
+    return Path(os.getenv("EMBEDDING_CACHE_DIR", CACHE_ROOT / "embeddings"))
+
+
+def normalize_text(text: str) -> str:
+    """캐시 키 계산용 텍스트 정규화 (NFC + 공백 정리)"""
+    text = unicodedata.normalize("NFC", text or "")
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def make_cache_key(model: str, text: str) -> str:
+    """(모델 이름, 정규화된 텍스트)의 sha256 해시"""
+    raw = f"{model}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+class EmbeddingCache:
+    """내용 기반(content-addressed) 임베딩 캐시"""
+
+    def __init__(self, cache_dir=None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            cache_dir: 캐시 파일을 저장할 폴더 (None = EMBEDDING_CACHE_DIR 또는 기본 폴더)
+            max_bytes: 벡터 저장 용량 상한, 초과 시 LRU 제거 (None = EMBEDDING_CACHE_MAX_BYTES 또는 2GB)
+        """
+        self.cache_dir = Path(cache_dir or default_cache_dir())
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.RLock()
+        self._stores = {}  # dim -> np.memmap
+        self._db = sqlite3.connect(str(self.cache_dir / "index.sqlite3"), check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                slot INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used);
+            CREATE TABLE IF NOT EXISTS free_slots (dim INTEGER NOT NULL, slot INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS stores (dim INTEGER PRIMARY KEY, next_slot INTEGER NOT NULL);
+            """
+        )
+        self._db.commit()
+
+    # ------------------------------------------------------------
+    # memmap 저장소
+    # ------------------------------------------------------------
+    def _store_path(self, dim: int) -> Path:
+        return self.cache_dir / f"vectors_{dim}.f32"
+
+    def _store(self, dim: int, min_capacity: int = 0) -> Optional[np.memmap]:
+        """차원별 memmap을 열고, 필요하면 min_capacity 슬롯까지 파일을 늘림"""
+        path = self._store_path(dim)
+        row_bytes = dim * 4
+        size = path.stat().st_size if path.exists() else 0
+        capacity = size // row_bytes
+
+        if capacity < min_capacity:
+            new_capacity = max(min_capacity, capacity * 2, 1024)
+            self._stores.pop(dim, None)
+            with open(path, "ab") as f:
+                f.truncate(new_capacity * row_bytes)
+            capacity = new_capacity
+
+        if capacity == 0:
+            return None
+        store = self._stores.get(dim)
+        if store is None or store.shape[0] != capacity:
+            store = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+            self._stores[dim] = store
+        return store
+
+    def _allocate_slots(self, dim: int, count: int) -> List[int]:
+        slots = [
+            row[0]
+            for row in self._db.execute(
+                "SELECT slot FROM free_slots WHERE dim = ? ORDER BY slot LIMIT ?", (dim, count)
+            )
+        ]
+        if slots:
+            self._db.executemany(
+                "DELETE FROM free_slots WHERE dim = ? AND slot = ?", [(dim, s) for s in slots]
+            )
+
+        remaining = count - len(slots)
+        if remaining:
+            row = self._db.execute("SELECT next_slot FROM stores WHERE dim = ?", (dim,)).fetchone()
+            next_slot = row[0] if row else 0
+            slots.extend(range(next_slot, next_slot + remaining))
+            self._db.execute(
+                "INSERT OR REPLACE INTO stores (dim, next_slot) VALUES (?, ?)",
+                (dim, next_slot + remaining),
+            )
+        return slots
+
+    # ------------------------------------------------------------
+    # 조회 / 저장
+    # ------------------------------------------------------------
+    def get_many(
+        self, model: str, texts: Sequence[str], max_age: Optional[float] = None
+    ) -> List[Optional[np.ndarray]]:
+        """
+        texts 순서대로 캐시된 벡터(없으면 None)를 반환
+
+        Args:
+            max_age: 지정하면 저장된 지 max_age초가 지난 항목은 미스로 처리
+        """
+        return [entry[0] if entry is not None else None for entry in self.get_entries(model, texts, max_age)]
+
+    def get_entries(
+        self, model: str, texts: Sequence[str], max_age: Optional[float] = None
+    ) -> List[Optional[Tuple[np.ndarray, float]]]:
+        """get_many와 같지만 (벡터, 저장 시각 created_at)을 반환 (상위 캐시가 남은 TTL을 이어받을 때 사용)"""
+        keys = [make_cache_key(model, t) for t in texts]
+        results: List[Optional[Tuple[np.ndarray, float]]] = [None] * len(keys)
+        min_created = time.time() - max_age if max_age is not None else float("-inf")
+
+        with self._lock:
+            found = {}
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), 500):
+                part = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for key, dim, slot, created_at in self._db.execute(
+                    f"SELECT key, dim, slot, created_at FROM entries WHERE key IN ({placeholders})", part
+                ):
+                    if created_at >= min_created:
+                        found[key] = (dim, slot, created_at)
+
+            now = time.time()
+            for i, key in enumerate(keys):
+                entry = found.get(key)
+                if entry is None:
+                    self.misses += 1
+                    continue
+                dim, slot, created_at = entry
+                store = self._store(dim)
+                results[i] = (np.array(store[slot], dtype=np.float32), created_at)
+                self.hits += 1
+
+            if found:
+                self._db.executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+                )
+                self._db.commit()
+
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], vectors) -> None:
+        """texts와 같은 순서의 vectors를 캐시에 저장"""
+        if len(texts) == 0:
+            return
+        array = np.asarray(vectors, dtype=np.float32)
+        if array.ndim != 2 or array.shape[0] != len(texts):
+            raise ValueError(f"texts({len(texts)})와 vectors{array.shape}의 개수가 맞지 않습니다.")
+        dim = array.shape[1]
+
+        rows = {}
+        for text, vec in zip(texts, array):
+            rows[make_cache_key(model, text)] = vec
+
+        with self._lock:
+            existing = {}
+            stale_slots = []  # 다른 차원으로 저장돼 있던 슬롯 (EMBED_DIMENSIONS 변경 등) → 반환
+            all_keys = list(rows)
+            for start in range(0, len(all_keys), 500):
+                part = all_keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for key, old_dim, slot in self._db.execute(
+                    f"SELECT key, dim, slot FROM entries WHERE key IN ({placeholders})", part
+                ):
+                    if old_dim == dim:
+                        existing[key] = slot
+                    else:
+                        stale_slots.append((old_dim, slot))
+            if stale_slots:
+                self._db.executemany("INSERT INTO free_slots (dim, slot) VALUES (?, ?)", stale_slots)
+            new_keys = [k for k in rows if k not in existing]
+            new_slots = self._allocate_slots(dim, len(new_keys))
+            slot_of = {**existing, **dict(zip(new_keys, new_slots))}
+
+            store = self._store(dim, min_capacity=max(slot_of.values()) + 1)
+            for key, vec in rows.items():
+                store[slot_of[key]] = vec
+            store.flush()
+
+            now = time.time()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entries (key, dim, slot, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                [(key, dim, slot_of[key], now, now) for key in rows],
+            )
+            self._db.commit()
+            self._evict_if_needed()
+
+    def embed(self, model: str, texts: Sequence[str], embed_fn: Callable[[List[str]], list]) -> List[List[float]]:
+        """
+        캐시에 없는 텍스트만 embed_fn으로 임베딩하고, 전체 결과를 texts 순서대로 반환
+
+        Args:
+            model: 캐시 키에 사용할 모델 이름
+            texts: 임베딩할 텍스트 리스트
+            embed_fn: 텍스트 리스트 → 벡터 리스트 함수 (캐시 미스분만 전달됨)
+        """
+        texts = list(texts)
+        cached = self.get_many(model, texts)
+        metrics = get_metrics()
+        n_hits = sum(vec is not None for vec in cached)
+        metrics.inc("embed_cache_hits", n_hits)
+        metrics.inc("embed_cache_misses", len(texts) - n_hits)
+
+        # 같은 실행 안에서 반복되는 텍스트는 한 번만 임베딩
+        missing = {}
+        for text, vec in zip(texts, cached):
+            if vec is None:
+                missing.setdefault(make_cache_key(model, text), text)
+
+        if missing:
+            missing_texts = list(missing.values())
+            new_vectors = embed_fn(missing_texts)
+            self.put_many(model, missing_texts, new_vectors)
+            fresh = {
+                key: np.asarray(vec, dtype=np.float32)
+                for key, vec in zip(missing.keys(), new_vectors)
+            }
+            cached = [
+                vec if vec is not None else fresh[make_cache_key(model, text)]
+                for text, vec in zip(texts, cached)
+            ]
+
+        return [vec.tolist() for vec in cached]
+
+    # ------------------------------------------------------------
+    # 용량 관리
+    # ------------------------------------------------------------
+    def size_bytes(self) -> int:
+        row = self._db.execute("SELECT COALESCE(SUM(dim * 4), 0) FROM entries").fetchone()
+        return int(row[0])
+
+    def _evict_if_needed(self) -> None:
+        total = self.size_bytes()
+        if total <= self.max_bytes:
+            return
+
+        # 상한의 90%까지 오래된 항목부터 제거
+        target = int(self.max_bytes * 0.9)
+        victims = []
+        for key, dim, slot in self._db.execute("SELECT key, dim, slot FROM entries ORDER BY last_used ASC"):
+            if total <= target:
+                break
+            victims.append((key, dim, slot))
+            total -= dim * 4
+
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(v[0],) for v in victims])
+        self._db.executemany("INSERT INTO free_slots (dim, slot) VALUES (?, ?)", [(v[1], v[2]) for v in victims])
+        self._db.commit()
+        self.evictions += len(victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": entries,
+                "size_bytes": self.size_bytes(),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            for store in self._stores.values():
+                store.flush()
+            self._stores.clear()
+            self._db.close()
+
+
+_default_cache: Optional[EmbeddingCache] = None
+
+
+def get_default_cache() -> EmbeddingCache:
+    """프로세스 전체에서 공유하는 기본 캐시 인스턴스"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache()
+    return _default_cache
@@ -0,0 +1,243 @@
+"""
+동시 임베딩 실행기
+
+- tiktoken 토큰 수 기준으로 배치를 구성 (요청당 토큰/항목 상한)
+- 여러 배치를 스레드 풀로 동시에 요청 (풀은 실행기당 하나, 여러 스레드가 동시에 embed()를 호출해도 요청 수는 max_workers 이하)
+- 분당 요청 수(RPM) / 분당 토큰 수(TPM) 예산을 지키도록 요청 전 대기
+- RateLimit/일시적 오류 시 retry-after 헤더를 우선 적용하고, 없으면 지터 포함 지수 백오프
+- 토큰 계산(tokenize) 시간, 요청/재시도/토큰 수, 요청 지연, 예산 대기 시간은 get_metrics()에 기록
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+import tiktoken
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+from .metrics import get_metrics
+from .matryoshka import NATIVE_DIMENSIONS, cache_model_name, dimensions_param, embedding_dimensions
+
+
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", 4))
+EMBED_RPM = int(os.getenv("EMBED_RPM", 3000))
+EMBED_TPM = int(os.getenv("EMBED_TPM", 1_000_000))
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", 60_000))  # API 요청당 상한 300k보다 여유 있게
+EMBED_BATCH_ITEMS = int(os.getenv("EMBED_BATCH_ITEMS", 512))         # API 요청당 상한 2048
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", 6))
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+class RateBudget:
+    """최근 60초 동안의 요청 수/토큰 수를 추적하는 슬라이딩 윈도우 예산"""
+
+    def __init__(self, rpm: int, tpm: int, window: float = 60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self._events = deque()  # (timestamp, tokens)
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float) -> None:
+        while self._events and now - self._events[0][0] >= self.window:
+            _, tokens = self._events.popleft()
+            self._tokens -= tokens
+
+    def acquire(self, tokens: int) -> float:
+        """예산이 허용될 때까지 대기한 뒤 사용량을 기록. 대기한 시간(초)을 반환"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._purge(now)
+                fits_requests = len(self._events) < self.rpm
+                # 단일 요청이 TPM보다 큰 경우에는 윈도우가 비었을 때 보냄
+                fits_tokens = self._tokens + tokens <= self.tpm or not self._events
+                if fits_requests and fits_tokens:
+                    self._events.append((now, tokens))
+                    self._tokens += tokens
+                    return waited
+                sleep_for = max(self.window - (now - self._events[0][0]), 0.01)
+            time.sleep(sleep_for)
+            waited += sleep_for
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """OpenAI 응답 헤더의 retry-after-ms / retry-after 값을 초 단위로 반환"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class EmbeddingExecutor:
+    """OpenAI 임베딩 요청을 토큰 예산 안에서 동시에 실행"""
+
+    def __init__(
+        self,
+        model: str,
+        client: Optional[OpenAI] = None,
+        max_workers: int = EMBED_MAX_WORKERS,
+        rpm: int = EMBED_RPM,
+        tpm: int = EMBED_TPM,
+        max_batch_tokens: int = EMBED_BATCH_TOKENS,
+        max_batch_items: int = EMBED_BATCH_ITEMS,
+        max_retries: int = EMBED_MAX_RETRIES,
+        dimensions: Optional[int] = None,
+    ):
+        """
+        Args:
+            model: 임베딩 모델 이름
+            client: OpenAI 클라이언트 (None = 환경 변수 OPENAI_API_KEY로 생성, SDK 재시도는 끄고 사용)
+            max_workers: 동시에 보낼 요청 수
+            rpm / tpm: 계정 한도에 맞춘 분당 요청/토큰 예산
+            max_batch_tokens / max_batch_items: 요청 하나에 담을 토큰/항목 상한
+            max_retries: 재시도 가능한 오류의 최대 재시도 횟수
+            dimensions: 출력 차원 (None = EMBED_DIMENSIONS 환경 변수 또는 모델 기본 차원)
+        """
+        self.model = model
+        if model in NATIVE_DIMENSIONS:
+            self.dimensions = embedding_dimensions(model, dimensions)
+            self._dimensions_param = dimensions_param(model, self.dimensions)
+            # 차원이 다르면 다른 벡터이므로 임베딩 캐시 키도 분리
+            self.cache_name = cache_model_name(model, self.dimensions)
+        else:
+            self.dimensions = dimensions
+            self._dimensions_param = dimensions
+            self.cache_name = model if dimensions is None else f"{model}@{dimensions}"
+        # 재시도는 _request가 retry-after/토큰 예산에 맞춰 직접 하므로 SDK 자체 재시도(기본 2회)는 끔
+        self.client = (
+            client.with_options(max_retries=0) if client is not None
+            else OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        )
+        self.max_workers = max_workers
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.max_retries = max_retries
+        self.budget = RateBudget(rpm, tpm)
+
+        try:
+            self.encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+
+        self.requests = 0
+        self.retries = 0
+        self.tokens = 0
+        self._stats_lock = threading.Lock()
+        # embed() 호출마다 풀을 만들지 않고 재사용 (파이프라인은 윈도우마다 embed()를 호출)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embed")
+
+    # ------------------------------------------------------------
+    # 배치 구성
+    # ------------------------------------------------------------
+    def count_tokens(self, texts: Sequence[str]) -> List[int]:
+        with get_metrics().span("tokenize"):
+            return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(list(texts))]
+
+    def pack_batches(self, token_counts: Sequence[int], max_batch_items: Optional[int] = None) -> List[List[int]]:
+        """토큰 수 상한/항목 수 상한을 넘지 않도록 인덱스를 순서대로 묶음"""
+        max_items = max_batch_items or self.max_batch_items
+        batches, current, current_tokens = [], [], 0
+
+        for idx, n_tokens in enumerate(token_counts):
+            if current and (current_tokens + n_tokens > self.max_batch_tokens or len(current) >= max_items):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(idx)
+            current_tokens += n_tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    # ------------------------------------------------------------
+    # 요청
+    # ------------------------------------------------------------
+    def _request(self, texts: List[str], n_tokens: int) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            waited = self.budget.acquire(n_tokens)
+            if waited:
+                get_metrics().observe("embed_budget_wait_seconds", waited)
+            try:
+                kwargs = {"dimensions": self._dimensions_param} if self._dimensions_param else {}
+                start = time.perf_counter()
+                resp = self.client.embeddings.create(model=self.model, input=texts, **kwargs)
+                with self._stats_lock:
+                    self.requests += 1
+                    self.tokens += n_tokens
+                metrics = get_metrics()
+                metrics.observe("embed_request_seconds", time.perf_counter() - start)
+                metrics.inc("embed_requests")
+                metrics.inc("embed_tokens", n_tokens)
+                metrics.inc("embed_texts", len(texts))
+                return [item.embedding for item in sorted(resp.data, key=lambda d: d.index)]
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                wait = _retry_after_seconds(e)
+                if wait is None:
+                    # full jitter 지수 백오프 (최대 60초)
+                    wait = random.uniform(0, min(60.0, 2 ** attempt))
+                else:
+                    wait += random.uniform(0, 0.5)
+                with self._stats_lock:
+                    self.retries += 1
+                get_metrics().inc("embed_retries", error=type(e).__name__)
+                print(f"  [EMBED] {type(e).__name__}: {wait:.1f}초 후 재시도 ({attempt + 1}/{self.max_retries})")
+                time.sleep(wait)
+        raise RuntimeError("임베딩 재시도 최대 횟수 초과")
+
+    def embed(self, texts: Sequence[str], max_batch_items: Optional[int] = None) -> List[List[float]]:
+        """texts 전체를 임베딩하여 같은 순서의 벡터 리스트로 반환"""
+        texts = list(texts)
+        if not texts:
+            return []
+
+        token_counts = self.count_tokens(texts)
+        batches = self.pack_batches(token_counts, max_batch_items)
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+
+        def run(batch_no: int, indices: List[int]) -> None:
+            batch_tokens = sum(token_counts[i] for i in indices)
+            result = self._request([texts[i] for i in indices], batch_tokens)
+            for i, vec in zip(indices, result):
+                vectors[i] = vec
+            print(f"  [EMBED] 배치 {batch_no}/{len(batches)} 완료 ({len(indices)}개, {batch_tokens} tokens)")
+
+        futures = [self._pool.submit(run, no, indices) for no, indices in enumerate(batches, 1)]
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            # 한 배치가 실패하면 아직 시작하지 않은 배치는 취소
+            for future in futures:
+                future.cancel()
+
+        return vectors
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "retries": self.retries, "tokens": self.tokens}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
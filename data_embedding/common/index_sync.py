@@ -0,0 +1,180 @@
+"""
+data_source 단위 증분 동기화 (diff 기반 재인덱싱)
+
+기존 방식(delete_by_data_source 후 전체 재업로드) 대신,
+1) 컬렉션에서 해당 data_source 포인트의 (id, content_hash)만 scroll로 조회하고
+2) 새로 만든 청크 레코드의 결정적 ID/내용 해시와 비교하여
+3) 새로 생겼거나 바뀐 청크만 임베딩/업서트하고, 더 이상 없는 포인트만 삭제합니다.
+"""
+
+import hashlib
+import json
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import FieldCondition, Filter, MatchValue, PointIdsList, PointStruct
+
+from .metrics import get_metrics
+from .payload_schema import PAYLOAD_SCHEMA_VERSION
+from .pipeline import run_ingest_pipeline
+from .qdrant_uploader import QdrantUploader
+
+
+# 결정적 포인트 ID 생성용 네임스페이스 (값을 바꾸면 모든 ID가 바뀌므로 고정)
+POINT_ID_NAMESPACE = uuid.UUID("6f1c1f4e-4b7a-5d0e-9a53-2c1b7d5e8a10")
+
+SCROLL_PAGE_SIZE = 1000
+DELETE_BATCH_SIZE = 1000
+
+
+def stable_point_id(data_source: str, key) -> str:
+    """(data_source, 청크 키)로부터 항상 같은 UUID 문자열을 생성"""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{data_source}:{key}"))
+
+
+def make_point_id(data_source: str, document, start: int, end: int) -> str:
+    """
+    모든 로더 공통 포인트 ID: (data_source, 문서, 청크 span)의 UUIDv5
+
+    같은 문서의 같은 구간은 실행할 때마다 같은 ID가 되므로 upsert가 멱등해지고
+    (재실행 시 벡터 중복 없음), data_source가 ID에 포함되어 공유 컬렉션에서 소스 간 충돌이 없습니다.
+    """
+    return stable_point_id(data_source, f"{document}:{start}-{end}")
+
+
+def normalize_point_id(point_id: Union[str, int]) -> str:
+    """비교용 ID 정규화 (32자리 hex도 Qdrant가 돌려주는 하이픈 UUID 형식으로 맞춤)"""
+    if isinstance(point_id, int):
+        return str(point_id)
+    try:
+        return str(uuid.UUID(str(point_id)))
+    except ValueError:
+        return str(point_id)
+
+
+def content_hash(record: dict, exclude=("id", "content_hash")) -> str:
+    """청크 레코드(텍스트 + 메타데이터)의 내용 해시"""
+    body = {k: v for k, v in record.items() if k not in exclude}
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def data_source_filter(data_source: str) -> Filter:
+    return Filter(must=[FieldCondition(key="data_source", match=MatchValue(value=data_source))])
+
+
+def fetch_existing_hashes(
+    client: QdrantClient,
+    collection_name: str,
+    data_source: str,
+    raw_ids: Optional[Dict[str, Union[str, int]]] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    data_source 포인트의 {정규화된 id: content_hash} (벡터/기타 payload는 받지 않음)
+
+    raw_ids를 주면 {정규화된 id: 저장된 원래 id}를 채움
+    (임베디드 로컬 Qdrant는 32자리 hex ID를 변환하지 않고 저장하므로 삭제 시 원래 ID가 필요)
+    """
+    try:
+        # data_source 필터 scroll용 keyword index (이미 있으면 무시)
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name="data_source",
+            field_schema="keyword",
+        )
+    except Exception:
+        pass
+
+    existing = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=data_source_filter(data_source),
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=["content_hash"],
+            with_vectors=False,
+        )
+        for point in points:
+            key = normalize_point_id(point.id)
+            existing[key] = (point.payload or {}).get("content_hash")
+            if raw_ids is not None:
+                raw_ids[key] = point.id
+        if offset is None:
+            return existing
+
+
+def sync_data_source(
+    client: QdrantClient,
+    collection_name: str,
+    data_source: str,
+    records: Iterable[dict],
+    embed_texts: Callable[[List[str]], list],
+    make_point: Callable[[dict, list], PointStruct],
+    extra_hash: str = "",
+    get_id: Callable[[dict], Union[str, int]] = lambda record: record["id"],
+) -> dict:
+    """
+    records(청크 레코드 스트림)와 컬렉션의 data_source 포인트를 동기화
+
+    Args:
+        records: 결정적 ID(기본 "id")와 "text"를 가진 청크 레코드
+        embed_texts: 텍스트 리스트 → 벡터 리스트 함수
+        make_point: (레코드, 벡터) → PointStruct 함수. payload에 content_hash가 추가됨
+        extra_hash: 내용 해시에 함께 넣을 값 (예: 임베딩 모델 이름 → 모델 변경 시 전체 재임베딩)
+        get_id: 레코드 → 포인트 ID (make_point가 만드는 ID와 같아야 함)
+
+    Returns:
+        {"unchanged", "upserted", "deleted"} 개수
+    """
+    metrics = get_metrics()
+    raw_ids = {}
+    with metrics.span("sync_scan"):
+        existing = fetch_existing_hashes(client, collection_name, data_source, raw_ids)
+    print(f"  [SYNC] '{data_source}' 기존 포인트: {len(existing)}개")
+
+    seen = set()
+    stats = {"unchanged": 0, "upserted": 0, "deleted": 0}
+
+    def changed_records():
+        for record in records:
+            point_id = normalize_point_id(get_id(record))
+            if point_id in seen:
+                raise ValueError(f"중복된 포인트 ID: {point_id} (청크 키가 유일하지 않습니다)")
+            seen.add(point_id)
+
+            # payload 스키마 버전도 해시에 포함 → 스키마 변경 시 기존 포인트의 payload를 다시 씀
+            record["content_hash"] = content_hash(record) + f":{PAYLOAD_SCHEMA_VERSION}" + (f":{extra_hash}" if extra_hash else "")
+            if existing.get(point_id) == record["content_hash"]:
+                stats["unchanged"] += 1
+                continue
+            yield record
+
+    def make_hashed_point(record, vector):
+        point = make_point(record, vector)
+        point.payload = {**(point.payload or {}), "content_hash": record["content_hash"]}
+        return point
+
+    with QdrantUploader(client, collection_name) as uploader:
+        stats["upserted"] = run_ingest_pipeline(changed_records(), embed_texts, make_hashed_point, uploader)
+
+    stale = [point_id for point_id in existing if point_id not in seen]
+    with metrics.span("delete"):
+        for start in range(0, len(stale), DELETE_BATCH_SIZE):
+            batch = [raw_ids.get(p, p) for p in stale[start:start + DELETE_BATCH_SIZE]]
+            client.delete(
+                collection_name=collection_name,
+                points_selector=PointIdsList(points=batch),
+                wait=True,
+            )
+    stats["deleted"] = len(stale)
+    for result, count in stats.items():
+        metrics.inc("sync_points", count, data_source=data_source, result=result)
+
+    print(
+        f"  [SYNC] '{data_source}' 동기화 완료: 유지 {stats['unchanged']}개, "
+        f"업서트 {stats['upserted']}개, 삭제 {stats['deleted']}개"
+    )
+    return stats
@@ -0,0 +1,71 @@
+"""
+결정적 로컬 임베딩 (OpenAI 임베딩 대체용)
+
+네트워크 없이 전체 인제스트/검색 벤치마크를 돌리기 위한 해시 기반 임베딩입니다.
+단어(NFC, 소문자)와 단어별 문자 3-gram을 blake2b로 해시하여 부호 있는 버킷에 더하고 L2 정규화합니다.
+같은 텍스트는 항상 같은 벡터가 되고, 어휘가 겹치는 텍스트끼리는 코사인 유사도가 높아지므로
+검색 품질이 아니라 파이프라인 속도/정합성 측정에 사용합니다.
+
+EmbeddingExecutor와 같은 인터페이스(model, cache_name, dimensions, embed, stats)를 제공합니다.
+"""
+
+import hashlib
+import re
+import threading
+import unicodedata
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .metrics import get_metrics
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _features(text: str) -> List[str]:
+    words = _WORD_RE.findall(unicodedata.normalize("NFC", text).lower())
+    features = list(words)
+    for word in words:
+        padded = f"<{word}>"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+class LocalHashEmbedder:
+    """단어 + 문자 3-gram 해싱 임베딩 (API 호출 없음)"""
+
+    def __init__(self, dim: int = 3072):
+        self.dim = dim
+        # 캐시 키가 OpenAI 모델과 섞이지 않도록 별도 모델 이름 사용
+        self.model = f"local-hash-{dim}"
+        self.dimensions = dim
+        self.cache_name = self.model
+        self.requests = 0
+        self.tokens = 0
+        self._stats_lock = threading.Lock()
+
+    def _embed_one(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        features = _features(text)
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            h = int.from_bytes(digest, "little")
+            vec[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        with self._stats_lock:
+            self.tokens += len(features)
+        return vec.tolist()
+
+    def embed(self, texts: Sequence[str], max_batch_items: Optional[int] = None) -> List[List[float]]:
+        with self._stats_lock:
+            self.requests += 1
+        metrics = get_metrics()
+        metrics.inc("embed_requests")
+        metrics.inc("embed_texts", len(texts))
+        return [self._embed_one(text) for text in texts]
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "retries": 0, "tokens": self.tokens}
@@ -0,0 +1,179 @@
+"""
+Markdown 제목 구조 기반 청커
+
+고정 토큰 창 대신 H1/H2/H3 제목 경계로 문서를 나누고, 각 청크에 상위 제목 경로(breadcrumb)를 붙입니다.
+- 섹션 = H1~H3 제목 하나부터 다음 H1~H3 제목 전까지 (H4 이하 제목은 본문으로 취급)
+- max_tokens를 넘는 섹션은 빈 줄(문단) 경계로 나누고, 한 문단이 넘치면 토큰 span(overlap)으로 자름
+- min_tokens보다 작은 섹션은 같은 H1 안의 다음 섹션과 합침 (합쳐도 max_tokens 이하일 때)
+- chunk_id = "chunks_by_h1/chunk_{H1 번호:03d}.md" (정답 세트 eval_queries(gold).jsonl과 같은 형식,
+  첫 H1 이전 서문이 001, 이후 H1마다 1씩 증가)
+
+각 청크의 start/end는 원문 char offset이며, text는 breadcrumb 한 줄 + 원문[start:end]입니다.
+"""
+
+import re
+from typing import Iterator, List, Optional
+
+from .token_chunker import iter_token_spans
+
+
+HEADING_RE = re.compile(r"^(#{1,6})[ \t]*(.*?)[ \t#]*$", re.MULTILINE)
+PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t]*\n")
+
+DEFAULT_MAX_TOKENS = 512
+DEFAULT_MIN_TOKENS = 64
+DEFAULT_OVERLAP = 50
+BREADCRUMB_SEPARATOR = " > "
+
+
+def h1_chunk_id(h1_index: int) -> str:
+    """H1 섹션 번호(서문 = 1)의 정답 세트 호환 chunk_id"""
+    return f"chunks_by_h1/chunk_{h1_index:03d}.md"
+
+
+def split_sections(text: str, split_level: int = 3) -> List[dict]:
+    """
+    split_level 이하 제목 경계로 섹션 목록을 반환
+
+    각 섹션: {"start", "end", "h1_index", "breadcrumb"(제목 리스트)}
+    """
+    sections = []
+    path: List[Optional[str]] = [None] * split_level
+    h1_index = 1
+    seen_h1 = False
+    start = 0
+
+    def close(end: int) -> None:
+        if text[start:end].strip():
+            sections.append({
+                "start": start,
+                "end": end,
+                "h1_index": h1_index,
+                "breadcrumb": [title for title in path if title],
+            })
+
+    for match in HEADING_RE.finditer(text):
+        level = len(match.group(1))
+        if level > split_level:
+            continue
+        close(match.start())
+        start = match.start()
+
+        if level == 1:
+            # 첫 H1 이전에 서문이 있으면 서문이 001, 이후 H1마다 다음 번호
+            if seen_h1 or sections:
+                h1_index += 1
+            seen_h1 = True
+        title = match.group(2).strip()
+        path[level - 1] = title or None
+        for deeper in range(level, split_level):
+            path[deeper] = None
+    close(len(text))
+    return sections
+
+
+class MarkdownHeadingChunker:
+    """제목 계층 + 토큰 상한 기반 Markdown 청커"""
+
+    def __init__(
+        self,
+        encoding,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        min_tokens: int = DEFAULT_MIN_TOKENS,
+        overlap: int = DEFAULT_OVERLAP,
+        split_level: int = 3,
+    ):
+        """
+        Args:
+            encoding: tiktoken 인코딩 (토큰 수 계산용)
+            max_tokens: 청크 하나의 최대 토큰 수 (breadcrumb 제외)
+            min_tokens: 이보다 작은 섹션은 다음 섹션과 합침
+            overlap: 한 문단이 max_tokens를 넘어 토큰 단위로 자를 때의 겹침
+            split_level: 섹션을 나눌 제목 수준 (3 = H1/H2/H3)
+        """
+        self.encoding = encoding
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.overlap = overlap
+        self.split_level = split_level
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+
+    def _merge_small(self, text: str, sections: List[dict]) -> List[dict]:
+        """min_tokens 미만 섹션을 같은 H1 안의 다음 섹션과 합침"""
+        merged = []
+        for section in sections:
+            section = {**section, "tokens": self.count_tokens(text[section["start"]:section["end"]])}
+            prev = merged[-1] if merged else None
+            if (
+                prev is not None
+                and prev["tokens"] < self.min_tokens
+                and prev["h1_index"] == section["h1_index"]
+                and prev["tokens"] + section["tokens"] <= self.max_tokens
+            ):
+                prev["end"] = section["end"]
+                prev["tokens"] += section["tokens"]
+            else:
+                merged.append(section)
+        return merged
+
+    def _split_large(self, text: str, start: int, end: int) -> Iterator[tuple]:
+        """max_tokens를 넘는 구간을 문단 경계로 묶어 (start, end) 단위로 반환"""
+        bounds = [start] + [start + m.end() for m in PARAGRAPH_BREAK_RE.finditer(text[start:end])] + [end]
+        paragraphs = [(a, b) for a, b in zip(bounds, bounds[1:]) if text[a:b].strip()]
+
+        chunk_start, chunk_end, chunk_tokens = None, None, 0
+        for a, b in paragraphs:
+            tokens = self.count_tokens(text[a:b])
+            if chunk_start is not None and chunk_tokens + tokens > self.max_tokens:
+                yield chunk_start, chunk_end
+                chunk_start, chunk_tokens = None, 0
+            if tokens > self.max_tokens:
+                # 표처럼 빈 줄 없이 긴 문단은 토큰 span으로 자름
+                for span in iter_token_spans(text[a:b], self.encoding, self.max_tokens, self.overlap):
+                    yield a + span["start"], a + span["end"]
+                continue
+            if chunk_start is None:
+                chunk_start = a
+            chunk_end = b
+            chunk_tokens += tokens
+        if chunk_start is not None:
+            yield chunk_start, chunk_end
+
+    def chunk(self, text: str) -> Iterator[dict]:
+        """
+        청크를 하나씩 반환
+
+        각 청크: {"text", "start", "end", "chunk_id", "h1_index", "breadcrumb", "section_index", "tokens"}
+        """
+        sections = self._merge_small(text, split_sections(text, self.split_level))
+        section_counter = {}
+        for section in sections:
+            if section["tokens"] > self.max_tokens:
+                spans = list(self._split_large(text, section["start"], section["end"]))
+            else:
+                spans = [(section["start"], section["end"])]
+
+            breadcrumb = BREADCRUMB_SEPARATOR.join(section["breadcrumb"])
+            for start, end in spans:
+                # 앞뒤 공백 제외 (원문 offset은 그대로 유지)
+                body = text[start:end]
+                start += len(body) - len(body.lstrip())
+                end -= len(body) - len(body.rstrip())
+                body = text[start:end]
+
+                h1_index = section["h1_index"]
+                section_index = section_counter.get(h1_index, 0)
+                section_counter[h1_index] = section_index + 1
+                yield {
+                    # 본문이 상위 제목을 포함하지 않을 때도 어느 장/절인지 임베딩에 반영되도록 경로를 앞에 붙임
+                    "text": f"[{breadcrumb}]\n{body}" if breadcrumb else body,
+                    "start": start,
+                    "end": end,
+                    "chunk_id": h1_chunk_id(h1_index),
+                    "h1_index": h1_index,
+                    "breadcrumb": breadcrumb,
+                    "section_index": section_index,
+                    "tokens": self.count_tokens(body),
+                }
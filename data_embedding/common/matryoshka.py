@@ -0,0 +1,63 @@
+"""
+임베딩 차원 축소 (Matryoshka)
+
+text-embedding-3 계열은 벡터 앞부분에 정보가 몰리도록 학습되어 있어
+앞 N차원만 잘라 다시 L2 정규화해도 검색 품질이 크게 떨어지지 않습니다.
+API의 dimensions 파라미터도 같은 방식으로 동작하므로, 이미 저장된 3072차원 벡터를
+API 호출 없이 잘라서 새 차원의 컬렉션으로 옮길 수 있습니다.
+
+EMBED_DIMENSIONS 환경 변수로 모든 로더/검색의 임베딩 차원을 지정합니다. (예: 256, 512, 1024)
+지정하지 않으면 모델 기본 차원(text-embedding-3-large = 3072)을 사용합니다.
+"""
+
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+NATIVE_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
+# dimensions 파라미터를 지원하는 모델 (ada-002는 미지원)
+MATRYOSHKA_MODELS = ("text-embedding-3-large", "text-embedding-3-small")
+
+
+def native_dimensions(model: str) -> int:
+    if model not in NATIVE_DIMENSIONS:
+        raise ValueError(f"차원을 알 수 없는 임베딩 모델: {model}")
+    return NATIVE_DIMENSIONS[model]
+
+
+def embedding_dimensions(model: str, dimensions: Optional[int] = None) -> int:
+    """
+    실제로 사용할 임베딩 차원 (인자 > EMBED_DIMENSIONS 환경 변수 > 모델 기본 차원)
+    """
+    native = native_dimensions(model)
+    dimensions = dimensions or int(os.getenv("EMBED_DIMENSIONS", 0)) or native
+    if dimensions != native and model not in MATRYOSHKA_MODELS:
+        raise ValueError(f"{model}은 dimensions 파라미터를 지원하지 않습니다. (기본 {native}차원만 가능)")
+    if not 0 < dimensions <= native:
+        raise ValueError(f"dimensions는 1~{native} 사이여야 합니다: {dimensions}")
+    return dimensions
+
+
+def dimensions_param(model: str, dimensions: int) -> Optional[int]:
+    """embeddings.create(dimensions=...)에 넘길 값 (기본 차원이면 None → 파라미터 생략)"""
+    return None if dimensions == native_dimensions(model) else dimensions
+
+
+def cache_model_name(model: str, dimensions: int) -> str:
+    """임베딩 캐시 키용 모델 이름 (차원이 다르면 다른 벡터이므로 키를 분리)"""
+    return model if dimensions == native_dimensions(model) else f"{model}@{dimensions}"
+
+
+def truncate_normalize(vectors: Sequence[Sequence[float]], dimensions: int) -> List[List[float]]:
+    """앞 dimensions 차원만 남기고 L2 정규화 (API의 dimensions 파라미터와 같은 결과)"""
+    arr = np.asarray(vectors, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (arr / norms).tolist()
@@ -0,0 +1,276 @@
+"""
+인제스트 계측 (단계 span / counter / histogram) + 실행 리포트
+
+공용 모듈이 프로세스 기본 레지스트리(get_metrics())에 기록합니다.
+- pipeline: chunk(청크 제너레이터 소비) / embed 단계 시간
+- embedding_executor: tokenize 단계 시간, 요청/재시도/토큰 수, 요청 지연
+- embedding_cache: 캐시 적중/미스
+- qdrant_uploader: upsert 단계 시간, 포인트/바이트/배치/재시도 수, 배치 크기
+- index_sync: 유지/업서트/삭제 포인트 수
+로더는 load/chunk처럼 로더 안에서 끝나는 단계를 span()으로 감싸고, 마지막에 write_run_report()를 호출합니다.
+
+    reports/ingest_<loader>_<시각>.json  단계별 시간, counter, histogram 요약 (회귀 추적용)
+    reports/ingest_<loader>_<시각>.prom  Prometheus text format (node_exporter textfile collector 등으로 수집)
+
+단계 시간은 같은 스레드에서 안쪽에 중첩된 단계 시간을 뺀 값입니다.
+(스트리밍 로더의 청크 제너레이터 안에서 파일을 읽으면 load로, 나머지는 chunk로 기록)
+embed/upsert는 파이프라인의 서로 다른 스레드에서 겹쳐 실행되므로 단계 시간의 합이 전체 실행 시간(wall_seconds)보다 클 수 있습니다.
+
+    INGEST_REPORT_DIR   리포트 폴더 (기본 data_embedding/reports)
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
+
+INGEST_REPORT_DIR = Path(os.getenv("INGEST_REPORT_DIR", Path(__file__).resolve().parent.parent / "reports"))
+
+# 초 단위 histogram 버킷 (요청/배치/단계 지연)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# 개수/크기 histogram 버킷 (배치 포인트 수, 배치 바이트 수 등)
+SIZE_BUCKETS = tuple(4 ** i for i in range(13))  # 1 ~ 16M
+
+METRIC_PREFIX = "ingest_"
+
+T = TypeVar("T")
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+# 스레드별로 현재 단계 안에서 끝난 하위 단계 시간의 합 (exclusive 시간 계산용)
+_local = threading.local()
+
+
+def _enter_stage() -> float:
+    outer = getattr(_local, "nested", 0.0)
+    _local.nested = 0.0
+    return outer
+
+
+def _exit_stage(outer: float, elapsed: float) -> float:
+    """하위 단계 시간을 뺀 이 단계의 시간을 반환하고, 바깥 단계에 이 단계 전체 시간을 알림"""
+    exclusive = elapsed - _local.nested
+    _local.nested = outer + elapsed
+    return exclusive
+
+
+def _format_value(value: float) -> str:
+    """정수 값은 정수로, 나머지는 정밀도 손실 없이 출력"""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: LabelKey, extra: Optional[dict] = None) -> str:
+    items = list(_label_key(extra or {})) + list(labels)
+    if not items:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+
+class Histogram:
+    """누적 버킷 histogram (count/sum/min/max 포함)"""
+
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def cumulative(self) -> list:
+        total, result = 0, []
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+    """스레드 안전한 counter / histogram 저장소"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self.started_at = time.time()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets=SECONDS_BUCKETS, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """with 블록 실행 시간(안쪽 span 제외)을 stage 단계 시간으로 기록"""
+        outer = _enter_stage()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = _exit_stage(outer, time.perf_counter() - start)
+            self.observe("stage_seconds", elapsed, stage=stage, **labels)
+
+    def timed_iter(self, iterable: Iterable[T], stage: str) -> Iterator[T]:
+        """제너레이터가 다음 항목을 만드는 데 걸린 시간을 stage 단계 시간으로 합산 (소비자 처리 시간 제외)"""
+        iterator = iter(iterable)
+        elapsed = 0.0
+        try:
+            while True:
+                outer = _enter_stage()
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += _exit_stage(outer, time.perf_counter() - start)
+                yield item
+        finally:
+            self.observe("stage_seconds", elapsed, stage=stage)
+
+    # ------------------------------------------------------------
+    # 내보내기
+    # ------------------------------------------------------------
+    def snapshot(self) -> dict:
+        """{"wall_seconds", "stages", "counters", "histograms"} (라벨은 "name{k=v}" 키로 펼침)"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: histogram.summary() for key, histogram in self._histograms.items()}
+
+        def flat(name: str, labels: LabelKey) -> str:
+            return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+        # 단계별 합계 (같은 단계의 다른 라벨은 합침)
+        stages = {}
+        for (name, labels), summary in sorted(histograms.items()):
+            if name != "stage_seconds":
+                continue
+            stage = stages.setdefault(dict(labels)["stage"], {"seconds": 0.0, "count": 0, "max": 0.0})
+            stage["seconds"] = round(stage["seconds"] + summary["sum"], 3)
+            stage["count"] += summary["count"]
+            stage["max"] = round(max(stage["max"], summary["max"] or 0.0), 3)
+        return {
+            "wall_seconds": round(time.time() - self.started_at, 3),
+            "stages": stages,
+            "counters": {flat(name, labels): value for (name, labels), value in sorted(counters.items())},
+            "histograms": {
+                flat(name, labels): summary
+                for (name, labels), summary in sorted(histograms.items())
+                if name != "stage_seconds"
+            },
+        }
+
+    def to_prometheus(self, extra_labels: Optional[dict] = None) -> str:
+        """Prometheus text exposition format (모든 시계열에 extra_labels 추가)"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (histogram.cumulative(), histogram.sum, histogram.count))
+                for key, histogram in self._histograms.items()
+            )
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{METRIC_PREFIX}{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels, extra_labels)} {_format_value(value)}")
+        for (name, labels), (cumulative, total, count) in histograms:
+            metric = f"{METRIC_PREFIX}{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            for bound, n in cumulative:
+                bucket_labels = _format_labels(labels + (("le", f"{bound:g}"),), extra_labels)
+                lines.append(f"{metric}_bucket{bucket_labels} {n}")
+            lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),), extra_labels)} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels, extra_labels)} {_format_value(total)}")
+            lines.append(f"{metric}_count{_format_labels(labels, extra_labels)} {count}")
+        wall = time.time() - self.started_at
+        lines.append(f"# TYPE {METRIC_PREFIX}wall_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}wall_seconds{_format_labels((), extra_labels)} {wall:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+# 모듈을 처음 import한 시각부터 wall_seconds를 잼 (로더 시작 직후)
+_default_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """프로세스 전체에서 공유하는 기본 레지스트리"""
+    return _default_metrics
+
+
+def write_run_report(loader: str, extra: Optional[dict] = None, report_dir=INGEST_REPORT_DIR) -> Path:
+    """
+    기본 레지스트리의 실행 리포트를 JSON + Prometheus text로 저장하고 단계별 시간을 출력
+
+    Args:
+        loader: 로더 이름 (fraud / incoterms / cisg / claim / certification) - 파일 이름과 loader 라벨
+        extra: 리포트에 함께 남길 값 (컬렉션, 모델, 동기화 결과 등)
+
+    Returns:
+        JSON 리포트 경로 (.prom은 같은 이름)
+    """
+    metrics = get_metrics()
+    report = {"loader": loader, "finished_at": datetime.now().isoformat(timespec="seconds"), **metrics.snapshot()}
+    if extra:
+        report["extra"] = extra
+
+    report_dir = Path(report_dir)
+    report_dir.mkdir(parents=True, exist_ok=True)
+    path = report_dir / f"ingest_{loader}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    path.with_suffix(".prom").write_text(metrics.to_prometheus({"loader": loader}), encoding="utf-8")
+
+    stages = ", ".join(f"{stage} {info['seconds']:.2f}s" for stage, info in report["stages"].items())
+    print(f"  [METRICS] 전체 {report['wall_seconds']:.2f}s | {stages or '단계 기록 없음'}")
+    print(f"  [METRICS] 실행 리포트 저장: {path} (+ .prom)")
+    return path
@@ -0,0 +1,366 @@
+"""
+NumPy 플랫 인덱스 (QdrantClient 호환 부분 구현)
+
+네트워크/서버 없이 로더와 벤치마크를 돌리기 위한 가장 단순한 벡터 저장소입니다.
+전체 벡터와의 내적을 한 번에 계산하는 완전 탐색(brute force)이므로 근사 오차가 없고,
+원격 지연을 빼고 우리 파이프라인 자체의 오버헤드만 측정할 때 기준선으로 사용합니다.
+
+이 저장소의 스크립트가 쓰는 QdrantClient 메서드만 구현합니다.
+(create_collection / collection_exists / get_collection(s) / delete_collection / create_payload_index /
+ upsert / delete / scroll / count / query_points / close)
+"""
+
+import json
+import threading
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from qdrant_client.http.models import QueryResponse
+from qdrant_client.models import (
+    CountResult,
+    Distance,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    HasIdCondition,
+    MatchAny,
+    MatchText,
+    MatchValue,
+    PointIdsList,
+    Record,
+    ScoredPoint,
+    VectorParams,
+)
+
+
+def _normalize_id(point_id: Union[str, int]) -> Union[str, int]:
+    """Qdrant와 같은 형식으로 ID 정규화 (정수는 그대로, UUID는 하이픈 형식 문자열)"""
+    if isinstance(point_id, int):
+        return point_id
+    return str(uuid.UUID(str(point_id)))
+
+
+def _get_field(payload: dict, key: str):
+    """'a.b.c' 형태의 중첩 키 조회"""
+    value = payload
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _match_condition(condition, point_id, payload: dict) -> bool:
+    if isinstance(condition, Filter):
+        return matches_filter(condition, point_id, payload)
+    if isinstance(condition, HasIdCondition):
+        return point_id in {_normalize_id(i) for i in condition.has_id}
+    if not isinstance(condition, FieldCondition):
+        raise NotImplementedError(f"NumPy 인덱스에서 지원하지 않는 조건: {type(condition).__name__}")
+
+    value = _get_field(payload, condition.key)
+    values = value if isinstance(value, list) else [value]
+    if condition.match is not None:
+        match = condition.match
+        if isinstance(match, MatchValue):
+            return match.value in values
+        if isinstance(match, MatchAny):
+            return any(v in match.any for v in values)
+        if isinstance(match, MatchText):
+            return any(isinstance(v, str) and match.text in v for v in values)
+        raise NotImplementedError(f"NumPy 인덱스에서 지원하지 않는 match: {type(match).__name__}")
+    if condition.range is not None:
+        rng = condition.range
+        nums = [v for v in values if isinstance(v, (int, float))]
+        return any(
+            (rng.gt is None or v > rng.gt) and (rng.gte is None or v >= rng.gte)
+            and (rng.lt is None or v < rng.lt) and (rng.lte is None or v <= rng.lte)
+            for v in nums
+        )
+    return False
+
+
+def _as_list(conditions) -> list:
+    if conditions is None:
+        return []
+    return conditions if isinstance(conditions, list) else [conditions]
+
+
+def matches_filter(query_filter: Optional[Filter], point_id, payload: dict) -> bool:
+    """Qdrant Filter(must / should / must_not)를 payload 하나에 적용"""
+    if query_filter is None:
+        return True
+    must = _as_list(query_filter.must)
+    should = _as_list(query_filter.should)
+    must_not = _as_list(query_filter.must_not)
+    if not all(_match_condition(c, point_id, payload) for c in must):
+        return False
+    if should and not any(_match_condition(c, point_id, payload) for c in should):
+        return False
+    return not any(_match_condition(c, point_id, payload) for c in must_not)
+
+
+def _select_payload(payload: dict, with_payload) -> Optional[dict]:
+    if with_payload is True:
+        return dict(payload)
+    if not with_payload:
+        return None
+    return {k: payload[k] for k in with_payload if k in payload}
+
+
+class _Collection:
+    """컬렉션 하나: 행 단위 벡터 행렬 + payload 리스트 (삭제는 행 비활성화)"""
+
+    def __init__(self, params: VectorParams):
+        self.params = params
+        self.vectors = np.zeros((0, params.size), dtype=np.float32)
+        self.ids: List[Union[str, int]] = []
+        self.payloads: List[dict] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.rows: Dict[Union[str, int], int] = {}
+
+    def _prepare(self, vector) -> np.ndarray:
+        arr = np.asarray(vector, dtype=np.float32)
+        if arr.shape != (self.params.size,):
+            raise ValueError(f"벡터 차원 불일치: {arr.shape[0]} != {self.params.size}")
+        if self.params.distance == Distance.COSINE:
+            norm = np.linalg.norm(arr)
+            if norm > 0:
+                arr = arr / norm
+        return arr
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.vectors)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 256)
+        vectors = np.zeros((new_capacity, self.params.size), dtype=np.float32)
+        vectors[:capacity] = self.vectors
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:capacity] = self.alive
+        self.vectors, self.alive = vectors, alive
+
+    def upsert(self, point_id, vector, payload: Optional[dict]) -> None:
+        if isinstance(vector, dict):
+            raise NotImplementedError("NumPy 인덱스는 이름 없는 단일 dense 벡터만 지원합니다.")
+        row = self.rows.get(point_id)
+        if row is None:
+            row = len(self.ids)
+            self._grow(row + 1)
+            self.ids.append(point_id)
+            self.payloads.append({})
+            self.rows[point_id] = row
+        self.vectors[row] = self._prepare(vector)
+        self.payloads[row] = dict(payload or {})
+        self.alive[row] = True
+
+    def delete(self, point_id) -> None:
+        row = self.rows.pop(point_id, None)
+        if row is not None:
+            self.alive[row] = False
+            self.payloads[row] = {}
+
+    def matching_rows(self, query_filter: Optional[Filter]) -> np.ndarray:
+        n = len(self.ids)
+        rows = np.flatnonzero(self.alive[:n])
+        if query_filter is None:
+            return rows
+        return np.array(
+            [r for r in rows if matches_filter(query_filter, self.ids[r], self.payloads[r])],
+            dtype=np.int64,
+        )
+
+    def scores(self, query, rows: np.ndarray) -> np.ndarray:
+        q = self._prepare(query)
+        candidates = self.vectors[rows]
+        if self.params.distance == Distance.EUCLID:
+            return -np.linalg.norm(candidates - q, axis=1)
+        return candidates @ q
+
+
+class NumpyFlatIndex:
+    """QdrantClient 대신 쓸 수 있는 완전 탐색 인덱스 (path를 주면 close() 시 디스크에 저장)"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path and path != ":memory:" else None
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.RLock()
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    # ------------------------------------------------------------
+    # 컬렉션
+    # ------------------------------------------------------------
+    def _get(self, collection_name: str) -> _Collection:
+        if collection_name not in self._collections:
+            raise ValueError(f"Collection {collection_name} not found")
+        return self._collections[collection_name]
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return collection_name in self._collections
+
+    def create_collection(self, collection_name: str, vectors_config: VectorParams, **kwargs) -> bool:
+        if isinstance(vectors_config, dict):
+            raise NotImplementedError("NumPy 인덱스는 이름 없는 단일 dense 벡터만 지원합니다.")
+        with self._lock:
+            self._collections[collection_name] = _Collection(vectors_config)
+        return True
+
+    def delete_collection(self, collection_name: str, **kwargs) -> bool:
+        with self._lock:
+            return self._collections.pop(collection_name, None) is not None
+
+    def get_collections(self):
+        return SimpleNamespace(collections=[SimpleNamespace(name=name) for name in self._collections])
+
+    def get_collection(self, collection_name: str):
+        collection = self._get(collection_name)
+        n_points = int(collection.alive[:len(collection.ids)].sum())
+        return SimpleNamespace(
+            status="green",
+            points_count=n_points,
+            indexed_vectors_count=n_points,
+            config=SimpleNamespace(params=SimpleNamespace(vectors=collection.params)),
+        )
+
+    def update_collection(self, collection_name: str, **kwargs) -> bool:
+        # 양자화/HNSW/on_disk 설정은 완전 탐색 인덱스에 의미가 없음
+        self._get(collection_name)
+        return True
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, **kwargs):
+        # 완전 탐색이므로 payload 인덱스가 필요 없음
+        self._get(collection_name)
+        return None
+
+    # ------------------------------------------------------------
+    # 포인트
+    # ------------------------------------------------------------
+    def upsert(self, collection_name: str, points, wait: bool = True, **kwargs):
+        collection = self._get(collection_name)
+        with self._lock:
+            for point in points:
+                collection.upsert(_normalize_id(point.id), point.vector, point.payload)
+        return SimpleNamespace(status="completed")
+
+    def delete(self, collection_name: str, points_selector, wait: bool = True, **kwargs):
+        collection = self._get(collection_name)
+        with self._lock:
+            if isinstance(points_selector, PointIdsList):
+                ids = [_normalize_id(i) for i in points_selector.points]
+            elif isinstance(points_selector, (Filter, FilterSelector)):
+                query_filter = points_selector.filter if isinstance(points_selector, FilterSelector) else points_selector
+                ids = [collection.ids[r] for r in collection.matching_rows(query_filter)]
+            else:
+                ids = [_normalize_id(i) for i in points_selector]
+            for point_id in ids:
+                collection.delete(point_id)
+        return SimpleNamespace(status="completed")
+
+    def count(self, collection_name: str, count_filter: Optional[Filter] = None, exact: bool = True, **kwargs):
+        return CountResult(count=len(self._get(collection_name).matching_rows(count_filter)))
+
+    def scroll(
+        self,
+        collection_name: str,
+        scroll_filter: Optional[Filter] = None,
+        limit: int = 10,
+        offset=None,
+        with_payload=True,
+        with_vectors: bool = False,
+        **kwargs,
+    ):
+        """offset = 이번 페이지의 첫 포인트 ID (Qdrant와 같은 방식)"""
+        collection = self._get(collection_name)
+        with self._lock:
+            rows = collection.matching_rows(scroll_filter)
+            start = 0
+            if offset is not None:
+                offset_row = collection.rows.get(_normalize_id(offset))
+                start = int(np.searchsorted(rows, offset_row)) if offset_row is not None else len(rows)
+            page = rows[start:start + limit]
+            next_offset = collection.ids[rows[start + limit]] if start + limit < len(rows) else None
+            records = [
+                Record(
+                    id=collection.ids[r],
+                    payload=_select_payload(collection.payloads[r], with_payload),
+                    vector=collection.vectors[r].tolist() if with_vectors else None,
+                )
+                for r in page
+            ]
+        return records, next_offset
+
+    def query_points(
+        self,
+        collection_name: str,
+        query=None,
+        limit: int = 10,
+        query_filter: Optional[Filter] = None,
+        with_payload=True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        offset: int = 0,
+        **kwargs,
+    ) -> QueryResponse:
+        collection = self._get(collection_name)
+        with self._lock:
+            rows = collection.matching_rows(query_filter)
+            if len(rows) == 0:
+                return QueryResponse(points=[])
+            scores = collection.scores(query, rows)
+            k = min(limit + offset, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")][offset:]
+            points = []
+            for i in top:
+                if score_threshold is not None and scores[i] < score_threshold:
+                    break
+                r = rows[i]
+                points.append(ScoredPoint(
+                    id=collection.ids[r],
+                    version=0,
+                    score=float(scores[i]),
+                    payload=_select_payload(collection.payloads[r], with_payload),
+                    vector=collection.vectors[r].tolist() if with_vectors else None,
+                ))
+        return QueryResponse(points=points)
+
+    # ------------------------------------------------------------
+    # 저장 / 로드
+    # ------------------------------------------------------------
+    def _save(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta = {}
+        for name, collection in self._collections.items():
+            rows = collection.matching_rows(None)
+            np.save(self.path / f"{name}.npy", collection.vectors[rows])
+            with open(self.path / f"{name}.jsonl", "w", encoding="utf-8") as f:
+                for r in rows:
+                    f.write(json.dumps({"id": collection.ids[r], "payload": collection.payloads[r]}, ensure_ascii=False) + "\n")
+            meta[name] = {"size": collection.params.size, "distance": collection.params.distance.value}
+        with open(self.path / "collections.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    def _load(self) -> None:
+        meta_path = self.path / "collections.json"
+        if not meta_path.exists():
+            return
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        for name, params in meta.items():
+            collection = _Collection(VectorParams(size=params["size"], distance=Distance(params["distance"])))
+            vectors = np.load(self.path / f"{name}.npy")
+            with open(self.path / f"{name}.jsonl", encoding="utf-8") as f:
+                for line, vector in zip(f, vectors):
+                    row = json.loads(line)
+                    # 저장된 벡터는 이미 정규화되어 있음
+                    collection.upsert(row["id"], vector, row["payload"])
+            self._collections[name] = collection
+
+    def close(self, **kwargs) -> None:
+        if self.path is not None:
+            with self._lock:
+                self._save()
@@ -0,0 +1,47 @@
+"""
+검색용 공통 payload 스키마
+
+모든 로더가 같은 최소 필드로 payload를 만들어, 검색 응답 크기와 JSON 디코드 시간을 줄입니다.
+(이전에는 CISG 청크 전체 dict, 인증 정보의 중첩 메타데이터 등이 그대로 저장되어 매 검색마다 전송됨)
+
+    text         임베딩한 청크 원문 (검색 결과로 모델에 전달)
+    data_source  fraud | cisg | Incoterms | claim | certification
+    source       출처 표시용 이름 (예: "CISG Article 25", 파일/문서 이름, 인증 이름)
+    chunk_id     원본 내 청크 식별자 (정답 세트 비교, 디버깅용)
+    content_hash 증분 동기화용 (index_sync가 추가)
+
+소스별로 필터/인용에 필요한 필드만 추가로 둡니다. (cisg: article, paragraph_no, level, parent_id, article_id / fraud: section / claim: merged_chunk_ids / certification: country, category, url)
+검색 시에는 SEARCH_PAYLOAD_FIELDS만 요청하여(with_payload=리스트) 필요한 필드만 받습니다.
+"""
+
+from typing import Optional
+
+
+# 스키마가 바뀌면 올려서 증분 동기화가 기존 포인트의 payload를 다시 쓰도록 함
+PAYLOAD_SCHEMA_VERSION = "payload-v2"
+
+# 검색 tool이 사용하는 필드 (이전 스키마로 저장된 포인트의 출처 필드 포함)
+# (article_id: CISG 호/항 포인트를 감싸는 조 포인트 ID, small-to-big 검색용)
+SEARCH_PAYLOAD_FIELDS = ["text", "data_source", "source", "article", "article_id", "document_name", "file_name"]
+
+
+def make_payload(data_source: str, text: str, source: str, chunk_id=None, **fields) -> dict:
+    """공통 payload 생성 (값이 None/빈 문자열인 추가 필드는 저장하지 않음)"""
+    payload = {"data_source": data_source, "text": text, "source": source}
+    if chunk_id is not None:
+        payload["chunk_id"] = chunk_id
+    payload.update({key: value for key, value in fields.items() if value not in (None, "")})
+    return payload
+
+
+def source_label(payload: Optional[dict]) -> str:
+    """출처 표시용 이름 (이전 스키마의 article / document_name / file_name도 처리)"""
+    payload = payload or {}
+    if "article" in payload:
+        return f"CISG Article {payload.get('article')}"
+    return (
+        payload.get("document_name")
+        or payload.get("file_name")
+        or payload.get("source")
+        or payload.get("data_source", "unknown")
+    )
@@ -0,0 +1,161 @@
+"""
+스트리밍 인제스트 파이프라인
+
+load → chunk → embed → upsert 단계를 제한된 크기의 큐로 연결합니다.
+- load/chunk: 로더가 넘겨준 제너레이터를 별도 스레드에서 소비하며 윈도우 단위로 묶음
+- embed: 윈도우 최대 PIPELINE_EMBED_WORKERS개를 동시에 임베딩하고 입력 순서대로 전달
+  (윈도우 하나가 요청 하나 분량인 작은 청크 소스도 여러 요청이 동시에 나가도록.
+   전체 동시 요청 수와 RPM/TPM 예산은 embed_texts의 EmbeddingExecutor가 제한)
+- upsert: 포인트를 QdrantUploader에 넘김 (업로더 워커가 동시 upsert)
+
+단계 시간(chunk: 청크 제너레이터 소비, embed: 윈도우 임베딩)은 get_metrics()에 기록됩니다.
+
+각 큐의 크기가 제한되어 있어 말뭉치 크기와 관계없이 메모리에 올라가는 청크/벡터 수가
+(윈도우 크기 × (큐 크기 + 동시 임베딩 윈도우 수)) 수준으로 유지되고, 첫 윈도우가 임베딩되는 즉시 업로드가 시작됩니다.
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, TypeVar
+
+from qdrant_client.models import PointStruct
+
+from .metrics import get_metrics
+from .qdrant_uploader import QdrantUploader
+
+
+PIPELINE_WINDOW = int(os.getenv("PIPELINE_WINDOW", 256))   # 임베딩 한 번에 넘길 청크 수
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 4))  # 단계 사이 큐에 쌓일 수 있는 윈도우 수
+# 동시에 임베딩할 윈도우 수 (기본: 임베딩 동시 요청 수와 같게)
+PIPELINE_EMBED_WORKERS = int(os.getenv("PIPELINE_EMBED_WORKERS", os.getenv("EMBED_MAX_WORKERS", 4)))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """iterable을 size개씩 리스트로 묶음"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def threaded_map(
+    fn: Callable[[T], R], iterable: Iterable[T], maxsize: int = PIPELINE_QUEUE_SIZE, workers: int = 1
+) -> Iterator[R]:
+    """
+    별도 스레드에서 iterable을 소비하며 fn을 적용하고, 결과를 입력 순서대로 제한된 큐로 전달
+
+    workers > 1이면 항목 최대 workers개에 fn을 동시에 적용합니다.
+    소비자가 느리면 큐가 차서 생산자가 대기하므로 메모리 사용량이 제한됩니다.
+    생산자 쪽 예외는 소비자 쪽에서 다시 발생합니다.
+    """
+    results: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def produce() -> None:
+        if workers <= 1:
+            try:
+                for item in iterable:
+                    if stop.is_set():
+                        return
+                    results.put(fn(item))
+            except BaseException as e:
+                results.put(_StageError(e))
+            finally:
+                results.put(_DONE)
+            return
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline") as pool:
+            try:
+                for item in iterable:
+                    if stop.is_set():
+                        return
+                    pending.append(pool.submit(fn, item))
+                    if len(pending) >= workers:
+                        results.put(pending.popleft().result())
+                while pending and not stop.is_set():
+                    results.put(pending.popleft().result())
+            except BaseException as e:
+                results.put(_StageError(e))
+            finally:
+                for future in pending:
+                    future.cancel()
+                results.put(_DONE)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        # 소비자가 중간에 멈춘 경우 생산자가 put에서 막히지 않도록 큐를 비움
+        stop.set()
+        while thread.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def run_ingest_pipeline(
+    records: Iterable[dict],
+    embed_texts: Callable[[List[str]], list],
+    make_point: Callable[[dict, list], PointStruct],
+    uploader: QdrantUploader,
+    window: int = PIPELINE_WINDOW,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    embed_workers: int = PIPELINE_EMBED_WORKERS,
+) -> int:
+    """
+    청크 레코드 스트림을 임베딩하여 업로더로 흘려보냄
+
+    Args:
+        records: {"text": ..., ...} 청크 레코드 제너레이터 (load/chunk 단계)
+        embed_texts: 텍스트 리스트 → 벡터 리스트 함수 (embed 단계)
+        make_point: (레코드, 벡터) → PointStruct 함수
+        uploader: QdrantUploader (upsert 단계)
+        window: 임베딩 한 번에 넘길 청크 수
+        queue_size: 단계 사이 큐 크기 (윈도우 개수)
+        embed_workers: 동시에 임베딩할 윈도우 수 (embed_texts는 여러 스레드에서 호출됨)
+
+    Returns:
+        처리한 청크 수
+    """
+    metrics = get_metrics()
+
+    def embed_window(batch):
+        with metrics.span("embed"):
+            return batch, embed_texts([r["text"] for r in batch])
+
+    # 로더의 청크 제너레이터(load/chunk)가 다음 청크를 만드는 시간 = chunk 단계
+    windows = threaded_map(lambda batch: batch, batched(metrics.timed_iter(records, "chunk"), window), queue_size)
+    embedded = threaded_map(embed_window, windows, queue_size, workers=embed_workers)
+
+    total = 0
+    for batch, vectors in embedded:
+        uploader.add(make_point(rec, vec) for rec, vec in zip(batch, vectors))
+        total += len(batch)
+        metrics.inc("pipeline_chunks", len(batch))
+        print(f"  [PIPELINE] 임베딩 완료 누적 {total}개 → 업로드 큐 전달")
+    return total
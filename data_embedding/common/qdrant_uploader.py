@@ -0,0 +1,228 @@
+"""
+파이프라인형 Qdrant 업로더
+
+- add()로 들어온 포인트를 바이트 크기/개수 기준으로 배치 구성
+- 완성된 배치는 제한된 크기의 큐를 거쳐 여러 워커 스레드가 동시에 upsert (wait=False)
+- 큐가 가득 차면 add()가 대기하므로 메모리 사용량이 제한됨 (backpressure)
+- 마지막 배치는 앞선 요청이 모두 접수된 뒤 wait=True로 보내 그 배치의 반영을 기다림
+  (샤드 하나인 컬렉션은 업데이트를 접수 순서대로 적용하므로 앞선 배치도 반영된 상태지만,
+   샤드/복제본이 여러 개면 다른 샤드의 wait=False 요청까지 반영되었다는 보장은 없음
+   → 반드시 모두 반영된 뒤 진행해야 하면 UPSERT_WAIT_ALL=1로 모든 배치를 wait=True로 보냄)
+
+임베딩 루프에서 배치마다 add()를 호출하면 업로드가 다음 배치 임베딩과 겹쳐서 진행됩니다.
+upsert 단계 시간, 배치 크기, 재시도 수는 get_metrics()에 기록됩니다.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from .backends import is_embedded_client
+from .metrics import SIZE_BUCKETS, get_metrics
+
+
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", 4))
+UPSERT_MAX_IN_FLIGHT = int(os.getenv("UPSERT_MAX_IN_FLIGHT", 8))
+UPSERT_BATCH_BYTES = int(os.getenv("UPSERT_BATCH_BYTES", 8 * 1024 * 1024))  # Qdrant Cloud 요청 상한(32MB)보다 여유 있게
+UPSERT_BATCH_POINTS = int(os.getenv("UPSERT_BATCH_POINTS", 256))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", 3))
+UPSERT_WAIT_ALL = os.getenv("UPSERT_WAIT_ALL", "0") == "1"
+UPSERT_JOIN_TIMEOUT = float(os.getenv("UPSERT_JOIN_TIMEOUT", 600))  # 종료 시 워커를 기다리는 최대 시간(초)
+
+# JSON 직렬화 시 float 하나당 대략적인 바이트 수 (예: "-0.012345678,")
+_BYTES_PER_FLOAT = 20
+
+_STOP = object()
+
+
+def estimate_point_bytes(point: PointStruct) -> int:
+    """요청 본문에서 포인트 하나가 차지할 대략적인 바이트 수"""
+    vector = point.vector
+    if isinstance(vector, dict):
+        n_floats = sum(len(v) if isinstance(v, list) else len(getattr(v, "values", [])) * 2 for v in vector.values())
+    else:
+        n_floats = len(vector)
+    payload_bytes = len(json.dumps(point.payload or {}, ensure_ascii=False, default=str).encode("utf-8"))
+    return n_floats * _BYTES_PER_FLOAT + payload_bytes + 64
+
+
+class QdrantUploader:
+    """동시 upsert 워커 + 바이트 기준 배치 업로더 (with 문으로 사용)"""
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        collection_name: str,
+        workers: int = UPSERT_WORKERS,
+        max_in_flight: int = UPSERT_MAX_IN_FLIGHT,
+        max_batch_bytes: int = UPSERT_BATCH_BYTES,
+        max_batch_points: int = UPSERT_BATCH_POINTS,
+        max_retries: int = UPSERT_MAX_RETRIES,
+        local: Optional[bool] = None,
+        wait_all: bool = UPSERT_WAIT_ALL,
+        join_timeout: float = UPSERT_JOIN_TIMEOUT,
+    ):
+        """
+        Args:
+            client: Qdrant 클라이언트
+            collection_name: 업로드할 컬렉션
+            workers: 동시에 upsert 요청을 보낼 스레드 수
+            max_in_flight: 대기 큐에 쌓일 수 있는 최대 배치 수
+            max_batch_bytes / max_batch_points: 배치 하나의 크기 상한
+            max_retries: 배치별 upsert 재시도 횟수
+            local: 임베디드 로컬 Qdrant면 True (요청 직렬화, None = 클라이언트로 판별)
+            wait_all: True면 모든 배치를 wait=True로 보냄 (샤드/복제본이 여러 개여도 종료 시 전체 반영 보장)
+            join_timeout: 종료 시 워커 스레드를 기다리는 최대 시간(초)
+        """
+        self.client = client
+        self.collection_name = collection_name
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_points = max_batch_points
+        self.max_retries = max_retries
+        self.wait_all = wait_all
+        self.join_timeout = join_timeout
+
+        self.points_uploaded = 0
+        self.batches_uploaded = 0
+        self.bytes_uploaded = 0
+
+        self._batch: List[PointStruct] = []
+        self._batch_bytes = 0
+        self._held: Optional[tuple] = None  # 마지막에 wait=True로 보낼 배치
+        self._error: Optional[BaseException] = None
+        self._stats_lock = threading.Lock()
+        # 임베디드 로컬 Qdrant는 동시 upsert를 지원하지 않으므로 한 번에 하나씩 보냄
+        if local is None:
+            local = is_embedded_client(client)
+        self._client_lock = threading.Lock() if local else None
+        self._queue = queue.Queue(maxsize=max_in_flight)
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"qdrant-upsert-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    # ------------------------------------------------------------
+    # 워커
+    # ------------------------------------------------------------
+    def _upsert(self, points: List[PointStruct], n_bytes: int, wait: bool) -> None:
+        metrics = get_metrics()
+        with metrics.span("upsert"):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    if self._client_lock is not None:
+                        with self._client_lock:
+                            self.client.upsert(collection_name=self.collection_name, points=points, wait=wait)
+                    else:
+                        self.client.upsert(collection_name=self.collection_name, points=points, wait=wait)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise
+                    metrics.inc("upsert_retries", error=type(e).__name__)
+                    print(f"    ⚠ upsert 실패 ({e}), {2 ** attempt}초 후 재시도...")
+                    time.sleep(2 ** attempt)
+        metrics.inc("upsert_points", len(points))
+        metrics.inc("upsert_bytes", n_bytes)
+        metrics.inc("upsert_batches")
+        metrics.observe("upsert_batch_points", len(points), buckets=SIZE_BUCKETS)
+        metrics.observe("upsert_batch_bytes", n_bytes, buckets=SIZE_BUCKETS)
+
+        with self._stats_lock:
+            self.points_uploaded += len(points)
+            self.batches_uploaded += 1
+            self.bytes_uploaded += n_bytes
+            print(f"    - 배치 {self.batches_uploaded} 업로드 완료 ({len(points)}개, 누적 {self.points_uploaded}개)")
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                if self._error is None:
+                    self._upsert(*item, wait=self.wait_all)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    # ------------------------------------------------------------
+    # 입력
+    # ------------------------------------------------------------
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"Qdrant 업로드 실패: {self._error}") from self._error
+
+    def _flush_batch(self) -> None:
+        if not self._batch:
+            return
+        batch = (self._batch, self._batch_bytes)
+        self._batch, self._batch_bytes = [], 0
+
+        # 직전 배치를 큐로 보내고, 이번 배치는 마지막 wait=True 후보로 보관
+        if self._held is not None:
+            self._queue.put(self._held)
+        self._held = batch
+
+    def add(self, points: Iterable[PointStruct]) -> None:
+        """포인트를 배치에 추가 (배치가 차면 업로드 큐로 전달)"""
+        self._raise_if_failed()
+        for point in points:
+            n_bytes = estimate_point_bytes(point)
+            if self._batch and (
+                self._batch_bytes + n_bytes > self.max_batch_bytes or len(self._batch) >= self.max_batch_points
+            ):
+                self._flush_batch()
+                self._raise_if_failed()
+            self._batch.append(point)
+            self._batch_bytes += n_bytes
+
+    def _stop_workers(self) -> bool:
+        """워커에 종료를 알리고 join_timeout까지 기다림. 모두 끝났으면 True"""
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        deadline = time.monotonic() + self.join_timeout
+        for worker in self._workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+        return not any(worker.is_alive() for worker in self._workers)
+
+    def finish(self) -> int:
+        """남은 배치를 모두 보내고 마지막 배치의 반영을 기다림. 업로드된 포인트 수를 반환"""
+        self._flush_batch()
+        if not self._stop_workers():
+            raise RuntimeError(f"Qdrant 업로드 워커가 {self.join_timeout:.0f}초 안에 끝나지 않았습니다.")
+        self._raise_if_failed()
+
+        # 앞선 요청이 모두 접수된 뒤 보냄 (단일 샤드면 이 요청의 완료가 전체 반영을 의미, 모듈 설명 참고)
+        if self._held is not None:
+            self._upsert(*self._held, wait=True)
+            self._held = None
+        return self.points_uploaded
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish()
+        else:
+            # 예외 발생 시 남은 작업은 버리고 (워커는 _error를 보고 건너뜀) 진행 중인 upsert가 끝날 때까지 대기
+            self._error = self._error or exc
+            if not self._stop_workers():
+                print(f"    ⚠ upsert 워커가 {self.join_timeout:.0f}초 안에 끝나지 않았습니다. (백그라운드 요청이 남아 있을 수 있음)")
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "points": self.points_uploaded,
+            "batches": self.batches_uploaded,
+            "bytes": self.bytes_uploaded,
+        }
@@ -0,0 +1,204 @@
+"""
+검색 쿼리 임베딩 캐시
+
+에이전트가 같은(또는 공백만 다른) 질문을 반복할 때
+임베딩 API 왕복을 생략하기 위한 2단 캐시입니다.
+- 1단: 프로세스 내 LRU (OrderedDict)
+- 2단: 선택적 디스크 캐시 (EmbeddingCache 재사용, 세션 간 공유)
+  비동기 메서드(aget_*)는 LRU만 이벤트 루프에서 확인하고, 디스크 읽기/쓰기는 asyncio.to_thread로 실행
+
+캐시 키와 임베딩 입력은 같은 정규화 문자열을 사용합니다.
+(임베딩 모델은 대소문자를 구분하므로 "FOB A4"와 "fob a4"는 다른 항목)
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from .embedding_cache import EmbeddingCache, default_cache_dir, make_cache_key, normalize_text
+
+
+# 기본값 (검색 스크립트가 load_dotenv()를 import 이후에 호출하므로 환경 변수는 캐시를 만들 때 읽음)
+QUERY_CACHE_MAX_ENTRIES = 1024           # QUERY_CACHE_MAX_ENTRIES
+QUERY_CACHE_TTL = 7 * 24 * 3600          # QUERY_CACHE_TTL (초, 기본 7일)
+QUERY_CACHE_PERSIST = "1"                # QUERY_CACHE_PERSIST (0이면 메모리 LRU만)
+
+_FROM_ENV = object()
+
+
+def default_query_cache_dir() -> Path:
+    """쿼리 임베딩 디스크 캐시 폴더 (QUERY_CACHE_DIR, 기본: 임베딩 캐시 옆 query_embeddings)"""
+    return Path(os.getenv("QUERY_CACHE_DIR", default_cache_dir().parent / "query_embeddings"))
+
+
+def normalize_query(query: str) -> str:
+    """쿼리 캐시 키 + 임베딩 입력용 정규화 (NFC + 공백 정리)"""
+    return normalize_text(query)
+
+
+class QueryEmbeddingCache:
+    """쿼리 벡터 LRU + 디스크 캐시"""
+
+    def __init__(
+        self,
+        model: str,
+        max_entries: Optional[int] = None,
+        ttl_seconds=_FROM_ENV,
+        persistent: Optional[bool] = None,
+        cache_dir=None,
+    ):
+        """
+        Args:
+            model: 임베딩 모델 이름 (캐시 키에 포함)
+            max_entries: 메모리 LRU 최대 항목 수
+            ttl_seconds: 항목 유효 시간 (None = 무제한)
+            persistent: True면 디스크 캐시도 사용
+            cache_dir: 디스크 캐시 폴더
+        지정하지 않은 값은 QUERY_CACHE_* 환경 변수(없으면 기본값)를 사용합니다.
+        """
+        if max_entries is None:
+            max_entries = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", QUERY_CACHE_MAX_ENTRIES))
+        if ttl_seconds is _FROM_ENV:
+            ttl_seconds = float(os.getenv("QUERY_CACHE_TTL", QUERY_CACHE_TTL))
+        if persistent is None:
+            persistent = os.getenv("QUERY_CACHE_PERSIST", QUERY_CACHE_PERSIST) == "1"
+
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk = EmbeddingCache(cache_dir or default_query_cache_dir()) if persistent else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._lru = OrderedDict()  # key -> (created_at, vector)
+        self._lock = threading.Lock()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _get_memory(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                created_at, vector = entry
+                if not self._expired(created_at):
+                    self._lru.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._lru[key]
+        return None
+
+    def _get_disk_many(self, normalized: List[str]) -> List[Optional[List[float]]]:
+        """디스크 캐시 조회 (sqlite + memmap 읽기이므로 비동기 경로에서는 스레드에서 호출)"""
+        vectors = []
+        for text, cached in zip(normalized, self.disk.get_entries(self.model, normalized, max_age=self.ttl_seconds)):
+            if cached is None:
+                vectors.append(None)
+                continue
+            vector, created_at = cached[0].tolist(), cached[1]
+            # 디스크 저장 시각을 이어받아 TTL을 다시 시작하지 않음
+            self._remember(make_cache_key(self.model, text), vector, created_at)
+            vectors.append(vector)
+        with self._lock:
+            self.disk_hits += sum(vector is not None for vector in vectors)
+        return vectors
+
+    def _put_disk_many(self, normalized: List[str], vectors: List[List[float]]) -> None:
+        self.disk.put_many(self.model, normalized, vectors)
+
+    def get(self, query: str) -> Optional[List[float]]:
+        """캐시된 쿼리 벡터 (없거나 만료되면 None)"""
+        normalized = normalize_query(query)
+        vector = self._get_memory(make_cache_key(self.model, normalized))
+        if vector is None and self.disk is not None:
+            vector = self._get_disk_many([normalized])[0]
+        return vector
+
+    async def aget_many(self, queries: List[str]) -> List[Optional[List[float]]]:
+        """get의 비동기 일괄 버전 (LRU는 이벤트 루프에서, 디스크 조회는 한 번에 스레드에서)"""
+        normalized = [normalize_query(query) for query in queries]
+        vectors = [self._get_memory(make_cache_key(self.model, text)) for text in normalized]
+        missing = list(dict.fromkeys(text for text, vector in zip(normalized, vectors) if vector is None))
+        if missing and self.disk is not None:
+            found = dict(zip(missing, await asyncio.to_thread(self._get_disk_many, missing)))
+            vectors = [vector if vector is not None else found[text] for text, vector in zip(normalized, vectors)]
+        return vectors
+
+    def put(self, query: str, vector: List[float]) -> None:
+        normalized = normalize_query(query)
+        self._remember(make_cache_key(self.model, normalized), list(vector))
+        if self.disk is not None:
+            self._put_disk_many([normalized], [vector])
+
+    async def aput_many(self, queries: List[str], vectors: List[List[float]]) -> None:
+        """put의 비동기 일괄 버전 (디스크 저장(memmap flush + sqlite commit)은 스레드에서)"""
+        normalized = [normalize_query(query) for query in queries]
+        for text, vector in zip(normalized, vectors):
+            self._remember(make_cache_key(self.model, text), list(vector))
+        if self.disk is not None and normalized:
+            await asyncio.to_thread(self._put_disk_many, normalized, vectors)
+
+    def _remember(self, key: str, vector: List[float], created_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._lru[key] = (time.time() if created_at is None else created_at, vector)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def get_or_embed(self, query: str, embed_fn: Callable[[str], List[float]]) -> List[float]:
+        """캐시에 있으면 바로 반환, 없으면 embed_fn(정규화된 query) 호출 후 저장"""
+        vector = self.get(query)
+        if vector is not None:
+            return vector
+
+        self.misses += 1
+        vector = embed_fn(normalize_query(query))
+        self.put(query, vector)
+        return vector
+
+    async def aget_or_embed(self, query: str, embed_fn: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        """get_or_embed의 비동기 버전 (embed_fn은 코루틴 함수, 디스크 캐시 접근은 이벤트 루프를 막지 않음)"""
+        [vector] = await self.aget_many([query])
+        if vector is not None:
+            return vector
+
+        self.misses += 1
+        vector = await embed_fn(normalize_query(query))
+        await self.aput_many([query], [vector])
+        return vector
+
+    async def aget_or_embed_many(
+        self, queries: List[str], embed_many_fn: Callable[[List[str]], Awaitable[List[List[float]]]]
+    ) -> List[List[float]]:
+        """
+        여러 쿼리를 한 번에 조회하고, 캐시 미스만 모아 embed_many_fn 한 번으로 임베딩
+        (정규화 후 같은 쿼리는 한 번만 임베딩)
+        """
+        vectors = await self.aget_many(queries)
+        missing = list(dict.fromkeys(
+            normalize_query(query) for query, vector in zip(queries, vectors) if vector is None
+        ))
+
+        if missing:
+            self.misses += len(missing)
+            embedded = dict(zip(missing, await embed_many_fn(missing)))
+            await self.aput_many(missing, [embedded[text] for text in missing])
+            vectors = [
+                vector if vector is not None else embedded[normalize_query(query)]
+                for query, vector in zip(queries, vectors)
+            ]
+        return vectors
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._lru),
+        }
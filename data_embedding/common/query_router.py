@@ -0,0 +1,143 @@
+"""
+질의 라우터 + 검색 필터
+
+trade_collection에는 다섯 소스(fraud / cisg / Incoterms / claim / certification)가 섞여 있으므로,
+질의에 소스를 특정하는 단서(조문 번호, 인코텀즈 코드, "사기", "인증" 등)가 있으면
+해당 data_source만 필터링하여 검색합니다. (data_source payload 인덱스 → 필터된 HNSW 검색)
+단서가 없으면 None을 반환하여 전체 컬렉션을 검색합니다.
+라우팅이 틀려도 맞는 소스가 가려지지 않도록, 라우팅 검색에는 필터 없는 상위 ROUTER_BACKFILL개 결과를 합칩니다.
+(merge_routed_results, 환경 변수 ROUTER_BACKFILL=0이면 라우팅 결과가 없을 때만 전체 검색)
+
+정규식 규칙만 사용하므로 임베딩/LLM 호출 없이 마이크로초 단위로 동작합니다.
+규칙은 re.ASCII로 컴파일합니다. (한글도 \w이므로 "FOB에서", "A4에 따른"처럼 조사가 붙으면 \b 경계가 생기지 않음)
+"""
+
+import os
+import re
+import unicodedata
+from typing import List, Optional, Sequence, Tuple
+
+from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue
+
+
+DATA_SOURCES = ("fraud", "cisg", "Incoterms", "claim", "certification")
+
+# 라우팅된 검색에 함께 합칠 필터 없는 검색 결과 수 기본값 (ROUTER_BACKFILL 환경 변수, router_backfill()에서 읽음)
+ROUTER_BACKFILL = 5
+
+INCOTERMS_CODES = ("exw", "fca", "fas", "fob", "cfr", "cif", "cpt", "cip", "dap", "dpu", "ddp")
+
+# 라우팅은 다른 소스를 가리는 하드 필터이므로, 여러 소스에 걸치는 일반어("협약", "분쟁", "claim", "위험 이전" 등)나
+# 짧은 코드("A4", "B2B")는 규칙에 넣지 않고 해당 소스에만 쓰이는 구문만 둡니다.
+# (인코텀즈 A1~A10/B1~B10 조항은 함께 쓰인 인코텀즈 코드/명칭으로 라우팅됨)
+SOURCE_RULES = {
+    "cisg": [
+        r"cisg", r"비엔나\s*협약", r"국제물품매매", r"(?:유엔|un)\s*(?:국제\s*)?(?:물품\s*)?매매\s*협약",
+        r"제\s*\d+\s*조", r"\barticle\s*\d+",
+    ],
+    "Incoterms": [
+        r"incoterms?", r"인코텀즈", r"\b(?:" + "|".join(INCOTERMS_CODES) + r")\b", r"인도\s*조건",
+    ],
+    "fraud": [
+        r"사기", r"fraud", r"scam", r"피싱", r"phishing", r"해킹", r"위조", r"사칭", r"가짜",
+    ],
+    "claim": [
+        r"클레임", r"무역\s*분쟁", r"분쟁\s*사례", r"중재", r"arbitration", r"소송", r"판례",
+        r"\btrade\s+claims?\b", r"\bclaims?\s+(?:letter|notice|settlement)\b",
+    ],
+    "certification": [
+        r"인증", r"certif", r"규격", r"시험\s*성적", r"수입\s*허가",
+        r"\b(?:ce|fda|kc|ul|ccc|pse|bis|eac|gcc|sabs|halal)\b", r"할랄",
+    ],
+}
+
+_COMPILED_RULES = {
+    source: [re.compile(pattern, re.ASCII) for pattern in patterns]
+    for source, patterns in SOURCE_RULES.items()
+}
+
+
+def route_query(query: str) -> Optional[List[str]]:
+    """
+    질의에서 소스 단서를 찾아 검색할 data_source 목록을 반환 (단서가 없으면 None = 전체 검색)
+
+    >>> route_query("FOB에서 매도인 의무는?")
+    ['Incoterms']
+    >>> route_query("CIF조건에서 보험은?")
+    ['Incoterms']
+    >>> route_query("EXW는 뭐야")
+    ['Incoterms']
+    >>> route_query("FOB A4에 따른 인도 의무")
+    ['Incoterms']
+    >>> route_query("CE인증이 필요한가요?")
+    ['certification']
+    >>> route_query("Article 25의 본질적 위반")
+    ['cisg']
+    >>> route_query("비엔나 협약상 계약 해제")
+    ['cisg']
+    >>> route_query("무역 분쟁 사례 알려줘")
+    ['claim']
+    >>> route_query("replace 조항") is None
+    True
+    >>> route_query("A4에 따른 인도 의무") is None
+    True
+    >>> route_query("B2B 거래 분쟁이 생기면?") is None
+    True
+    >>> route_query("협약에 따라 claim damages 가능?") is None
+    True
+    >>> route_query("수출 절차 알려줘") is None
+    True
+    """
+    text = unicodedata.normalize("NFC", query or "").lower()
+    sources = [
+        source for source, patterns in _COMPILED_RULES.items()
+        if any(pattern.search(text) for pattern in patterns)
+    ]
+    return sources or None
+
+
+def router_backfill() -> int:
+    """라우팅된 검색에 합칠 필터 없는 검색 결과 수 (ROUTER_BACKFILL 환경 변수, 0 = 합치지 않음)"""
+    return int(os.getenv("ROUTER_BACKFILL", ROUTER_BACKFILL))
+
+
+def merge_routed_results(routed_points: list, backfill_points: list) -> Tuple[list, int]:
+    """
+    라우팅(필터) 검색 결과에 필터 없는 검색 결과를 합쳐 점수순으로 반환
+
+    Returns:
+        (합친 결과, 필터 없는 검색에서만 나온 포인트 수)
+    """
+    merged = {point.id: point for point in routed_points}
+    added = 0
+    for point in backfill_points:
+        if point.id not in merged:
+            merged[point.id] = point
+            added += 1
+    return sorted(merged.values(), key=lambda point: point.score, reverse=True), added
+
+
+def build_search_filter(
+    sources: Optional[Sequence[str]] = None,
+    country: Optional[str] = None,
+    category: Optional[str] = None,
+) -> Optional[Filter]:
+    """
+    data_source / country / category 조건으로 검색 필터 생성 (조건이 없으면 None)
+
+    country, category는 인증 정보(certification) payload에만 있으므로 지정하면 certification만 검색합니다.
+    """
+    if country or category:
+        sources = ["certification"]
+
+    must = []
+    if sources:
+        unknown = set(sources) - set(DATA_SOURCES)
+        if unknown:
+            raise ValueError(f"알 수 없는 data_source: {sorted(unknown)} (선택: {', '.join(DATA_SOURCES)})")
+        must.append(FieldCondition(key="data_source", match=MatchAny(any=list(sources))))
+    if country:
+        must.append(FieldCondition(key="country", match=MatchValue(value=country)))
+    if category:
+        must.append(FieldCondition(key="category", match=MatchValue(value=category)))
+    return Filter(must=must) if must else None
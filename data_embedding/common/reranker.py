@@ -0,0 +1,125 @@
+"""
+검색 결과 재정렬 (2단계 검색)
+
+벡터 검색에서 후보를 넉넉히(기본 50개) 가져온 뒤 CPU에서 다시 점수를 매겨 상위 k개만 모델에 전달합니다.
+적은 수의 정확한 문단만 넘기면 에이전트의 컨텍스트 토큰과 응답 지연이 함께 줄어듭니다.
+
+    RERANKER = blend          1단계 점수(dense/RRF) + 후보 집합 내 BM25 점수를 섞음 (추가 의존성 없음, 수 ms)
+             = cross-encoder  로컬 cross-encoder 모델 (sentence-transformers 필요, CPU에서 수백 ms)
+             = none           재정렬 없이 1단계 결과 그대로 사용
+    RERANK_CANDIDATES = 50    재정렬할 후보 수
+    RERANK_ALPHA      = 0.5   blend에서 1단계 점수 비중 (나머지는 BM25)
+    CROSS_ENCODER_MODEL       cross-encoder 모델 이름 (기본: 다국어 MiniLM)
+"""
+
+import os
+import time
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .sparse_vectors import BM25_B, BM25_K1, tokenize
+
+
+RERANKERS = ("none", "blend", "cross-encoder")
+RERANK_CANDIDATES = 50  # 기본값, 환경 변수는 default_rerank_candidates() / BlendReranker 생성 시 읽음 (.env 로드 후)
+RERANK_ALPHA = 0.5
+DEFAULT_CROSS_ENCODER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+def default_rerank_candidates() -> int:
+    """재정렬할 후보 수 (RERANK_CANDIDATES 환경 변수, 기본 50)"""
+    return int(os.getenv("RERANK_CANDIDATES", RERANK_CANDIDATES))
+
+
+def _minmax(values: np.ndarray) -> np.ndarray:
+    span = values.max() - values.min() if len(values) else 0.0
+    if span <= 0:
+        return np.zeros_like(values)
+    return (values - values.min()) / span
+
+
+def _top_k(scores: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return [(int(i), float(scores[i])) for i in order]
+
+
+class BlendReranker:
+    """1단계 점수와 후보 집합 내 BM25(질의 토큰만) 점수의 가중 합"""
+
+    name = "blend"
+
+    def __init__(self, alpha: Optional[float] = None):
+        # None = RERANK_ALPHA 환경 변수 (기본 0.5)
+        self.alpha = float(os.getenv("RERANK_ALPHA", RERANK_ALPHA)) if alpha is None else alpha
+
+    def rerank(self, query: str, texts: Sequence[str], scores: Sequence[float], top_k: int) -> List[Tuple[int, float]]:
+        first_stage = np.asarray(scores, dtype=np.float64)
+        terms = sorted(set(tokenize(query)))
+        if not terms or not len(texts):
+            return _top_k(first_stage, top_k)
+
+        # 후보 × 질의 토큰 tf 행렬 (IDF도 후보 집합 기준)
+        docs = [Counter(tokenize(text)) for text in texts]
+        tf = np.array([[doc.get(term, 0) for term in terms] for doc in docs], dtype=np.float64)
+        doc_len = np.array([sum(doc.values()) for doc in docs], dtype=np.float64)
+        avg_len = doc_len.mean() or 1.0
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avg_len)
+        bm25 = (tf * (BM25_K1 + 1) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+        blended = self.alpha * _minmax(first_stage) + (1 - self.alpha) * _minmax(bm25)
+        return _top_k(blended, top_k)
+
+
+class CrossEncoderReranker:
+    """로컬 cross-encoder로 (질의, 문단) 쌍을 직접 채점"""
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: Optional[str] = None, max_length: int = 512, batch_size: int = 16):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise ImportError("sentence-transformers 설치 필요: pip install sentence-transformers")
+        self.model_name = model_name or os.getenv("CROSS_ENCODER_MODEL", DEFAULT_CROSS_ENCODER_MODEL)
+        self.model = CrossEncoder(self.model_name, max_length=max_length, device="cpu")
+        self.batch_size = batch_size
+
+    def rerank(self, query: str, texts: Sequence[str], scores: Sequence[float], top_k: int) -> List[Tuple[int, float]]:
+        if not len(texts):
+            return []
+        predicted = self.model.predict([(query, text) for text in texts], batch_size=self.batch_size)
+        return _top_k(np.asarray(predicted, dtype=np.float64), top_k)
+
+
+def get_reranker(kind: Optional[str] = None):
+    """RERANKER 환경 변수(기본 blend)에 맞는 재정렬기 (none이면 None)"""
+    kind = kind or os.getenv("RERANKER", "blend")
+    if kind == "none":
+        return None
+    if kind == "blend":
+        return BlendReranker()
+    if kind == "cross-encoder":
+        return CrossEncoderReranker()
+    raise ValueError(f"알 수 없는 RERANKER: {kind} (선택: {', '.join(RERANKERS)})")
+
+
+def rerank_points(reranker, query: str, points: Sequence, top_k: int) -> Tuple[list, float]:
+    """
+    검색 결과(ScoredPoint 리스트)를 재정렬하여 상위 top_k개와 재정렬 시간(ms)을 반환
+    (재정렬 점수는 point.score에 덮어씀)
+    """
+    if reranker is None or not points:
+        return list(points)[:top_k], 0.0
+    start = time.perf_counter()
+    texts = [str((point.payload or {}).get("text", "")) for point in points]
+    ranked = reranker.rerank(query, texts, [point.score for point in points], top_k)
+    reranked = []
+    for index, score in ranked:
+        point = points[index]
+        point.score = score
+        reranked.append(point)
+    return reranked, (time.perf_counter() - start) * 1000
@@ -0,0 +1,278 @@
+"""
+오프라인 검색 벤치마크
+
+저장소에 포함된 정답(gold) 질의 세트로 검색 품질과 속도를 측정합니다.
+- fraud: eval_queries(gold).jsonl 의 gold_chunk_ids (검색 결과 payload의 chunk_id와 비교)
+- cisg: cisg_qa.jsonl 의 answer_text (검색 결과 텍스트에 정답 문장이 포함되면 정답)
+- incoterms: incoterms_qa.json 의 answer (위와 동일)
+
+지표: recall@k, MRR, nDCG@k, 검색 지연 p50/p95/p99, QPS, 질의당 payload 크기(bytes),
+      tokens@k (상위 k개 결과 텍스트의 토큰 수 = 모델에 전달되는 컨텍스트 크기, count_tokens를 줄 때)
+결과는 JSON 리포트로 저장하여 청킹/양자화/인덱스 설정 변경 전후를 비교합니다.
+"""
+
+import json
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from .payload_schema import SEARCH_PAYLOAD_FIELDS
+
+
+DATA_EMBEDDING_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_K_VALUES = (1, 3, 5, 10)
+
+# 검색 tool과 같은 payload 필드 + 정답 판정용 필드 (chunk_id, 이전 스키마의 content)
+BENCHMARK_PAYLOAD_FIELDS = SEARCH_PAYLOAD_FIELDS + ["chunk_id", "content"]
+
+# 검색 함수: (질의 벡터, 검색 개수, data_source 필터 또는 None, 질의 텍스트) → 순위대로 정렬된 payload 리스트
+# (질의 텍스트는 BM25 희소 벡터를 쓰는 하이브리드 검색용)
+SearchFn = Callable[[List[float], int, Optional[str], str], List[dict]]
+
+
+# ------------------------------------------------------------
+# 정답 세트 로드
+# ------------------------------------------------------------
+def _normalize_answer(text: str) -> str:
+    """공백/대소문자 차이를 무시하고 비교하기 위한 정규화"""
+    return re.sub(r"\s+", "", str(text)).lower()
+
+
+def load_fraud_gold(path: Path) -> List[dict]:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            items.append({"query": row["query"], "gold_ids": list(row["gold_chunk_ids"])})
+    return items
+
+
+def load_cisg_gold(path: Path) -> List[dict]:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            items.append({"query": row["query"], "answer": row["answer_text"]})
+    return items
+
+
+def load_incoterms_gold(path: Path) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        rows = json.load(f)
+    return [{"query": row["question"], "answer": row["answer"]} for row in rows]
+
+
+GOLD_SUITES = {
+    "fraud": {
+        "path": DATA_EMBEDDING_DIR / "fraud_vectorization" / "used_data" / "eval_queries(gold).jsonl",
+        "loader": load_fraud_gold,
+        "data_source": "fraud",
+    },
+    "cisg": {
+        "path": DATA_EMBEDDING_DIR / "cisg_vectorization" / "used_data" / "cisg_qa.jsonl",
+        "loader": load_cisg_gold,
+        "data_source": "cisg",
+    },
+    "incoterms": {
+        "path": DATA_EMBEDDING_DIR / "incoterms_vectorization" / "used_data" / "incoterms_qa.json",
+        "loader": load_incoterms_gold,
+        "data_source": "Incoterms",
+    },
+}
+
+
+def load_suite(name: str) -> List[dict]:
+    suite = GOLD_SUITES[name]
+    return suite["loader"](suite["path"])
+
+
+# ------------------------------------------------------------
+# 정답 판정 / 지표
+# ------------------------------------------------------------
+def _payload_text(payload: dict) -> str:
+    return str(payload.get("text") or payload.get("content") or "")
+
+
+def judge_hits(item: dict, payloads: Sequence[dict]) -> List[Optional[str]]:
+    """
+    검색 결과 각각이 어떤 정답에 해당하는지 반환 (해당 없으면 None)
+    같은 정답이 여러 번 나오면 처음 나온 순위만 인정합니다.
+    """
+    found = set()
+    matched = []
+    for payload in payloads:
+        gold = None
+        if "gold_ids" in item:
+            chunk_id = payload.get("chunk_id")
+            if chunk_id in item["gold_ids"] and chunk_id not in found:
+                gold = chunk_id
+        else:
+            if "answer" not in found and _normalize_answer(item["answer"]) in _normalize_answer(_payload_text(payload)):
+                gold = "answer"
+        if gold is not None:
+            found.add(gold)
+        matched.append(gold)
+    return matched
+
+
+def _n_gold(item: dict) -> int:
+    return len(set(item["gold_ids"])) if "gold_ids" in item else 1
+
+
+def query_metrics(matched: Sequence[Optional[str]], n_gold: int, k_values: Sequence[int]) -> dict:
+    """한 질의의 recall@k / nDCG@k / reciprocal rank"""
+    metrics = {}
+    for k in k_values:
+        top = matched[:k]
+        hits = sum(1 for m in top if m is not None)
+        dcg = sum(1.0 / math.log2(rank + 2) for rank, m in enumerate(top) if m is not None)
+        idcg = sum(1.0 / math.log2(rank + 2) for rank in range(min(n_gold, k)))
+        metrics[f"recall@{k}"] = hits / n_gold if n_gold else 0.0
+        metrics[f"ndcg@{k}"] = dcg / idcg if idcg else 0.0
+
+    first = next((rank for rank, m in enumerate(matched) if m is not None), None)
+    metrics["mrr"] = 1.0 / (first + 1) if first is not None else 0.0
+    return metrics
+
+
+def latency_summary(latencies: Sequence[float], wall_seconds: float) -> dict:
+    """검색 지연(ms) 분포와 처리량"""
+    if not latencies:
+        return {}
+    arr = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "mean_ms": round(float(arr.mean()), 2),
+        "qps": round(len(latencies) / wall_seconds, 2) if wall_seconds > 0 else None,
+    }
+
+
+# ------------------------------------------------------------
+# 실행
+# ------------------------------------------------------------
+def run_suite(
+    name: str,
+    items: List[dict],
+    embed_texts: Callable[[List[str]], list],
+    search: SearchFn,
+    k_values: Sequence[int] = DEFAULT_K_VALUES,
+    filter_source: bool = False,
+    concurrency: int = 1,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> dict:
+    """
+    정답 세트 하나를 실행
+
+    질의는 한 번에 배치로 임베딩하고(임베딩 시간은 지연에서 제외),
+    검색은 concurrency개 스레드로 보내 질의별 지연과 전체 QPS를 측정합니다.
+    """
+    limit = max(k_values)
+    data_source = GOLD_SUITES[name]["data_source"] if filter_source else None
+
+    embed_start = time.perf_counter()
+    vectors = embed_texts([item["query"] for item in items])
+    embed_seconds = time.perf_counter() - embed_start
+
+    def timed_search(vector, query):
+        start = time.perf_counter()
+        payloads = search(vector, limit, data_source, query)
+        return payloads, time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(timed_search, vectors, [item["query"] for item in items]))
+    wall_seconds = time.perf_counter() - wall_start
+
+    per_query = []
+    for item, (payloads, latency) in zip(items, results):
+        matched = judge_hits(item, payloads)
+        per_query.append({
+            "query": item["query"],
+            "latency_ms": round(latency * 1000, 2),
+            "first_hit_rank": next((rank + 1 for rank, m in enumerate(matched) if m is not None), None),
+            **query_metrics(matched, _n_gold(item), k_values),
+        })
+
+    metric_names = [f"recall@{k}" for k in k_values] + ["mrr"] + [f"ndcg@{k}" for k in k_values]
+    summary = {
+        "n_queries": len(items),
+        **{m: round(float(np.mean([q[m] for q in per_query])), 4) if per_query else 0.0 for m in metric_names},
+        "latency": latency_summary([latency for _, latency in results], wall_seconds),
+        # 검색 응답으로 받은 payload의 JSON 크기 (with_payload 필드 목록에 따라 달라짐)
+        "payload_bytes_mean": round(float(np.mean([
+            len(json.dumps(payloads, ensure_ascii=False, default=str).encode("utf-8")) for payloads, _ in results
+        ])), 1) if results else 0.0,
+        "embed_seconds": round(embed_seconds, 3),
+    }
+    if count_tokens is not None:
+        # 질의별 상위 k개 결과 텍스트의 토큰 수 합의 평균 (청크 크기 변경 시 recall@k와 함께 비교)
+        token_counts = [[count_tokens(_payload_text(p)) for p in payloads] for payloads, _ in results]
+        for k in k_values:
+            summary[f"tokens@{k}"] = round(float(np.mean([sum(c[:k]) for c in token_counts])), 1) if token_counts else 0.0
+    return {"summary": summary, "queries": per_query}
+
+
+def run_benchmark(
+    suite_names: Sequence[str],
+    embed_texts: Callable[[List[str]], list],
+    search: SearchFn,
+    k_values: Sequence[int] = DEFAULT_K_VALUES,
+    filter_source: bool = False,
+    concurrency: int = 1,
+    config: Optional[dict] = None,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> dict:
+    """여러 정답 세트를 실행하고 리포트(dict)를 반환"""
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            **(config or {}),
+            "k_values": list(k_values),
+            "filter_source": filter_source,
+            "concurrency": concurrency,
+        },
+        "suites": {},
+    }
+    for name in suite_names:
+        items = load_suite(name)
+        print(f"[BENCH] '{name}' 질의 {len(items)}개 실행 중...")
+        report["suites"][name] = run_suite(
+            name, items, embed_texts, search, k_values, filter_source, concurrency, count_tokens
+        )
+    return report
+
+
+def save_report(report: dict, output_path: Path) -> Path:
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return output_path
+
+
+def print_summary(report: dict) -> None:
+    for name, result in report["suites"].items():
+        s = result["summary"]
+        metrics = ", ".join(f"{k}={v}" for k, v in s.items() if k.startswith(("recall@", "ndcg@", "mrr")))
+        lat = s["latency"]
+        print(f"  [{name}] n={s['n_queries']} | {metrics}")
+        print(
+            f"  [{name}] p50={lat.get('p50_ms')}ms p95={lat.get('p95_ms')}ms "
+            f"p99={lat.get('p99_ms')}ms QPS={lat.get('qps')} payload={s.get('payload_bytes_mean')}B/질의"
+        )
+        tokens = ", ".join(f"{k}={v}" for k, v in s.items() if k.startswith("tokens@"))
+        if tokens:
+            print(f"  [{name}] 결과 토큰 수(질의당) {tokens}")
@@ -0,0 +1,95 @@
+"""
+Small-to-big (부모/자식) 검색
+
+CISG는 호(Ho) / 항(Paragraph) / 조(Article) 세 단위를 모두 색인하고, 각 포인트에 상위 단위 링크를 둡니다.
+    level       ho | paragraph | article
+    parent_id   바로 위 단위 포인트 ID (호 → 항 → 조, 항이 없는 호는 조)
+    article_id  자신을 포함하는 조(Article) 포인트 ID (조 포인트는 자기 자신)
+
+검색은 작은 단위(호/항)로 정밀하게 매칭하고, 모델에는 매칭된 청크를 감싸는 조문 전체를 한 번씩만 전달합니다.
+같은 조의 호/항/조가 여러 개 매칭되어도 가장 높은 순위 하나로 합쳐지므로 같은 텍스트가 중복 전달되지 않습니다.
+
+    SMALL_TO_BIG = 1    0이면 매칭된 청크를 그대로 전달 (계층 정보가 없는 포인트는 항상 그대로)
+"""
+
+import os
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence
+
+from qdrant_client.models import ScoredPoint
+
+from .index_sync import normalize_point_id
+
+
+LEVELS = ("ho", "paragraph", "article")
+SMALL_TO_BIG = "1"  # 기본값, 환경 변수는 small_to_big_enabled()에서 읽음 (.env 로드 후)
+
+
+def small_to_big_enabled() -> bool:
+    """호/항 결과를 감싸는 조로 바꿔 전달할지 여부 (SMALL_TO_BIG, 0이면 매칭된 청크 그대로)"""
+    return os.getenv("SMALL_TO_BIG", SMALL_TO_BIG) == "1"
+
+
+def link_parents(children: List[dict], parents: List[dict]) -> None:
+    """
+    각 child의 [start, end) span을 포함하는 parent를 찾아 child["parent_id"]에 기록 (없으면 None)
+
+    parents는 서로 겹치지 않는 span이어야 합니다. (같은 문서의 항/조 청크)
+    """
+    ordered = sorted(parents, key=lambda p: p["start"])
+    starts = [p["start"] for p in ordered]
+    for child in children:
+        i = bisect_right(starts, child["start"]) - 1
+        parent = ordered[i] if i >= 0 else None
+        if parent is not None and child["end"] <= parent["end"]:
+            child["parent_id"] = parent["id"]
+        else:
+            child["parent_id"] = None
+
+
+def parent_article_id(payload: Optional[dict]) -> Optional[str]:
+    """포인트를 감싸는 조(Article) 포인트 ID (계층 정보가 없는 포인트는 None)"""
+    article_id = (payload or {}).get("article_id")
+    return normalize_point_id(article_id) if article_id else None
+
+
+def missing_parent_ids(points: Sequence) -> List[str]:
+    """검색 결과에 이미 포함되지 않은 조(Article) 포인트 ID 목록 (검색 결과 순위 순서)"""
+    present = {normalize_point_id(point.id) for point in points}
+    missing = []
+    for point in points:
+        article_id = parent_article_id(point.payload)
+        if article_id and article_id not in present and article_id not in missing:
+            missing.append(article_id)
+    return missing
+
+
+def collapse_to_parents(points: Sequence, parents: Dict[str, object], limit: Optional[int] = None) -> list:
+    """
+    검색 결과의 호/항 포인트를 감싸는 조 포인트로 바꾸고 조 단위로 중복 제거
+
+    Args:
+        points: 순위순 검색 결과 (ScoredPoint)
+        parents: {정규화된 조 포인트 ID: 조 포인트(Record)} - missing_parent_ids로 조회한 포인트
+        limit: 반환할 최대 개수
+
+    Returns:
+        순위순 포인트 리스트 (조 포인트의 score는 가장 높은 순위로 매칭된 자식의 점수)
+    """
+    by_id = {normalize_point_id(point.id): point for point in points}
+    collapsed = []
+    seen = set()
+    for point in points:
+        article_id = parent_article_id(point.payload)
+        key = article_id or normalize_point_id(point.id)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        parent = (by_id.get(article_id) or parents.get(article_id)) if article_id else None
+        if parent is not None and parent is not point:
+            point = ScoredPoint(id=parent.id, version=0, score=point.score, payload=parent.payload)
+        collapsed.append(point)
+        if limit is not None and len(collapsed) >= limit:
+            break
+    return collapsed
@@ -0,0 +1,140 @@
+"""
+청크 span 정렬기
+
+미리 만들어진 청크(content)들이 원문의 어느 위치(start/end)에 있는지 한 번에 찾습니다.
+- 원문과 청크 모두 공백(줄바꿈/탭 포함) 연속을 공백 하나로 정규화하여 비교
+  (원문 정규화 뷰는 한 번만 만들고, 정규화 문자 → 원문 offset 배열로 원문 span을 정확히 복원)
+- 모든 청크를 Aho–Corasick 오토마톤에 넣어 정규화 원문을 한 번만 훑으며 전체 출현 위치를 수집
+  (청크마다 text.find를 반복하는 대신 원문 길이 + 청크 길이 합 + 출현 수에 비례)
+- 청크 목록 순서대로 직전 청크 뒤의 첫 출현을 고르고, 없으면 아직 쓰지 않은 출현을 골라
+  순서가 어긋난 청크(out of order)도 버리지 않고 정렬
+"""
+
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+def normalize_with_offsets(text: str) -> Tuple[str, List[int]]:
+    """
+    공백 연속을 공백 하나로 줄이고 앞뒤 공백을 제거한 문자열과,
+    정규화 문자 i의 원문 위치 offsets[i]를 반환
+    """
+    chars: List[str] = []
+    offsets: List[int] = []
+    pending_space = None
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            if pending_space is None and chars:
+                pending_space = i
+            continue
+        if pending_space is not None:
+            chars.append(" ")
+            offsets.append(pending_space)
+            pending_space = None
+        chars.append(ch)
+        offsets.append(i)
+    return "".join(chars), offsets
+
+
+def normalize_whitespace(text: str) -> str:
+    return " ".join(text.split())
+
+
+class AhoCorasick:
+    """여러 패턴의 모든 출현 위치를 한 번의 선형 탐색으로 찾는 오토마톤"""
+
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(index)
+
+        # BFS로 실패 링크 계산 (출력은 실패 링크 쪽 패턴까지 합침)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """(패턴 번호, 시작 위치)를 끝 위치 순서로 반환"""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                yield index, i - len(patterns[index]) + 1
+
+
+def align_spans(text: str, contents: Sequence[Optional[str]]) -> Tuple[List[Optional[Tuple[int, int]]], dict]:
+    """
+    각 content의 원문 span (start, end)을 찾습니다. (찾지 못하면 None)
+
+    공백만 다른 경우도 찾으며, 반환하는 span은 원문 기준이므로 text[start:end]가 원문 그대로의 청크입니다.
+
+    Returns:
+        (spans, stats) - stats: {"aligned", "out_of_order", "not_found"}
+    """
+    norm_text, offsets = normalize_with_offsets(text)
+    patterns = [normalize_whitespace(content) if content else "" for content in contents]
+
+    # 같은 패턴은 한 번만 오토마톤에 넣음
+    unique: Dict[str, int] = {}
+    for pattern in patterns:
+        if pattern and pattern not in unique:
+            unique[pattern] = len(unique)
+    occurrences: List[List[int]] = [[] for _ in unique]
+    for index, start in AhoCorasick(list(unique)).iter_matches(norm_text):
+        occurrences[index].append(start)
+    for starts in occurrences:
+        starts.sort()
+
+    spans: List[Optional[Tuple[int, int]]] = []
+    stats = {"aligned": 0, "out_of_order": 0, "not_found": 0}
+    claimed = set()
+    cursor = 0
+    for pattern in patterns:
+        starts = occurrences[unique[pattern]] if pattern else []
+        if not starts:
+            spans.append(None)
+            stats["not_found"] += 1
+            continue
+
+        # 직전 청크 뒤의 첫 출현 → 없으면 아직 쓰지 않은 출현 → 그래도 없으면 첫 출현
+        start = next(
+            (s for s in starts[bisect_left(starts, cursor):] if (s, pattern) not in claimed), None
+        )
+        if start is None:
+            start = next((s for s in starts if (s, pattern) not in claimed), starts[0])
+            stats["out_of_order"] += 1
+        else:
+            cursor = start + len(pattern)
+        claimed.add((start, pattern))
+
+        norm_end = start + len(pattern) - 1
+        spans.append((offsets[start], offsets[norm_end] + 1))
+        stats["aligned"] += 1
+    return spans, stats
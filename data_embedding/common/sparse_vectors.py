@@ -0,0 +1,210 @@
+"""
+BM25 희소 벡터 + 하이브리드(dense + sparse) 검색
+
+"CISG 제25조", "FOB A4"처럼 조문 번호/인코텀즈 코드가 핵심인 질의는 dense 검색만으로는
+정확한 어휘 일치를 놓치기 쉬우므로, 인제스트 시 BM25 희소 벡터를 함께 저장하고
+검색 시 dense/sparse 결과를 RRF(Reciprocal Rank Fusion)로 합칩니다.
+
+- 토크나이저: 한국어/영어 혼합 법률 텍스트용 (형태소 분석기 없이 동작)
+    * "제25조", "Article 25", "Art. 25" → 같은 토큰 "article_25"
+    * 한글 어절은 조사를 떼고 어간 + 문자 2-gram으로 분해 ("무역사기는" → 무역사기, 무역, 역사, 사기)
+    * 영어는 소문자 + 불용어 제거, 숫자/코드(FOB, A4)는 그대로 유지
+- 문서 벡터: BM25 tf 포화 가중치 (k1, b, 평균 문서 길이는 고정값)
+- 질의 벡터: 질의 토큰별 1.0, IDF는 Qdrant가 컬렉션 통계로 계산 (Modifier.IDF)
+
+희소 벡터는 trade_collection의 이름 있는 sparse 벡터("bm25")로 저장되며,
+dense 벡터는 기존과 같이 이름 없는 기본 벡터("")를 사용합니다.
+"""
+
+import hashlib
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import List, Optional
+
+from qdrant_client.models import (
+    Fusion,
+    FusionQuery,
+    Modifier,
+    Prefetch,
+    QueryRequest,
+    SparseVector,
+    SparseVectorParams,
+)
+
+
+SPARSE_VECTOR_NAME = "bm25"
+DENSE_VECTOR_NAME = ""
+
+# 토크나이저/가중치 규칙이 바뀌면 올려서 증분 동기화가 희소 벡터를 다시 계산하도록 함
+SPARSE_ENCODER_VERSION = "bm25-ko-v1"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_AVG_DOC_LEN = float(os.getenv("BM25_AVG_DOC_LEN", 256))
+
+# 각 검색 경로(dense / sparse)에서 RRF 전에 가져올 후보 수 = max(limit × 배수, 최소값)
+HYBRID_PREFETCH_FACTOR = int(os.getenv("HYBRID_PREFETCH_FACTOR", 4))
+HYBRID_PREFETCH_MIN = int(os.getenv("HYBRID_PREFETCH_MIN", 20))
+
+# 길이가 긴 것부터 비교하여 가장 긴 조사/어미를 뗌
+KOREAN_SUFFIXES = sorted(
+    [
+        "은", "는", "이", "가", "을", "를", "의", "에", "에서", "에게", "께서", "으로", "로",
+        "와", "과", "도", "만", "부터", "까지", "보다", "이나", "나", "이며", "며", "이다",
+        "입니다", "한다", "하는", "하여", "해야", "된다", "되는", "에는", "에서는", "으로는",
+        "로는", "과의", "와의", "에의", "들", "들은", "들이", "들을",
+    ],
+    key=len,
+    reverse=True,
+)
+
+_SUFFIX_SET = frozenset(KOREAN_SUFFIXES)
+
+ENGLISH_STOPWORDS = frozenset(
+    "a an the of and or to in on at by for with from as is are was were be been it its this that "
+    "these those which who whom shall may must not no any such other than into under upon".split()
+)
+
+_ARTICLE_RE = re.compile(r"제\s*(\d+)\s*조|\barticle\s*(\d+)|\bart\.?\s*(\d+)")
+_TOKEN_RE = re.compile(r"[0-9a-z_]+|[가-힣]+")
+
+
+def _article_token(match: re.Match) -> str:
+    number = next(group for group in match.groups() if group)
+    return f" article_{int(number)} "
+
+
+def _strip_suffix(word: str) -> str:
+    for suffix in KOREAN_SUFFIXES:
+        # 어간이 2글자 이상 남을 때만 뗌 ("국가" → "국" 방지)
+        if len(word) - len(suffix) >= 2 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """한국어/영어 혼합 텍스트를 BM25용 토큰으로 분해"""
+    text = unicodedata.normalize("NFC", text or "").lower()
+    text = _ARTICLE_RE.sub(_article_token, text)
+
+    tokens = []
+    for word in _TOKEN_RE.findall(text):
+        if "가" <= word[0] <= "힣":
+            if word in _SUFFIX_SET:  # "제25조의" → article_25 뒤에 남은 조사
+                continue
+            stem = _strip_suffix(word)
+            tokens.append(stem)
+            if len(stem) > 2:
+                tokens.extend(stem[i:i + 2] for i in range(len(stem) - 1))
+        elif word not in ENGLISH_STOPWORDS:
+            tokens.append(word)
+    return tokens
+
+
+def token_id(token: str) -> int:
+    """토큰 → 희소 벡터 인덱스 (uint32, 프로세스/실행 간 고정)"""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+class BM25SparseEncoder:
+    """문서/질의 텍스트를 BM25 희소 벡터로 변환 (IDF는 Qdrant Modifier.IDF가 적용)"""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B, avg_doc_len: float = BM25_AVG_DOC_LEN):
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_len = avg_doc_len
+
+    def encode_document(self, text: str) -> SparseVector:
+        tokens = tokenize(text)
+        counts = Counter(token_id(token) for token in tokens)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_doc_len)
+        indices = sorted(counts)
+        values = [counts[i] * (self.k1 + 1) / (counts[i] + norm) for i in indices]
+        return SparseVector(indices=indices, values=values)
+
+    def encode_query(self, text: str) -> SparseVector:
+        indices = sorted({token_id(token) for token in tokenize(text)})
+        return SparseVector(indices=indices, values=[1.0] * len(indices))
+
+
+def sparse_vectors_config() -> dict:
+    """create_collection(sparse_vectors_config=...)에 넘길 설정"""
+    return {SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)}
+
+
+def collection_has_sparse(info) -> bool:
+    """get_collection() 결과에 bm25 희소 벡터 설정이 있는지"""
+    params = getattr(getattr(info, "config", None), "params", None)
+    sparse = getattr(params, "sparse_vectors", None) or {}
+    return SPARSE_VECTOR_NAME in sparse
+
+
+class HybridVectors:
+    """
+    로더의 make_point에서 쓰는 벡터 생성기
+
+    bind()로 컬렉션을 확인하여 bm25 희소 벡터가 설정된 컬렉션이면 {"": dense, "bm25": sparse},
+    (희소 벡터 없이 만든 기존 컬렉션이면) dense 벡터만 반환합니다.
+    """
+
+    def __init__(self, encoder: Optional[BM25SparseEncoder] = None):
+        self.encoder = encoder or BM25SparseEncoder()
+        self.enabled = False
+
+    def bind(self, client, collection_name: str) -> bool:
+        self.enabled = collection_has_sparse(client.get_collection(collection_name))
+        if not self.enabled:
+            print(f"  [SPARSE] '{collection_name}'에 '{SPARSE_VECTOR_NAME}' 희소 벡터 설정이 없어 dense 벡터만 저장합니다.")
+        return self.enabled
+
+    @property
+    def hash_suffix(self) -> str:
+        """증분 동기화 extra_hash에 붙일 값 (희소 벡터 추가/규칙 변경 시 재업서트)"""
+        return f"+{SPARSE_ENCODER_VERSION}" if self.enabled else ""
+
+    def __call__(self, dense, text: str):
+        if not self.enabled:
+            return dense
+        return {DENSE_VECTOR_NAME: dense, SPARSE_VECTOR_NAME: self.encoder.encode_document(text)}
+
+
+def hybrid_query_kwargs(
+    dense,
+    text: str,
+    limit: int,
+    query_filter=None,
+    search_params=None,
+    encoder: Optional[BM25SparseEncoder] = None,
+) -> dict:
+    """
+    query_points(**kwargs)에 넘길 하이브리드 검색 인자 (한 번의 요청으로 dense/sparse prefetch + RRF)
+
+    질의에서 토큰이 하나도 나오지 않으면 dense 검색만 수행합니다.
+    """
+    sparse = (encoder or BM25SparseEncoder()).encode_query(text)
+    if not sparse.indices:
+        return {"query": dense, "limit": limit, "query_filter": query_filter, "search_params": search_params}
+
+    prefetch_limit = max(limit * HYBRID_PREFETCH_FACTOR, HYBRID_PREFETCH_MIN)
+    return {
+        "prefetch": [
+            Prefetch(query=dense, limit=prefetch_limit, filter=query_filter, params=search_params),
+            Prefetch(query=sparse, using=SPARSE_VECTOR_NAME, limit=prefetch_limit, filter=query_filter),
+        ],
+        "query": FusionQuery(fusion=Fusion.RRF),
+        "limit": limit,
+        "query_filter": query_filter,
+    }
+
+
+def to_query_request(search_kwargs: dict, with_payload=True) -> QueryRequest:
+    """query_points용 검색 인자를 query_batch_points의 QueryRequest로 변환"""
+    kwargs = dict(search_kwargs)
+    return QueryRequest(
+        filter=kwargs.pop("query_filter", None),
+        params=kwargs.pop("search_params", None),
+        with_payload=with_payload,
+        **kwargs,
+    )
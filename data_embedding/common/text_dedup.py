@@ -0,0 +1,179 @@
+"""
+임베딩 전 청크 텍스트 중복 제거 (완전 중복 + MinHash 유사 중복)
+
+반복이 많은 QA 데이터는 같은/거의 같은 청크가 여러 번 나옵니다. 적재 전에 한 번 훑어서
+- 완전 중복 (정규화 텍스트가 같음): 첫 레코드 하나로 합침 → 포인트 수(인덱스 크기)와 임베딩 입력 감소
+  (합쳐진 레코드의 메타데이터는 merge 콜백으로 남은 레코드에 기록)
+- 유사 중복 (문자 n-gram MinHash의 Jaccard 추정치 ≥ near_threshold): 포인트는 각자 유지하고
+  벡터만 대표 텍스트의 것을 재사용 → 임베딩 입력 감소 (payload 텍스트는 원래 청크 그대로)
+
+MinHash 후보는 LSH(band) 버킷으로만 찾으므로 청크 수에 선형입니다.
+정규화는 임베딩 캐시 키와 같은 normalize_text(NFC + 공백 정리)를 사용합니다.
+"""
+
+import zlib
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .collection_provisioning import memory_footprint
+from .embedding_cache import normalize_text
+
+
+DEFAULT_NEAR_THRESHOLD = 0.9
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 16  # band당 8행 → Jaccard 약 0.7 이상부터 후보가 됨
+DEFAULT_SHINGLE_SIZE = 5
+
+# 2^32보다 큰 소수 (a·x + b가 uint64 안에서 넘치지 않도록 a, b, x < 2^32)
+_PRIME = 4294967311
+
+
+def shingle_hashes(text: str, size: int = DEFAULT_SHINGLE_SIZE) -> np.ndarray:
+    """정규화 텍스트의 문자 size-gram crc32 해시 (중복 제거된 uint64 배열)"""
+    text = normalize_text(text)
+    grams = {text[i:i + size] for i in range(max(len(text) - size + 1, 1))}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHashLSH:
+    """MinHash 시그니처 + band LSH 인덱스 (대표 텍스트만 등록)"""
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, bands: int = DEFAULT_BANDS, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm({num_perm})은 bands({bands})의 배수여야 합니다.")
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, signature: np.ndarray) -> int:
+        """시그니처를 등록하고 번호를 반환"""
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in self._band_keys(signature):
+            self._buckets[band].setdefault(key, []).append(index)
+        return index
+
+    def best_match(self, signature: np.ndarray, threshold: float) -> Optional[int]:
+        """Jaccard 추정치가 threshold 이상인 등록 시그니처 중 가장 비슷한 것의 번호 (없으면 None)"""
+        candidates = set()
+        for band, key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+        best, best_score = None, threshold
+        for index in sorted(candidates):
+            score = float(np.mean(self._signatures[index] == signature))
+            if score >= best_score:
+                best, best_score = index, score
+        return best
+
+
+@dataclass
+class DedupResult:
+    """dedup_records 결과"""
+    records: List[dict]                                    # 완전 중복을 합친 레코드 (입력 순서)
+    embed_as: Dict[str, str] = field(default_factory=dict)  # 유사 중복 텍스트 → 벡터를 재사용할 대표 텍스트
+    input_texts: List[str] = field(default_factory=list)    # 중복 제거 전 전체 텍스트 (리포트용)
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+
+    def wrap_embed(self, embed_texts: Callable[[List[str]], list]) -> Callable[[List[str]], list]:
+        """유사 중복 텍스트는 대표 텍스트로 바꿔, 서로 다른 텍스트만 한 번씩 임베딩하고 벡터를 나눠 주는 함수"""
+        def embed(texts: List[str]) -> list:
+            targets = [self.embed_as.get(text, text) for text in texts]
+            unique = list(dict.fromkeys(targets))
+            vectors = dict(zip(unique, embed_texts(unique))) if unique else {}
+            return [vectors[target] for target in targets]
+        return embed
+
+    def report(self, count_tokens: Optional[Callable[[str], int]] = None, vector_size: Optional[int] = None) -> dict:
+        """
+        중복 제거로 줄어든 임베딩 입력/포인트 수
+
+        Args:
+            count_tokens: 텍스트 → 토큰 수 (주면 임베딩 토큰 절감량 포함)
+            vector_size: 벡터 차원 (주면 줄어든 포인트의 예상 인덱스 크기 포함)
+        """
+        embedded = list(dict.fromkeys(self.embed_as.get(r["text"], r["text"]) for r in self.records))
+        report = {
+            "input_chunks": len(self.input_texts),
+            "points": len(self.records),
+            "exact_duplicates_merged": self.exact_duplicates,
+            "near_duplicates_shared_vector": self.near_duplicates,
+            "embedded_texts": len(embedded),
+            "embed_inputs_saved": len(self.input_texts) - len(embedded),
+        }
+        if count_tokens is not None:
+            total = sum(count_tokens(text) for text in self.input_texts)
+            kept = sum(count_tokens(text) for text in embedded)
+            report["embed_tokens"] = kept
+            report["embed_tokens_saved"] = total - kept
+            report["embed_tokens_saved_ratio"] = round((total - kept) / total, 4) if total else 0.0
+        if vector_size is not None:
+            report["index_saved"] = memory_footprint(self.exact_duplicates, vector_size)
+        return report
+
+
+def dedup_records(
+    records: Iterable[dict],
+    near_threshold: Optional[float] = DEFAULT_NEAR_THRESHOLD,
+    merge: Optional[Callable[[dict, dict], None]] = None,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    lsh: Optional[MinHashLSH] = None,
+) -> DedupResult:
+    """
+    청크 레코드({"text": ..., ...})의 완전/유사 중복 제거
+
+    Args:
+        near_threshold: 유사 중복으로 볼 Jaccard 추정치 (None이면 완전 중복만 제거)
+        merge: (남는 레코드, 합쳐지는 중복 레코드) 콜백 - 중복 레코드의 메타데이터를 남는 레코드에 기록
+        shingle_size: MinHash 문자 n-gram 크기
+        lsh: MinHash LSH 인덱스 (기본: MinHashLSH())
+
+    Returns:
+        DedupResult (records는 입력 순서를 유지하며, 유사 중복 레코드는 "embed_as"에 대표 텍스트를 가짐)
+    """
+    lsh = lsh or (MinHashLSH() if near_threshold is not None else None)
+    result = DedupResult(records=[])
+    kept_by_key: Dict[str, dict] = {}
+    canonical_texts: List[str] = []
+
+    for record in records:
+        text = record["text"]
+        result.input_texts.append(text)
+
+        key = normalize_text(text)
+        kept = kept_by_key.get(key)
+        if kept is not None:
+            if merge is not None:
+                merge(kept, record)
+            result.exact_duplicates += 1
+            continue
+        kept_by_key[key] = record
+        result.records.append(record)
+
+        if lsh is None:
+            continue
+        signature = lsh.signature(shingle_hashes(text, shingle_size))
+        match = lsh.best_match(signature, near_threshold)
+        if match is None:
+            # 대표 텍스트만 인덱스에 등록 (유사 중복끼리 연쇄로 멀어지지 않도록)
+            lsh.add(signature)
+            canonical_texts.append(text)
+        else:
+            # 벡터를 재사용할 대표 텍스트 (내용 해시에 포함되어 대표가 바뀌면 다시 임베딩)
+            record["embed_as"] = canonical_texts[match]
+            result.embed_as[text] = canonical_texts[match]
+            result.near_duplicates += 1
+    return result
@@ -0,0 +1,74 @@
+"""
+토큰 span 청커
+
+tiktoken 토큰 경계를 원문 문자(char) offset으로 선형 시간에 변환하고,
+토큰 수 기준(overlap 포함)으로 청크를 잘라 정확한 start/end span과 함께 반환합니다.
+
+- 토큰별 바이트 길이(decode_tokens_bytes)의 누적합으로 토큰 경계의 바이트 offset을 계산
+- 원문 UTF-8 바이트 중 문자 시작 바이트의 누적합으로 바이트 offset → 문자 offset 변환
+- 한글처럼 여러 바이트 문자가 토큰 경계에서 나뉘면 청크 시작은 내림, 끝은 올림하여
+  잘린 문자 없이 해당 토큰들을 모두 포함하는 span을 만듦
+"""
+
+from typing import Iterator, Tuple
+
+import numpy as np
+
+
+def token_char_bounds(text: str, encoding) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    토큰 경계(0..n)별 문자 offset을 반환
+
+    Returns:
+        (floor_chars, ceil_chars): 길이 n+1 배열.
+        경계가 문자 중간에 걸리면 floor는 그 문자의 시작, ceil은 그 다음 문자의 시작.
+    """
+    data = text.encode("utf-8")
+    tokens = encoding.encode_ordinary(text)
+
+    byte_bounds = np.zeros(len(tokens) + 1, dtype=np.int64)
+    if tokens:
+        token_lengths = np.fromiter(
+            (len(b) for b in encoding.decode_tokens_bytes(tokens)), dtype=np.int64, count=len(tokens)
+        )
+        np.cumsum(token_lengths, out=byte_bounds[1:])
+    if byte_bounds[-1] != len(data):
+        raise ValueError("토큰 바이트 길이의 합이 원문 바이트 길이와 다릅니다.")
+
+    # starts_before[b] = data[:b] 안에 있는 문자 시작 바이트 수 (= 바이트 b 이전에 시작한 문자 수)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    is_char_start = np.append((raw & 0xC0) != 0x80, True)  # 마지막(len) 위치는 경계로 취급
+    starts_before = np.zeros(len(data) + 1, dtype=np.int64)
+    np.cumsum(is_char_start[:-1], out=starts_before[1:])
+
+    ceil_chars = starts_before[byte_bounds]
+    floor_chars = ceil_chars - (~is_char_start[byte_bounds]).astype(np.int64)
+    return floor_chars, ceil_chars
+
+
+def iter_token_spans(text: str, encoding, max_tokens: int, overlap: int = 0) -> Iterator[dict]:
+    """
+    text를 max_tokens 토큰 단위(overlap 토큰 겹침)로 잘라 청크를 하나씩 반환
+
+    각 청크: {"text", "start", "end", "token_start", "token_end"}
+    (text == 원문[start:end])
+    """
+    if overlap >= max_tokens:
+        raise ValueError(f"overlap({overlap})은 max_tokens({max_tokens})보다 작아야 합니다.")
+
+    floor_chars, ceil_chars = token_char_bounds(text, encoding)
+    n_tokens = len(floor_chars) - 1
+    step = max_tokens - overlap
+
+    i = 0
+    while i < n_tokens:
+        j = min(i + max_tokens, n_tokens)
+        start, end = int(floor_chars[i]), int(ceil_chars[j])
+        yield {
+            "text": text[start:end],
+            "start": start,
+            "end": end,
+            "token_start": i,
+            "token_end": j,
+        }
+        i += step
@@ -1,125 +1,95 @@
 import os
-import uuid
-import time
+import sys
 import tiktoken
+from pathlib import Path
 from dotenv import load_dotenv
-from openai import OpenAI, APIError, RateLimitError
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance, Filter, FieldCondition, MatchValue
+from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.embedding_cache import get_default_cache
+from common.backends import get_embedder, get_qdrant_client
+from common.qdrant_uploader import QdrantUploader
+from common.pipeline import run_ingest_pipeline
+from common.markdown_chunker import MarkdownHeadingChunker
+from common.index_sync import make_point_id, sync_data_source
+from common.collection_provisioning import collection_create_kwargs, create_payload_indexes
+from common.matryoshka import embedding_dimensions
+from common.sparse_vectors import HybridVectors
+from common.payload_schema import make_payload
+from common.metrics import get_metrics, write_run_report
 # ================================================================
 load_dotenv()
 
 EMBED_MODEL = 'text-embedding-3-large'
-MAX_TOKENS = 2048     # 청크 하나당 최대 토큰 수
-OVERLAP = 100         # 청크 간 토큰 겹침
-BATCH_SIZE = 16
+EMBED_DIM = embedding_dimensions(EMBED_MODEL)  # 기본 3072, EMBED_DIMENSIONS로 축소 (Matryoshka)
+MAX_TOKENS = 512      # 청크 하나당 최대 토큰 수 (섹션이 더 길면 문단 경계로 나눔)
+MIN_TOKENS = 64       # 이보다 짧은 섹션은 같은 H1 안의 다음 섹션과 합침
+OVERLAP = 50          # 문단 하나가 MAX_TOKENS를 넘어 토큰 단위로 자를 때의 겹침
 
 # 단일 파일 경로 사용
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CHUNKS_FILE = os.path.join(BASE_DIR, "used_data", "2025무역사기대응매뉴얼.md")
 COLLECTION_NAME = "trade_collection"
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-qdrant = QdrantClient(
-    url=os.getenv("QDRANT_URL"),
-    api_key=os.getenv("QDRANT_API_KEY"),
-    timeout=300  # 5분 타임아웃 (대용량 업로드 대비)
-)
+# VECTOR_BACKEND=cloud(기본) | local | memory | numpy
+qdrant = get_qdrant_client(timeout=300)  # 5분 타임아웃 (대용량 업로드 대비)
 
 encoding = tiktoken.encoding_for_model(EMBED_MODEL)
 
+# 변경되지 않은 청크는 디스크 캐시에서 재사용 (임베딩 API 호출 없음)
+embedding_cache = get_default_cache()
+# 토큰 예산 기반 동시 임베딩 (RPM/TPM, retry-after 반영), EMBED_BACKEND=local이면 로컬 해시 임베딩
+embed_executor = get_embedder(EMBED_MODEL, dim=EMBED_DIM)
+# dense 벡터 + BM25 희소 벡터 (컬렉션에 bm25 설정이 있을 때, 조문 번호/코드 등 어휘 일치 검색용)
+point_vectors = HybridVectors()
+
 
-def chunk_text(text, max_tokens=MAX_TOKENS, overlap=OVERLAP):
+def chunk_text(text, max_tokens=MAX_TOKENS, min_tokens=MIN_TOKENS, overlap=OVERLAP):
     """
-    긴 텍스트를 토큰 기준으로 잘라서 리스트로 반환
+    매뉴얼을 H1/H2/H3 제목 경계로 잘라서 하나씩 반환 (제너레이터)
     - max_tokens: 청크 하나당 최대 토큰 수
-    - overlap: 이전 청크와 겹치게 할 토큰 수
+    - min_tokens: 이보다 짧은 섹션은 다음 섹션과 합침
+    - overlap: 긴 문단을 토큰 단위로 자를 때 겹치게 할 토큰 수
+    각 원소는 {text, start, end, chunk_id, breadcrumb, ...} (start/end는 원문 char offset,
+    text는 "[상위 제목 경로]" 한 줄 + 원문 구간, chunk_id는 정답 세트 형식 "chunks_by_h1/chunk_00N.md")
     """
-    tokens = encoding.encode(text)
-    chunks = []
-    start = 0
-
-    while start < len(tokens):
-        end = start + max_tokens
-        chunk = encoding.decode(tokens[start:end])
-        chunks.append(chunk)
-        # 다음 청크 시작 위치 = 현재 시작 위치 + (max_tokens - overlap)
-        start += max_tokens - overlap
-
-    return chunks
+    chunker = MarkdownHeadingChunker(encoding, max_tokens, min_tokens, overlap)
+    yield from chunker.chunk(text)
 
 
 def load_chunks_from_file(file_path: str = CHUNKS_FILE):
     """
     단일 .md(또는 .txt) 파일을 읽어서
-    토큰 기준으로 청킹한 결과를 리스트로 반환
-    각 원소는 {id, text, file_name, chunk_index, chunk_id} 딕셔너리
+    제목 구조(H1/H2/H3) 기준으로 청킹한 결과를 하나씩 반환 (제너레이터)
+    각 원소는 {id, text, file_name, chunk_index, chunk_id, breadcrumb, start, end} 딕셔너리
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"파일을 찾을 수 없습니다: {file_path}")
 
-    records = []
-
     # 파일명만 분리 (메타데이터용)
     filename = os.path.basename(file_path)
 
-    # 전체 텍스트 로드
-    with open(file_path, "r", encoding="utf-8") as f:
-        full_text = f.read().strip()
-
-    # 토큰 기준 청킹
-    token_chunks = chunk_text(full_text)
-
-    # 이 문서 전체를 대표하는 chunk_id
-    # (eval jsonl의 gold_chunk_ids와 맞추려면 여기 문자열을 그 포맷에 맞게 설정)
-    doc_chunk_id = filename   # 예: "2025무역사기대응매뉴얼.md"
-
-    for idx, chunk in enumerate(token_chunks):
-        records.append(
-            {
-                "id": str(uuid.uuid4()),   # Qdrant point id
-                "text": chunk,             # 실제 청크 텍스트
-                "file_name": filename,     # 원본 파일명
-                "chunk_index": idx,        # 같은 파일 내 몇 번째 청크인지
-                "chunk_id": doc_chunk_id,  # 문서 단위 ID
-            }
-        )
-
-    print(f"총 청크 개수: {len(records)}")
-    return records
-
-def embed_batch(text_list, max_retries: int = 5):
-    """텍스트 리스트 한 배치를 임베딩. RateLimit 발생 시 지수 백오프로 재시도"""
-    for attempt in range(max_retries):
-        try:
-            resp = client.embeddings.create(
-                model=EMBED_MODEL,
-                input=text_list,
-            )
-            return [item.embedding for item in resp.data]
-        except RateLimitError as e:
-            wait = 2 ** attempt
-            print(f"Rate limit 발생, {wait}초 후 재시도... ({e})")
-            time.sleep(wait)
-        except APIError as e:
-            print("OpenAI APIError 발생:", e)
-            raise
-    raise RuntimeError("임베딩 재시도 최대 횟수 초과")
-
-def embed_all(records):
-    """records 리스트 전체에 대해 배치 임베딩을 수행하고 벡터 리스트 반환"""
-    texts = [r["text"] for r in records]
-    all_vectors = []
-
-    for start in range(0, len(texts), BATCH_SIZE):
-        batch = texts[start : start + BATCH_SIZE]
-        print(f"임베딩 배치: {start} ~ {start + len(batch) - 1}")
-        vectors = embed_batch(batch)
-        all_vectors.extend(vectors)
-
-    print(f"임베딩 완료: {len(all_vectors)}개")
-    return all_vectors
+    # 전체 텍스트 로드 (청크 제너레이터 안이지만 load 단계로 따로 기록)
+    with get_metrics().span("load"):
+        with open(file_path, "r", encoding="utf-8") as f:
+            full_text = f.read().strip()
+
+    # 제목 구조 기준 청킹 (chunk_id = 소속 H1 섹션, eval jsonl의 gold_chunk_ids와 같은 형식)
+    idx = -1
+    for idx, chunk in enumerate(chunk_text(full_text)):
+        yield {
+            # Qdrant point id: (data_source, 파일, 청크 span)의 UUIDv5 → 재실행해도 같은 ID
+            "id": make_point_id('fraud', filename, chunk["start"], chunk["end"]),
+            "text": chunk["text"],     # 실제 청크 텍스트
+            "file_name": filename,     # 원본 파일명
+            "chunk_index": idx,        # 같은 파일 내 몇 번째 청크인지
+            "chunk_id": chunk["chunk_id"],      # H1 섹션 단위 ID (예: "chunks_by_h1/chunk_002.md")
+            "breadcrumb": chunk["breadcrumb"],  # 상위 제목 경로 (예: "II. 무역사기 이해하기 > 1. ...")
+            "start": chunk["start"],   # 원문 내 청크 시작 위치 (char)
+            "end": chunk["end"],       # 원문 내 청크 끝 위치 (char)
+        }
+
+    print(f"총 청크 개수: {idx + 1}")
 
 # ================== 4. Qdrant 컬렉션 생성 ==================
 def ensure_payload_index():
@@ -193,74 +163,75 @@ def setup_qdrant_collection(vector_dim: int):
         print(f"컬렉션 없음 → 새로 생성: {COLLECTION_NAME}")
 
     # 새 컬렉션 생성
+    # 양자화/on_disk/HNSW 설정은 공용 설정(COLLECTION_QUANTIZATION 등 환경 변수)을 따름
     qdrant.create_collection(
         collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(
-            size=vector_dim,
-            distance=Distance.COSINE,
-        ),
+        **collection_create_kwargs(vector_dim),
     )
+    # data_source / country / category 필터 검색용 인덱스
+    create_payload_indexes(qdrant, COLLECTION_NAME)
+
 
+def make_point(rec, vec):
+    return PointStruct(
+        id=rec["id"],
+        vector=point_vectors(vec, rec["text"]),
+        payload=make_payload(
+            'fraud', rec["text"], source=rec["file_name"], chunk_id=rec["chunk_id"], section=rec["breadcrumb"],
+        ),
+    )
 
-def upload_to_qdrant(records, vectors):
-    """records와 vectors를 Qdrant에 배치 업서트"""
-    assert len(records) == len(vectors), "records와 vectors 길이가 다릅니다."
 
-    points = []
+def embed_texts(texts):
+    """캐시 미스분만 동시 임베딩"""
+    return embedding_cache.embed(embed_executor.cache_name, texts, embed_executor.embed)
 
-    for rec, vec in zip(records, vectors):
-        point = PointStruct(
-            id=rec["id"],
-            vector=vec,
-            payload={
-                "text": rec["text"],
-                "chunk_id": rec["chunk_id"],
-                "file_name": rec["file_name"],
-                "chunk_index": rec["chunk_index"],
-                "data_source": 'fraud'
-            },
-        )
-        points.append(point)
 
-    for start in range(0, len(points), BATCH_SIZE):
-        batch_points = points[start : start + BATCH_SIZE]
-        print(f"Qdrant 업서트: {start} ~ {start + len(batch_points) - 1}")
-        qdrant.upsert(
-            collection_name=COLLECTION_NAME,
-            points=batch_points,
-        )
+def upload_to_qdrant(records):
+    """
+    청크 레코드 스트림을 load → embed → upsert 파이프라인으로 업로드
+    (단계 사이 큐 크기가 제한되어 있어 전체 청크/벡터를 메모리에 올리지 않음)
+    """
+    with QdrantUploader(qdrant, COLLECTION_NAME) as uploader:
+        total = run_ingest_pipeline(records, embed_texts, make_point, uploader)
 
-    print("Qdrant 업서트 완료!")
+    print(f"임베딩 캐시: {embedding_cache.stats()}, API: {embed_executor.stats()}")
+    print(f"Qdrant 업서트 완료! {total}개 청크, {uploader.stats()}")
+    return total
 
 
 # ================== 6. 전체 실행 ==================
-def main(update_existing: bool = False):
+def main(update_existing: bool = False, incremental: bool = True):
     """
     메인 실행 함수
 
     Args:
-        update_existing: True면 기존 'fraud' 데이터를 삭제하고 새로 업로드 (업데이트 모드)
-                        False면 기존 데이터에 추가 (중복 가능)
+        update_existing: True면 기존 'fraud' 데이터를 새 내용으로 갱신 (업데이트 모드)
+                        False면 기존 데이터에 추가 (ID가 결정적이므로 같은 청크는 덮어씀)
+        incremental: 업데이트 모드에서 True면 바뀐 청크만 임베딩/업서트하고 사라진 청크만 삭제,
+                     False면 기존 'fraud' 데이터를 모두 삭제하고 새로 업로드
     """
-    # 1) 파일에서 텍스트 로드 및 토큰 청킹
-    records = load_chunks_from_file()
-    if not records:
-        print("청크가 없습니다. 파일을 확인하세요.")
-        return
-
-    # 2) 임베딩 생성
-    vectors = embed_all(records)
-
-    # 3) Qdrant 컬렉션 생성 (임베딩 차원에 맞게)
-    vector_dim = len(vectors[0])
-    setup_qdrant_collection(vector_dim)
-
-    # 4) 업데이트 모드: 기존 fraud 데이터 삭제
-    if update_existing:
-        delete_by_data_source('fraud')
+    # 1) Qdrant 컬렉션 생성 (임베딩 차원에 맞게)
+    setup_qdrant_collection(EMBED_DIM)
+    point_vectors.bind(qdrant, COLLECTION_NAME)
+
+    if update_existing and incremental:
+        # 2) 증분 동기화: 파일 로드/청킹 → (변경분만) 임베딩 → 업로드, 사라진 청크 삭제
+        sync_data_source(
+            qdrant, COLLECTION_NAME, 'fraud',
+            load_chunks_from_file(), embed_texts, make_point,
+            extra_hash=embed_executor.cache_name + point_vectors.hash_suffix,
+        )
+    else:
+        # 2) 업데이트 모드: 기존 fraud 데이터 삭제
+        if update_existing:
+            delete_by_data_source('fraud')
 
-    # 5) Qdrant에 포인트 업로드
-    upload_to_qdrant(records, vectors)
+        # 3) 파일 로드/토큰 청킹 → 임베딩 → Qdrant 업로드 (스트리밍 파이프라인)
+        total = upload_to_qdrant(load_chunks_from_file())
+        if not total:
+            print("청크가 없습니다. 파일을 확인하세요.")
+            return
 
     print("✓ 모든 작업 완료")
 
@@ -268,8 +239,16 @@ def main(update_existing: bool = False):
     collection_info = qdrant.get_collection(COLLECTION_NAME)
     print(f"✓ 컬렉션 '{COLLECTION_NAME}' 총 포인트 수: {collection_info.points_count}")
 
+    # 단계별 시간/토큰/업로드 바이트/재시도 리포트 (JSON + Prometheus text)
+    write_run_report("fraud", {
+        "collection": COLLECTION_NAME,
+        "points_count": collection_info.points_count,
+        "embed_model": embed_executor.cache_name,
+        "embedding_cache": embedding_cache.stats(),
+    })
+
 
 if __name__ == "__main__":
-    # update_existing=True: 기존 fraud 데이터를 삭제하고 새로 인덱싱 (다른 소스는 유지)
-    # update_existing=False: 기존 데이터에 추가 (중복 가능)
-    main(update_existing=True)
\ No newline at end of file
+    # update_existing=True: 바뀐 fraud 청크만 다시 인덱싱 (다른 소스는 유지)
+    # update_existing=False: 기존 데이터에 추가
+    main(update_existing=True)
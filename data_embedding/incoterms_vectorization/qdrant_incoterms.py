@@ -1,30 +1,47 @@
 import numpy as np
 import os
+import sys
+from pathlib import Path
 
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
-from qdrant_client.http.exceptions import UnexpectedResponse
+from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue
 
-from openai import OpenAI
 from dotenv import load_dotenv
 
 import tiktoken
 from typing import List
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.embedding_cache import get_default_cache
+from common.backends import get_embedder, get_qdrant_client
+from common.qdrant_uploader import QdrantUploader
+from common.pipeline import run_ingest_pipeline
+from common.token_chunker import iter_token_spans
+from common.index_sync import make_point_id, sync_data_source
+from common.collection_provisioning import collection_create_kwargs, create_payload_indexes
+from common.matryoshka import embedding_dimensions
+from common.sparse_vectors import HybridVectors
+from common.payload_schema import make_payload
+from common.metrics import get_metrics, write_run_report
+
 # =========================
 # 0. 전역 설정 (OpenAI, Tokenizer)
 # =========================
 
 load_dotenv()
 
-client_oa = OpenAI()
 EMBED_MODEL = "text-embedding-3-large"
-EMBED_DIM = 3072  # text-embedding-3-large의 출력 차원
+EMBED_DIM = embedding_dimensions(EMBED_MODEL)  # 기본 3072, EMBED_DIMENSIONS로 축소 (Matryoshka)
 
 tokenizer = tiktoken.get_encoding("o200k_base")
 
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+# 변경되지 않은 청크는 디스크 캐시에서 재사용 (임베딩 API 호출 없음)
+embedding_cache = get_default_cache()
+# 토큰 수 기준 배치 + 동시 요청 (한 번에 전체를 보내지 않음)
+# (EMBED_BACKEND=local이면 네트워크 없는 로컬 해시 임베딩)
+embed_executor = get_embedder(EMBED_MODEL, dim=EMBED_DIM)
+# dense 벡터 + BM25 희소 벡터 (컬렉션에 bm25 설정이 있을 때, 조문 번호/코드 등 어휘 일치 검색용)
+point_vectors = HybridVectors()
 
 # =========================
 # 1. 데이터 로드 함수
@@ -37,49 +54,39 @@ def load_document(path: str) -> str:
     return text
 
 
+def load_chunks(path: str, max_tokens: int, overlap_ratio: float = 0.15):
+    """
+    문서를 읽어 토큰 기준으로 청킹한 결과를 하나씩 반환 (제너레이터)
+    각 원소는 {id, chunk_index, text, start, end, document} 딕셔너리
+    """
+    # 전체 텍스트 로드 (청크 제너레이터 안이지만 load 단계로 따로 기록)
+    with get_metrics().span("load"):
+        text = load_document(path)
+    yield from chunk_by_tokens(text, max_tokens, overlap_ratio, document=os.path.basename(path))
+
+
 # =========================
 # 2. 토큰 기반 청킹
 # =========================
 
-def chunk_by_tokens(text: str, max_tokens: int, overlap_ratio: float = 0.15):
-    tokens = tokenizer.encode(text)
-    n = len(tokens)
-
-    # 1) 토큰 → 원문 char offset 계산
-    offsets = [0]
-    cur_text = ""
-    for tok in tokens:
-        cur_text += tokenizer.decode([tok])
-        offsets.append(len(cur_text))
-
-    # 2) Overlap 계산
+def chunk_by_tokens(text: str, max_tokens: int, overlap_ratio: float = 0.15, document: str = ""):
+    # 토큰 경계 → 원문 char offset을 선형 시간에 계산하는 span 청커 사용
+    # (멀티바이트 문자가 토큰 경계에서 나뉘어도 start/end가 정확함)
+    # 청크를 모아 두지 않고 하나씩 반환 (임베딩/업로드 파이프라인이 바로 소비)
     overlap = int(max_tokens * overlap_ratio)
-    step = max_tokens - overlap
 
-    chunks = []
-    chunk_idx = 0
-    i = 0
-
-    while i < n:
-        j = min(i + max_tokens, n)
-
-        start_char = offsets[i]
-        end_char = offsets[j]
-        chunk_text = text[start_char:end_char]
-
-        chunks.append({
+    chunk_idx = -1
+    for chunk_idx, span in enumerate(iter_token_spans(text, tokenizer, max_tokens, overlap)):
+        yield {
             "id": f"tok_{max_tokens}_{chunk_idx}",
-            "text": chunk_text,
-            "start": start_char,
-            "end": end_char,
-        })
-
-        # 3) 다음 청크 시작 위치 (Overlapping)
-        i += step
-        chunk_idx += 1
+            "chunk_index": chunk_idx,
+            "text": span["text"],
+            "start": span["start"],
+            "end": span["end"],
+            "document": document,  # 포인트 ID 생성용 원본 문서 이름
+        }
 
-    print(f"토큰 청킹 완료: max_tokens={max_tokens}, overlap={overlap}, chunks={len(chunks)}\n")
-    return chunks
+    print(f"토큰 청킹 완료: max_tokens={max_tokens}, overlap={overlap}, chunks={chunk_idx + 1}\n")
 
 
 # =========================
@@ -90,11 +97,7 @@ def get_embeddings(texts: List[str]) -> np.ndarray:
     if isinstance(texts, str):
         texts = [texts]
 
-    resp = client_oa.embeddings.create(
-        model=EMBED_MODEL,
-        input=texts,
-    )
-    vectors = [item.embedding for item in resp.data]
+    vectors = embedding_cache.embed(embed_executor.cache_name, texts, embed_executor.embed)
     return np.array(vectors, dtype=np.float32)
 
 
@@ -175,106 +178,114 @@ def create_collection_for_chunks(client: QdrantClient, collection_name: str, vec
         print(f"컬렉션 없음 → 새로 생성: {collection_name}")
 
     # 컬렉션 생성
+    # 양자화/on_disk/HNSW 설정은 공용 설정(COLLECTION_QUANTIZATION 등 환경 변수)을 따름
     client.create_collection(
         collection_name=collection_name,
-        vectors_config=VectorParams(
-            size=vector_size,
-            distance=Distance.COSINE,
-        ),
+        **collection_create_kwargs(vector_size),
     )
+    # data_source / country / category 필터 검색용 인덱스
+    create_payload_indexes(client, collection_name)
     print(f"컬렉션 생성 완료: {collection_name}")
 
 
-def upload_chunks_to_qdrant(client: QdrantClient, collection_name: str, chunks, batch_size: int = 20):
-    texts = [c["text"] for c in chunks]
-    print(f"임베딩 계산 대상 청크 수: {len(texts)}")
+def point_id(ch) -> str:
+    # (data_source, 문서, 청크 span)의 UUIDv5 → 다른 소스의 작은 정수 ID와 충돌하지 않음
+    return make_point_id('Incoterms', ch["document"], ch["start"], ch["end"])
 
-    embeddings = get_embeddings(texts)
-    dim = embeddings.shape[1]
 
-    points = []
-    for idx, (vec, ch) in enumerate(zip(embeddings, chunks)):
-        payload = {
-            "id": ch["id"],
-            "text": ch["text"],
-            "data_source": 'Incoterms'
-        }
-
-        points.append(
-            PointStruct(
-                id=idx,
-                vector=vec.tolist(),
-                payload=payload,
-            )
-        )
+def make_point(ch, vec) -> PointStruct:
+    return PointStruct(
+        id=point_id(ch),
+        vector=point_vectors(vec, ch["text"]),
+        payload=make_payload('Incoterms', ch["text"], source="Incoterms", chunk_id=ch["id"]),
+    )
 
-    # 배치 업로드
-    total_points = len(points)
-    total_batches = (total_points + batch_size - 1) // batch_size
-    print(f"배치 업로드 시작 (총 {total_points}개, 배치 크기: {batch_size})...")
 
-    for i in range(0, total_points, batch_size):
-        batch = points[i:i + batch_size]
-        batch_num = i // batch_size + 1
-        client.upsert(
-            collection_name=collection_name,
-            points=batch,
-            wait=True
+def upload_chunks_to_qdrant(client: QdrantClient, collection_name: str, chunks):
+    """
+    청크 스트림을 embed → upsert 파이프라인으로 업로드
+    (단계 사이 큐 크기가 제한되어 있어 전체 벡터를 메모리에 올리지 않음)
+    """
+    print("임베딩/업로드 파이프라인 시작")
+
+    with QdrantUploader(client, collection_name) as uploader:
+        total = run_ingest_pipeline(
+            chunks,
+            lambda texts: get_embeddings(texts).tolist(),
+            make_point,
+            uploader,
         )
-        print(f"  - 배치 {batch_num}/{total_batches} 업로드 완료 ({len(batch)}개)")
-
-    print(f"[QDRANT] 업서트 완료: {total_points}개 포인트")
 
+    print(f"임베딩 캐시: {embedding_cache.stats()}, API: {embed_executor.stats()}")
+    print(f"[QDRANT] 업서트 완료: {total}개 청크, {uploader.stats()}")
+    return total
 
 
 # =========================
 # 5. main
 # =========================
 
-def main(update_existing: bool = False):
+def main(update_existing: bool = False, incremental: bool = True):
     """
     메인 실행 함수
 
     Args:
-        update_existing: True면 기존 'Incoterms' 데이터를 삭제하고 새로 업로드 (업데이트 모드)
-                        False면 기존 데이터에 추가 (중복 가능)
+        update_existing: True면 기존 'Incoterms' 데이터를 새 내용으로 갱신 (업데이트 모드)
+                        False면 기존 데이터에 추가 (ID가 결정적이므로 같은 청크는 덮어씀)
+        incremental: 업데이트 모드에서 True면 바뀐 청크만 임베딩/업서트하고 사라진 청크만 삭제,
+                     False면 기존 'Incoterms' 데이터를 모두 삭제하고 새로 업로드
     """
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     DOCUMENT_PATH = os.path.join(BASE_DIR, "used_data", "Incoterms_preprocessed(1).md")
     COLLECTION_NAME = "trade_collection"
     MAX_TOKENS = 128
 
-    # 1) 문서 로드
-    text = load_document(DOCUMENT_PATH)
-
-    # 2) 청킹
-    chunks_tok = chunk_by_tokens(text, MAX_TOKENS, 0.15)
+    # 1) 문서 로드 + 2) 청킹: 제너레이터로 만들어 업로드 파이프라인이 소비할 때 실행
+    chunks_tok = load_chunks(DOCUMENT_PATH, MAX_TOKENS, 0.15)
 
     # 3) Qdrant 연결
     print("Qdrant 연결 시도")
-    client = QdrantClient(
-        url=QDRANT_URL,
-        api_key=QDRANT_API_KEY,
-        timeout=300  # 5분 타임아웃 (대용량 업로드 대비)
-    )
+    # VECTOR_BACKEND=cloud(기본) | local | memory | numpy
+    client = get_qdrant_client(timeout=300)  # 5분 타임아웃 (대용량 업로드 대비)
     print("Qdrant 연결 완료")
 
     # 4) 컬렉션 생성
     create_collection_for_chunks(client, COLLECTION_NAME, EMBED_DIM)
+    point_vectors.bind(client, COLLECTION_NAME)
+
+    if update_existing and incremental:
+        # 5) 증분 동기화: 바뀐 청크만 임베딩/업서트, 사라진 청크 삭제
+        sync_stats = sync_data_source(
+            client, COLLECTION_NAME, 'Incoterms', chunks_tok,
+            lambda texts: get_embeddings(texts).tolist(),
+            make_point,
+            extra_hash=embed_executor.cache_name + point_vectors.hash_suffix,
+            get_id=point_id,
+        )
+        n_chunks = sync_stats["unchanged"] + sync_stats["upserted"]
+    else:
+        # 5) 업데이트 모드: 기존 Incoterms 데이터 삭제
+        if update_existing:
+            delete_by_data_source(client, COLLECTION_NAME, 'Incoterms')
 
-    # 5) 업데이트 모드: 기존 Incoterms 데이터 삭제
-    if update_existing:
-        delete_by_data_source(client, COLLECTION_NAME, 'Incoterms')
-
-    # 6) 청크 업로드
-    upload_chunks_to_qdrant(client, COLLECTION_NAME, chunks_tok)
+        # 6) 청크 업로드
+        n_chunks = upload_chunks_to_qdrant(client, COLLECTION_NAME, chunks_tok)
 
     # 최종 상태 확인
     collection_info = client.get_collection(COLLECTION_NAME)
     print(f"✓ 컬렉션 '{COLLECTION_NAME}' 총 포인트 수: {collection_info.points_count}")
 
+    # 단계별 시간/토큰/업로드 바이트/재시도 리포트 (JSON + Prometheus text)
+    write_run_report("incoterms", {
+        "collection": COLLECTION_NAME,
+        "points_count": collection_info.points_count,
+        "chunks": n_chunks,
+        "embed_model": embed_executor.cache_name,
+        "embedding_cache": embedding_cache.stats(),
+    })
+
 
 if __name__ == "__main__":
-    # update_existing=True: 기존 Incoterms 데이터를 삭제하고 새로 인덱싱 (다른 소스는 유지)
-    # update_existing=False: 기존 데이터에 추가 (중복 가능)
+    # update_existing=True: 바뀐 Incoterms 청크만 다시 인덱싱 (다른 소스는 유지)
+    # update_existing=False: 기존 데이터에 추가
     main(update_existing=True)
@@ -2,58 +2,183 @@
 
 import asyncio
 import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Literal, Optional, Set, Union
+
+import httpx
 from dotenv import load_dotenv
-from agents import Agent, Runner, function_tool
-from qdrant_client import QdrantClient
-from openai import OpenAI
+from agents import Agent, ModelSettings, RunContextWrapper, Runner, function_tool
+from qdrant_client import AsyncQdrantClient
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from data_embedding.common.query_cache import QueryEmbeddingCache
+from data_embedding.common.answer_cache import SemanticAnswerCache, answer_cache_enabled
+from data_embedding.common.collection_provisioning import search_params
+from data_embedding.common.payload_schema import SEARCH_PAYLOAD_FIELDS, source_label
+from data_embedding.common.sparse_vectors import collection_has_sparse, hybrid_query_kwargs, to_query_request
+from data_embedding.common.reranker import default_rerank_candidates, get_reranker, rerank_points
+from data_embedding.common.query_router import build_search_filter, merge_routed_results, route_query, router_backfill
+from data_embedding.common.small_to_big import collapse_to_parents, missing_parent_ids, small_to_big_enabled
+from data_embedding.common.index_sync import normalize_point_id
+from data_embedding.common.matryoshka import cache_model_name, dimensions_param, embedding_dimensions
 
 load_dotenv()
 
-# Initialize clients
-qdrant_client = QdrantClient(
+# 동시 tool 호출/세션이 keep-alive 연결을 공유하도록 커넥션 풀 크기 지정
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+
+# Initialize async clients (이벤트 루프를 막지 않음)
+qdrant_client = AsyncQdrantClient(
     url=os.getenv("QDRANT_URL"),
     api_key=os.getenv("QDRANT_API_KEY"),
-    timeout=60
+    timeout=60,
+    limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
 )
 
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+openai_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+    ),
+)
 
 COLLECTION_NAME = "trade_collection"
 EMBEDDING_MODEL = "text-embedding-3-large"
+# 컬렉션과 같은 차원으로 질의 임베딩 (EMBED_DIMENSIONS, 기본 3072)
+EMBEDDING_DIMENSIONS = embedding_dimensions(EMBEDDING_MODEL)
 
+# 반복/유사 질문의 쿼리 임베딩 재사용 (메모리 LRU + 디스크, 차원별로 키 분리)
+query_cache = QueryEmbeddingCache(cache_model_name(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS))
 
-@function_tool
-def search_trade_documents(query: str, limit: int = 25) -> str:
-    """Always use limit=25 to retrieve comprehensive results for accurate analysis."""
-    
-    print(f"\n🔍 검색 중: '{query}' (limit: {limit})")
+# 양자화 컬렉션이면 rescore/oversampling 적용 (COLLECTION_QUANTIZATION, SEARCH_OVERSAMPLING 등)
+SEARCH_PARAMS = search_params()
+
+# dense + BM25 희소 벡터 RRF 검색 ("CISG 제25조", "FOB A4" 같은 조문 번호/코드 질의의 어휘 일치 보강)
+# 컬렉션에 bm25 희소 벡터가 없으면 dense 검색만 사용
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+_hybrid_enabled = None
+
+# 2단계 재정렬: 후보 RERANK_CANDIDATES개(기본 50)를 가져와 CPU에서 다시 채점 후 상위 limit개만 전달
+# (RERANKER = blend(기본) | cross-encoder | none)
+RERANKER = get_reranker()
+
+# small-to-big: 호/항 단위로 매칭하고 모델에는 감싸는 조문 전체를 전달 (같은 조는 한 번만)
+# 합쳐지면 결과가 줄어드므로 재정렬과 같은 수의 후보를 가져옴
+SMALL_TO_BIG = small_to_big_enabled()
+FETCH_CANDIDATES = default_rerank_candidates() if RERANKER or SMALL_TO_BIG else 0
+
+# 라우팅된 검색에 합칠 필터 없는 검색 결과 수 (ROUTER_BACKFILL, 0이면 라우팅 결과가 없을 때만 전체 검색)
+ROUTER_BACKFILL = router_backfill()
+
+# 의미가 같은 질문이면 에이전트를 돌리지 않고 저장된 답변 반환 (인용 포인트가 재색인으로 바뀌면 무효화)
+answer_cache = (
+    SemanticAnswerCache(cache_model_name(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS), EMBEDDING_DIMENSIONS)
+    if answer_cache_enabled() else None
+)
 
-    # Generate query embedding
-    response = openai_client.embeddings.create(
+
+@dataclass
+class SearchContext:
+    """에이전트 실행 1회 동안 검색 tool이 모델에 전달한 포인트 ID (답변 캐시 무효화 기준)"""
+    cited_point_ids: Set[str] = field(default_factory=set)
+
+    def record(self, points: list) -> None:
+        self.cited_point_ids.update(str(point.id) for point in points)
+
+
+async def hybrid_enabled() -> bool:
+    """컬렉션의 희소 벡터 설정을 한 번만 확인"""
+    global _hybrid_enabled
+    if _hybrid_enabled is None:
+        _hybrid_enabled = HYBRID_SEARCH and collection_has_sparse(
+            await qdrant_client.get_collection(COLLECTION_NAME)
+        )
+    return _hybrid_enabled
+
+
+async def embed_query(query: str) -> list:
+    """OpenAI로 쿼리 임베딩 생성 (캐시 미스 시에만 호출)"""
+    dimensions = dimensions_param(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    response = await openai_client.embeddings.create(
         model=EMBEDDING_MODEL,
-        input=query
+        input=query,
+        **({"dimensions": dimensions} if dimensions else {})
     )
-    query_vector = response.data[0].embedding
+    return response.data[0].embedding
+
 
-    # Search Qdrant using the new query_points API
-    search_result = qdrant_client.query_points(
+async def fetch_content_hashes(point_ids: List[str]) -> Dict[str, str]:
+    """포인트 ID별 현재 content_hash (삭제된 포인트는 결과에 없음)"""
+    records = await qdrant_client.retrieve(
         collection_name=COLLECTION_NAME,
-        query=query_vector,
-        limit=limit,
-        with_payload=True
+        ids=point_ids,
+        with_payload=["content_hash"],
     )
+    return {
+        str(record.id): record.payload["content_hash"]
+        for record in records if record.payload and "content_hash" in record.payload
+    }
 
-    # Access points from the response
-    points = search_result.points if hasattr(search_result, 'points') else []
 
-    print(f"✓ {len(points)}개 문서 발견\n")
+async def embed_queries(queries: List[str]) -> List[list]:
+    """여러 쿼리를 한 번의 임베딩 API 호출로 생성 (입력 순서대로 반환)"""
+    dimensions = dimensions_param(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    response = await openai_client.embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=queries,
+        **({"dimensions": dimensions} if dimensions else {})
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
-    # Format results for the agent
-    if not points:
-        print("⚠️  검색 결과가 없습니다.\n")
-        return "검색 결과가 없습니다."
 
-    # Print retrieved documents BEFORE sending to model
+async def search_kwargs_for(query_vector: list, query: str, limit: int, query_filter=None) -> dict:
+    """query_points 검색 인자 (하이브리드: prefetch 2개 + RRF를 한 번의 요청으로)"""
+    if await hybrid_enabled():
+        return hybrid_query_kwargs(query_vector, query, limit, query_filter, SEARCH_PARAMS)
+    return {"query": query_vector, "limit": limit, "query_filter": query_filter, "search_params": SEARCH_PARAMS}
+
+
+async def query_trade_collection(query_vector: list, query: str, limit: int, query_filter=None) -> list:
+    """trade_collection 검색"""
+    # 전체 payload 대신 사용하는 필드만 요청 (응답 크기/JSON 디코드 시간 절감)
+    search_result = await qdrant_client.query_points(
+        collection_name=COLLECTION_NAME,
+        with_payload=SEARCH_PAYLOAD_FIELDS,
+        **(await search_kwargs_for(query_vector, query, limit, query_filter))
+    )
+    return search_result.points if hasattr(search_result, 'points') else []
+
+
+async def query_trade_collection_batch(
+    query_vectors: List[list], queries: List[str], limit: Union[int, List[int]], query_filters: list
+) -> List[list]:
+    """여러 질의를 query_batch_points 한 번의 요청으로 검색 (질의 순서대로 결과 리스트 반환, limit은 질의별로 줄 수 있음)"""
+    limits = limit if isinstance(limit, list) else [limit] * len(queries)
+    requests = [
+        to_query_request(await search_kwargs_for(vector, query, n, query_filter), SEARCH_PAYLOAD_FIELDS)
+        for vector, query, n, query_filter in zip(query_vectors, queries, limits, query_filters)
+    ]
+    responses = await qdrant_client.query_batch_points(collection_name=COLLECTION_NAME, requests=requests)
+    return [response.points for response in responses]
+
+
+async def expand_to_parents(results: List[list], limit: int) -> List[list]:
+    """질의별 검색 결과의 호/항 포인트를 감싸는 조 포인트로 바꾸고 상위 limit개 반환 (조 포인트는 한 번에 조회)"""
+    if not SMALL_TO_BIG:
+        return [points[:limit] for points in results]
+    missing_ids = list(dict.fromkeys(pid for points in results for pid in missing_parent_ids(points)))
+    parents = {}
+    if missing_ids:
+        records = await qdrant_client.retrieve(
+            collection_name=COLLECTION_NAME,
+            ids=missing_ids,
+            with_payload=SEARCH_PAYLOAD_FIELDS,
+        )
+        parents = {normalize_point_id(record.id): record for record in records}
+    return [collapse_to_parents(points, parents, limit) for points in results]
+
+
+def format_points(points: list, matched_queries: Optional[List[List[int]]] = None) -> List[str]:
+    """검색 결과를 모델에 전달할 문자열 목록으로 변환 (콘솔에도 출력)"""
     print("="*60)
     print("📄 검색된 문서 (모델에게 전달되기 전)")
     print("="*60)
@@ -62,17 +187,12 @@ def search_trade_documents(query: str, limit: int = 25) -> str:
     for i, point in enumerate(points, 1):
         content = point.payload.get("text", "")[:500]
         score = point.score
-        source = point.payload.get("data_source", "unknown")
-
-        # Try to get more specific source info
-        if "article" in point.payload:
-            source = f"CISG Article {point.payload.get('article')}"
-        elif "document_name" in point.payload:
-            source = point.payload.get("document_name")
-        elif "file_name" in point.payload:
-            source = point.payload.get("file_name")
+        # source 필드 (이전 스키마 포인트는 article / document_name / file_name)
+        source = source_label(point.payload)
 
         doc_text = f"[{i}] {content}\n   출처: {source}, 점수: {score:.3f}"
+        if matched_queries is not None:
+            doc_text += f", 질의: {', '.join(f'Q{q}' for q in matched_queries[i - 1])}"
         formatted.append(doc_text)
 
         # Print to console
@@ -84,8 +204,176 @@ def search_trade_documents(query: str, limit: int = 25) -> str:
     print("\n" + "="*60)
     print("🤖 모델이 위 문서를 기반으로 답변 생성 중...")
     print("="*60 + "\n")
+    return formatted
+
+
+@function_tool
+async def search_trade_documents(
+    ctx: RunContextWrapper[SearchContext],
+    query: str,
+    limit: int = 10,
+    sources: Optional[List[Literal["fraud", "cisg", "Incoterms", "claim", "certification"]]] = None,
+    country: Optional[str] = None,
+    category: Optional[str] = None,
+) -> str:
+    """Use limit=10; hybrid (dense + keyword) search already ranks exact article numbers and Incoterm codes highly.
+
+    Args:
+        query: Search query.
+        limit: Number of results.
+        sources: Restrict to these data sources. Leave empty to let the router pick sources from the query.
+        country: Certification country in Korean (e.g. 미국, 유럽연합, 중국). Searches certifications only.
+        category: Certification product category in Korean (e.g. 전기전자, 식의약품). Searches certifications only.
+    """
+    # 소스를 지정하지 않으면 질의 단서(조문 번호, 인코텀즈 코드, "사기", "인증" 등)로 라우팅
+    routed = not sources and not country and not category
+    if routed:
+        sources = route_query(query)
+    query_filter = build_search_filter(sources, country, category)
+
+    print(f"\n🔍 검색 중: '{query}' (limit: {limit}, sources: {sources or '전체'}"
+          f"{f', country: {country}' if country else ''}{f', category: {category}' if category else ''})")
+
+    # Generate query embedding (cached)
+    query_vector = await query_cache.aget_or_embed(query, embed_query)
+
+    fetch_limit = max(limit, FETCH_CANDIDATES)
+    routing = ""
+    if routed and query_filter is not None:
+        # 라우팅이 틀려도 맞는 소스가 가려지지 않도록 필터 없는 상위 ROUTER_BACKFILL개를 동시에 검색해 합침
+        searches = [query_trade_collection(query_vector, query, fetch_limit, query_filter)]
+        if ROUTER_BACKFILL:
+            searches.append(query_trade_collection(query_vector, query, ROUTER_BACKFILL))
+        points, *backfill = await asyncio.gather(*searches)
+        if not points:
+            # 라우터가 고른 소스에 결과가 없으면 전체 컬렉션에서 다시 검색
+            print("  ↪ 라우팅된 소스에 결과가 없어 전체 검색")
+            points = await query_trade_collection(query_vector, query, fetch_limit)
+            routing = f", 라우팅 {'/'.join(sources)} 결과 없음 → 전체 검색"
+        else:
+            points, added = merge_routed_results(points, backfill[0] if backfill else [])
+            routing = f", 라우팅 {'/'.join(sources)} (+전체 검색 {added}개)"
+    else:
+        points = await query_trade_collection(query_vector, query, fetch_limit, query_filter)
 
-    return "\n\n".join(formatted)
+    # CPU 재정렬은 이벤트 루프를 막지 않도록 스레드에서 실행
+    n_candidates = len(points)
+    points, rerank_ms = await asyncio.to_thread(rerank_points, RERANKER, query, points, len(points))
+    [points] = await expand_to_parents([points], limit)
+    search_meta = (
+        f"[검색 메타] 후보 {n_candidates}개 → {len(points)}개, "
+        f"재정렬 {RERANKER.name if RERANKER else 'none'} {rerank_ms:.1f}ms{routing}"
+    )
+
+    print(f"✓ {len(points)}개 문서 발견 ({search_meta})\n")
+
+    # Format results for the agent
+    if not points:
+        print("⚠️  검색 결과가 없습니다.\n")
+        return "검색 결과가 없습니다."
+
+    if isinstance(ctx.context, SearchContext):
+        ctx.context.record(points)
+
+    # Print retrieved documents BEFORE sending to model
+    formatted = format_points(points)
+    return "\n\n".join([search_meta] + formatted)
+
+
+@function_tool
+async def search_trade_documents_multi(
+    ctx: RunContextWrapper[SearchContext],
+    queries: List[str],
+    limit: int = 5,
+    sources: Optional[List[Literal["fraud", "cisg", "Incoterms", "claim", "certification"]]] = None,
+) -> str:
+    """Search several sub-queries at once (e.g. one each for CISG, Incoterms and fraud angles). Prefer this over multiple search_trade_documents calls.
+
+    Args:
+        queries: Sub-queries, one per angle of the question.
+        limit: Number of results per sub-query. Documents found by several sub-queries are returned once.
+        sources: Restrict all sub-queries to these data sources. Leave empty to route each sub-query separately.
+    """
+    queries = [query for query in queries if query.strip()]
+    if not queries:
+        return "검색 결과가 없습니다."
+
+    # 질의별 라우팅 (sources를 지정하면 모든 질의에 동일하게 적용)
+    routed = not sources
+    query_filters = [build_search_filter(route_query(query) if routed else sources) for query in queries]
+
+    print(f"\n🔍 일괄 검색 중: {len(queries)}개 질의 (limit: {limit}/질의)")
+    for q, query in enumerate(queries, 1):
+        print(f"  Q{q}: '{query}'")
+
+    # 임베딩 1회 (캐시 미스만) + Qdrant 배치 요청 1회
+    query_vectors = await query_cache.aget_or_embed_many(queries, embed_queries)
+    fetch_limit = max(limit, FETCH_CANDIDATES)
+    # 라우팅된 질의는 필터 없는 상위 ROUTER_BACKFILL개 검색도 같은 배치 요청에 넣어 합침 (오라우팅 보강)
+    routed_ids = [i for i, query_filter in enumerate(query_filters) if routed and query_filter is not None]
+    backfill_ids = routed_ids if ROUTER_BACKFILL else []
+    results = await query_trade_collection_batch(
+        query_vectors + [query_vectors[i] for i in backfill_ids],
+        queries + [queries[i] for i in backfill_ids],
+        [fetch_limit] * len(queries) + [ROUTER_BACKFILL] * len(backfill_ids),
+        query_filters + [None] * len(backfill_ids),
+    )
+    results, backfills = results[:len(queries)], dict(zip(backfill_ids, results[len(queries):]))
+
+    empty = [i for i in routed_ids if not results[i]]
+    added = 0
+    for i in routed_ids:
+        if results[i]:
+            results[i], n_added = merge_routed_results(results[i], backfills.get(i, []))
+            added += n_added
+    if empty:
+        # 라우터가 고른 소스에 결과가 없는 질의만 전체 컬렉션에서 다시 검색
+        print(f"  ↪ 결과가 없는 {len(empty)}개 질의를 전체 검색")
+        retried = await query_trade_collection_batch(
+            [query_vectors[i] for i in empty], [queries[i] for i in empty], fetch_limit, [None] * len(empty)
+        )
+        for i, points in zip(empty, retried):
+            results[i] = points
+
+    n_candidates = sum(len(points) for points in results)
+    reranked = await asyncio.to_thread(
+        lambda: [rerank_points(RERANKER, query, points, len(points)) for query, points in zip(queries, results)]
+    )
+    rerank_ms = sum(ms for _, ms in reranked)
+    # 질의별로 조 단위로 합친 뒤 아래에서 질의 간 중복 제거 (다른 질의가 같은 조의 다른 호를 찾아도 한 번만 전달)
+    expanded = await expand_to_parents([points for points, _ in reranked], limit)
+
+    # 포인트 ID로 중복 제거: 각 질의의 1위, 2위, ... 순으로 섞어 모든 질의의 상위 문서가 앞에 오도록 함
+    merged = {}
+    matched = {}
+    for rank in range(limit):
+        for q, points in enumerate(expanded, 1):
+            if rank >= len(points):
+                continue
+            point = points[rank]
+            if point.id not in merged:
+                merged[point.id] = point
+                matched[point.id] = []
+            matched[point.id].append(q)
+
+    search_meta = (
+        f"[검색 메타] 질의 {len(queries)}개, 후보 {n_candidates}개 → 중복 제거 후 {len(merged)}개, "
+        f"재정렬 {RERANKER.name if RERANKER else 'none'} {rerank_ms:.1f}ms"
+    )
+    if routed_ids:
+        search_meta += f", 라우팅 질의 {len(routed_ids)}개 (+전체 검색 {added}개, 결과 없어 전체 검색 {len(empty)}개)"
+    print(f"✓ {len(merged)}개 문서 발견 ({search_meta})\n")
+
+    if not merged:
+        print("⚠️  검색 결과가 없습니다.\n")
+        return "검색 결과가 없습니다."
+
+    if isinstance(ctx.context, SearchContext):
+        ctx.context.record(merged.values())
+
+    queries_legend = "\n".join(f"Q{q}: {query}" for q, query in enumerate(queries, 1))
+    formatted = format_points(list(merged.values()), list(matched.values()))
+    return "\n\n".join([search_meta, queries_legend] + formatted)
 
 
 # Define the RAG agent (프롬프)
@@ -97,12 +385,15 @@ trade_agent = Agent(
 
 대답시 다음의 사항을 준수해:
 1. 'search_trade_documents' tool을 사용해 사용자 질문에 해당하는 정보를 찾아
+   (질문이 여러 관점(CISG, 인코텀즈, 사기 등)에 걸치면 'search_trade_documents_multi'로 한 번에 검색해)
 2. 찾은 정보를 한국어로 대답하는데 특정 단어같이 원문으로 남겨야 하는 것은 그렇게 해
 3. 답변 안에서 항상 찾은 정보에 대해서는 출처를 다음과 같은 형식으로 남겨 (출처: ~) 
 
 명확하고 프로페셔널하게 설명해""",
 
-    tools=[search_trade_documents],
+    tools=[search_trade_documents, search_trade_documents_multi],
+    # 여러 검색 tool 호출을 한 턴에 병렬로 실행
+    model_settings=ModelSettings(parallel_tool_calls=True),
 )
 
 
@@ -112,17 +403,35 @@ async def main():
 
     print(f"\n{'='*60}\n")
 
-    # Run the agent
-    print("🤖 Agent 실행 중...\n")
-    result = await Runner.run(trade_agent, input=question)
+    cached = None
+    if answer_cache is not None:
+        question_vector = await query_cache.aget_or_embed(question, embed_query)
+        cached = await answer_cache.aget(question_vector, fetch_content_hashes)
+
+    if cached is not None:
+        print(f"⚡ 캐시된 답변 사용 (유사도 {cached['score']:.3f}, 원 질문: '{cached['question']}')\n")
+        final_output = cached["answer"]
+    else:
+        # Run the agent
+        print("🤖 Agent 실행 중...\n")
+        context = SearchContext()
+        result = await Runner.run(trade_agent, input=question, context=context)
+        final_output = result.final_output
+        if answer_cache is not None and context.cited_point_ids:
+            await answer_cache.aput(
+                question, question_vector, final_output, context.cited_point_ids, fetch_content_hashes
+            )
 
     # Display final output
     print("="*60)
     print("\n최종 답변:")
     print("-" * 60)
-    print(result.final_output)
+    print(final_output)
     print("\n" + "="*60 + "\n")
 
+    await qdrant_client.close()
+    await openai_client.close()
+
 
 if __name__ == "__main__":
     asyncio.run(main())